@@ -0,0 +1,33 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def start_of_day(day):
+    """Midnight of ``day`` in the current time zone, as an aware datetime."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_range(day):
+    return start_of_day(day), start_of_day(day + timedelta(days=1))
+
+
+def month_range(month):
+    first = month.replace(day=1)
+    next_month = (first + timedelta(days=32)).replace(day=1)
+    return start_of_day(first), start_of_day(next_month)
+
+
+def date_span_range(initial_date, final_date):
+    """The days from ``initial_date`` to ``final_date``, both included."""
+    return start_of_day(initial_date), start_of_day(final_date + timedelta(days=1))
+
+
+def in_range(field, date_range):
+    """
+    ``Q`` matching ``start <= field < end``. Unlike ``__date``, ``__month`` or
+    ``__year`` lookups it compares the column itself, so its index can be used.
+    """
+    start, end = date_range
+    return Q(**{f"{field}__gte": start, f"{field}__lt": end})
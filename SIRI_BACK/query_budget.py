@@ -0,0 +1,122 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("SIRI_BACK.queries")
+
+IN_CLAUSE = re.compile(r"\bIN \((?:%s, )*%s\)")
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """Collapse literals and IN lists so repeated lookups share one fingerprint."""
+    return LITERAL.sub("?", IN_CLAUSE.sub("IN (...)", sql))
+
+
+class QueryRecorder:
+    """Record every query run on all database connections while active."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+def get_query_budget(view_name):
+    budgets = getattr(settings, "QUERY_BUDGETS", {})
+    return budgets.get(view_name, getattr(settings, "QUERY_BUDGET_DEFAULT", None))
+
+
+@contextmanager
+def assert_max_queries(max_queries, label="block"):
+    """Fail when the wrapped block runs more than ``max_queries`` queries."""
+    with QueryRecorder() as recorder:
+        yield recorder
+    if recorder.count > max_queries:
+        raise QueryBudgetExceeded(
+            f"{label} ran {recorder.count} queries, budget is {max_queries}. "
+            f"Duplicated: {recorder.duplicates}"
+        )
+
+
+class QueryBudgetMiddleware:
+    """
+    Measure the queries each request runs and report them as a Server-Timing
+    header and a structured log line. Requests over the budget configured for
+    their URL name in ``QUERY_BUDGETS`` (or ``QUERY_BUDGET_DEFAULT``) are logged
+    as warnings, or raise ``QueryBudgetExceeded`` when ``QUERY_BUDGET_STRICT``
+    is on, which is how the test suite gates regressions.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        match = getattr(request, "resolver_match", None)
+        view_name = match.view_name if match else None
+        budget = get_query_budget(view_name) if view_name else None
+        duplicates = recorder.duplicates
+
+        if getattr(settings, "QUERY_BUDGET_SERVER_TIMING", True):
+            response["Server-Timing"] = (
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries", '
+                f'db-dup;desc="{sum(duplicates.values())} duplicated"'
+            )
+
+        stats = {
+            "method": request.method,
+            "path": request.path,
+            "view": view_name,
+            "status": response.status_code,
+            "queries": recorder.count,
+            "db_ms": round(recorder.duration * 1000, 1),
+            "duplicates": len(duplicates),
+            "budget": budget,
+        }
+        over_budget = budget is not None and recorder.count > budget
+        if over_budget:
+            stats["duplicated_sql"] = duplicates
+            logger.warning(json.dumps(stats))
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(
+                    f"{view_name} ran {recorder.count} queries, budget is {budget}. "
+                    f"Duplicated: {duplicates}"
+                )
+        else:
+            logger.info(json.dumps(stats))
+        return response
@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "SIRI_BACK.query_budget.QueryBudgetMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -95,13 +96,19 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.AllowAny",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.BasicAuthentication",
+        "user.authentication.ExpiringTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
+        "rest_framework.authentication.BasicAuthentication",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 15,
 }
 
+AUTH_TOKEN_EXPIRES_SECONDS = int(
+    os.environ.get("AUTH_TOKEN_EXPIRES_SECONDS") or 7 * 24 * 60 * 60
+)
+AUTH_TOKEN_CACHE_SECONDS = 300
+
 LANGUAGE_CODE = "en-us"
 
 TIME_ZONE = "UTC"
@@ -115,14 +122,69 @@ CORS_ORIGIN_ALLOW_ALL = True
 STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+REDIS_CACHE_URL = os.environ.get("REDIS_CACHE_URL")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+if REDIS_CACHE_URL:
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_CACHE_URL,
+    }
+# Without REDIS_CACHE_URL, how long a process may serve reference data lists
+# changed by another process.
+REFERENCE_VERSION_TIMEOUT = int(os.environ.get("REFERENCE_VERSION_TIMEOUT") or 60)
+
 DEFAULT_FILE_STORAGE = os.environ.get("DEFAULT_FILE_STORAGE")
 AWS_STORAGE_BUCKET_NAME = os.environ.get("AWS_BUCKET_NAME")
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
-EMAIL_HOST = "smtp.gmail.com"
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+EMAIL_BACKEND = os.environ.get(
+    "EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend"
+)
+EMAIL_HOST = os.environ.get("EMAIL_HOST", "smtp.gmail.com")
+EMAIL_PORT = int(os.environ.get("EMAIL_PORT", 587))
+EMAIL_USE_TLS = os.environ.get("EMAIL_USE_TLS", "True") == "True"
 EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
+EMAIL_TIMEOUT = 30
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_RECIPIENTS = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+# Seconds a worker holds a claimed batch before other workers may send it.
+EMAIL_OUTBOX_CLAIM_TIMEOUT = 60 * 60
+EMAIL_OUTBOX_RATE_LIMIT = os.environ.get("EMAIL_OUTBOX_RATE_LIMIT", "20/m")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+        },
+    },
+    "loggers": {
+        "SIRI_BACK.queries": {
+            "handlers": ["console"],
+            "level": os.environ.get("QUERY_LOG_LEVEL", "INFO"),
+        },
+    },
+}
+
+QUERY_BUDGET_STRICT = bool(os.environ.get("QUERY_BUDGET_STRICT"))
+QUERY_BUDGET_SERVER_TIMING = True
+QUERY_BUDGET_DEFAULT = 15
+QUERY_BUDGETS = {
+    # Approving an item writes its stock entry, stock items, reports and rollups.
+    "order:order-item-retrieve-update-destroy": 40,
+    # The same writes batched for any number of items.
+    "order:order-item-bulk-approve": 40,
+}
+
+UPLOAD_STAGING_DIR = os.environ.get("UPLOAD_STAGING_DIR", str(BASE_DIR / "uploads"))
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES") or 100 * 1024 * 1024)
+UPLOAD_POLICY_EXPIRES_SECONDS = 15 * 60
 
 CELERY_IMPORTS = ("SIRI_BACK.tasks",)
 CELERY_BROKER_URL = "redis://redis:6379/0"
@@ -133,4 +195,12 @@ CELERY_BEAT_SCHEDULE = {
         "task": "SIRI_BACK.tasks.verify_end_date",
         "schedule": crontab(minute=0, hour=0),
     },
+    "close_accountant_months": {
+        "task": "SIRI_BACK.tasks.close_accountant_months",
+        "schedule": crontab(minute=30, hour=0),
+    },
+    "send_queued_emails": {
+        "task": "stock.tasks.send_queued_emails",
+        "schedule": crontab(minute="*/5"),
+    },
 }
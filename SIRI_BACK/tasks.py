@@ -1,18 +1,22 @@
 import os
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 from celery import shared_task
 from django.contrib.auth.models import User
 from django.core.mail import send_mail
+from django.utils import timezone
 
+from SIRI_BACK.date_ranges import day_range, in_range
 from stock.models import Protocol
+from stock.services import rebuild_category_month_balances
 
 
 @shared_task
 def verify_end_date():
-    today = datetime.now().date()
-    ninety_days_later = today + timedelta(days=90)
-    protocols = Protocol.objects.filter(end_date__date=ninety_days_later)
+    ninety_days_later = timezone.localdate() + timedelta(days=90)
+    protocols = Protocol.objects.filter(
+        in_range("end_date", day_range(ninety_days_later))
+    )
     admins = User.objects.filter(is_superuser=True)
     recipient_list = admins.values_list("email", flat=True)
     from_email = os.environ.get("EMAIL_HOST_USER")
@@ -27,3 +31,9 @@ def verify_end_date():
             recipient_list,
             fail_silently=False,
         )
+
+
+@shared_task
+def close_accountant_months():
+    current_month = timezone.localdate().replace(day=1)
+    rebuild_category_month_balances(before=current_month, close=True)
@@ -1,19 +1,59 @@
 import pytest
-from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import connection
+from moto import mock_aws
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIClient
 
-from order.models import Order, OrderItem
+from order.models import (
+    MaterialsOrder,
+    Order,
+    OrderItem,
+    ProtocolWithdrawal,
+    StockEntry,
+    StockWithdrawal,
+    SupplierOrder,
+    SupplierOrderItem,
+)
+from SIRI_BACK.celery import app
+from stock import storage
 from stock.models import (
+    AccountantReport,
+    BiddingExemption,
     Category,
+    DispatchReport,
+    FileStatus,
+    Invoice,
     Measure,
     Product,
+    Protocol,
+    ProtocolItem,
     PublicDefense,
+    ReceivingReport,
     Sector,
     Stock,
     StockItem,
+    Supplier,
 )
+from stock.pagination import CreatedCursorPagination, InfinitePagination
+from stock.reference_cache import reference_payloads
+from stock.services import WAREHOUSE_STOCK_ID
 from user.models import Client
 
 
+@pytest.fixture(autouse=True)
+def strict_query_budget(settings):
+    settings.QUERY_BUDGET_STRICT = True
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear()
+    reference_payloads.clear()
+    storage.presigned_urls.clear()
+
+
 @pytest.fixture
 def measure():
     return Measure.objects.create(name="test_measure")
@@ -33,9 +73,7 @@ def sector(public_defense):
 
 @pytest.fixture
 def category(sector):
-    category = Category.objects.create(
-        name="test_category", slug="test_category_slug", is_standard=True
-    )
+    category = Category.objects.create(name="test_category", code="test_category")
     category.sector.add(sector)
     return category
 
@@ -46,7 +84,7 @@ def product(category, measure):
         category=category,
         measure=measure,
         name="test_product",
-        slug="test_product_slug",
+        code="test_product_code",
     )
 
 
@@ -56,15 +94,31 @@ def stock(sector):
 
 
 @pytest.fixture
-def client(stock):
-    return Client.objects.create(
-        user=User.objects.all().first(), name="test_client", stock=stock
-    )
+def warehouse(public_defense):
+    """The warehouse stock, which the code expects at ``WAREHOUSE_STOCK_ID``."""
+    sector = Sector.objects.create(name="warehouse", public_defense=public_defense)
+    warehouse = Stock.objects.create(id=WAREHOUSE_STOCK_ID, sector=sector)
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Stock]):
+            cursor.execute(sql)
+    return warehouse
 
 
 @pytest.fixture
-def order(requester):
-    return Order.objects.create(requester=requester)
+def client(admin_user, stock):
+    return Client.objects.create(user=admin_user, name="test_client", stock=stock)
+
+
+@pytest.fixture
+def api_client(admin_user, client):
+    api_client = APIClient()
+    api_client.force_authenticate(admin_user)
+    return api_client
+
+
+@pytest.fixture
+def order(client):
+    return Order.objects.create(client=client)
 
 
 @pytest.fixture
@@ -74,4 +128,143 @@ def order_item(order, product):
 
 @pytest.fixture
 def stock_item(stock, product):
-    return StockItem.objects.create(stock=stock, product=product, current_quantity=2)
+    return StockItem.objects.create(stock=stock, product=product, quantity=2)
+
+
+@pytest.fixture
+def supplier(category):
+    supplier = Supplier.objects.create(
+        name="test_supplier",
+        agent="test_agent",
+        address="test_address",
+        email="supplier@test.com",
+        phone="0",
+        ein="0",
+        ssn="0",
+        nic="0",
+    )
+    supplier.category.add(category)
+    return supplier
+
+
+@pytest.fixture
+def celery_eager(monkeypatch):
+    """Run tasks queued with ``delay`` inline and let their errors propagate."""
+    monkeypatch.setattr(app.conf, "task_always_eager", True)
+    monkeypatch.setattr(app.conf, "task_eager_propagates", True)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """An empty moto bucket behind ``stock.storage.get_client()``."""
+    monkeypatch.setenv("AWS_BUCKET_NAME", "test-bucket")
+    monkeypatch.setenv("AWS_REGION_NAME", "us-east-1")
+    monkeypatch.setattr(storage, "_client", None)
+    with mock_aws():
+        s3_client = storage.get_client()
+        s3_client.create_bucket(Bucket="test-bucket")
+        yield s3_client
+
+
+@pytest.fixture
+def set_page_size(monkeypatch):
+    """Make every list endpoint return pages of ``page_size`` rows."""
+
+    def set_page_size(page_size):
+        monkeypatch.setattr(PageNumberPagination, "page_size", page_size)
+        monkeypatch.setattr(CreatedCursorPagination, "page_size", page_size)
+        monkeypatch.setattr(InfinitePagination, "default_limit", page_size)
+
+    return set_page_size
+
+
+@pytest.fixture
+def make_listings(client):
+    """Create ``count`` rows of every listed model, each with its relations."""
+
+    def make_listings(count):
+        for i in range(count):
+            public_defense = PublicDefense.objects.create(
+                name=f"public_defense_{i}", district="district", address="address"
+            )
+            sector = Sector.objects.create(
+                name=f"sector_{i}", public_defense=public_defense
+            )
+            stock = Stock.objects.create(sector=sector)
+            category = Category.objects.create(name=f"category_{i}", code=f"C{i}")
+            category.sector.add(sector)
+            measure = Measure.objects.create(name=f"measure_{i}")
+            product = Product.objects.create(
+                category=category,
+                measure=measure,
+                name=f"product_{i}",
+                code=f"P{i}",
+                price=1.5,
+            )
+            stock_item = StockItem.objects.create(stock=stock, product=product)
+            supplier = Supplier.objects.create(
+                name=f"supplier_{i}",
+                agent="agent",
+                address="address",
+                email="supplier@test.com",
+                phone="0",
+                ein="0",
+                ssn="0",
+                nic="0",
+            )
+            supplier.category.add(category)
+            protocol = Protocol.objects.create(
+                code=f"protocol_{i}",
+                supplier=supplier,
+                category=category,
+                file_status=FileStatus.UPLOADED,
+            )
+            protocol_item = ProtocolItem.objects.create(
+                protocol=protocol, product=product, original_quantity=10
+            )
+            invoice = Invoice.objects.create(
+                supplier=supplier,
+                public_defense=public_defense,
+                code=f"invoice_{i}",
+                total_value=10,
+                file_status=FileStatus.UPLOADED,
+            )
+            ReceivingReport.objects.create(
+                product=product, supplier=supplier, quantity=2, file="file"
+            )
+            DispatchReport.objects.create(
+                product=product, public_defense=public_defense, quantity=1, file="file"
+            )
+            BiddingExemption.objects.create(
+                product=product, stock=stock, invoice=invoice, quantity=1
+            )
+            AccountantReport.objects.create(
+                month=f"{i}", file_status=FileStatus.UPLOADED
+            )
+            order = Order.objects.create(client=client)
+            order_item = OrderItem.objects.create(
+                order=order, product=product, supplier=supplier, quantity=2
+            )
+            StockEntry.objects.create(
+                stock_item=stock_item, order_item=order_item, entry_quantity=2
+            )
+            StockWithdrawal.objects.create(stock_item=stock_item, withdraw_quantity=1)
+            supplier_order = SupplierOrder.objects.create(
+                client=client,
+                supplier=supplier,
+                protocol=protocol,
+                public_defense=public_defense,
+            )
+            supplier_order_item = SupplierOrderItem.objects.create(
+                supplier_order=supplier_order, product=product
+            )
+            ProtocolWithdrawal.objects.create(
+                protocol_item=protocol_item,
+                supplier_order_item=supplier_order_item,
+                withdraw_quantity=1,
+            )
+            MaterialsOrder.objects.create(
+                supplier=supplier, category=category, file="file"
+            )
+
+    return make_listings
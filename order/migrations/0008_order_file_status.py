@@ -0,0 +1,26 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("order", "0007_protocolwithdrawal_supplier_order_item"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="file_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("uploaded", "Uploaded"),
+                    ("failed", "Failed"),
+                ],
+                editable=False,
+                max_length=16,
+                null=True,
+            ),
+        ),
+    ]
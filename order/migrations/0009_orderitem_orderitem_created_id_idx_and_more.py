@@ -0,0 +1,42 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("order", "0008_order_file_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="orderitem",
+            index=models.Index(
+                fields=["-created", "-id"], name="orderitem_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="protocolwithdrawal",
+            index=models.Index(
+                fields=["-created", "-id"], name="protocolwithdraw_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockentry",
+            index=models.Index(
+                fields=["-created", "-id"], name="stockentry_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockwithdrawal",
+            index=models.Index(
+                fields=["-created", "-id"], name="stockwithdrawal_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="supplierorderitem",
+            index=models.Index(
+                fields=["-created", "-id"], name="supplierorderitem_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.1.7 on 2026-10-18 11:15
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("order", "0009_orderitem_orderitem_created_id_idx_and_more"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="order",
+            index=models.Index(fields=["-created", "-id"], name="order_created_id_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="order",
+            index=models.Index(
+                fields=["client", "-created", "-id"], name="order_client_created_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="protocolwithdrawal",
+            index=models.Index(
+                fields=["protocol_item"],
+                include=("withdraw_quantity",),
+                name="protocolwithdraw_item_qty_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="stockentry",
+            index=models.Index(
+                fields=["stock_item", "entry_date"], name="stockentry_item_date_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="stockentry",
+            index=models.Index(
+                fields=["entry_date"],
+                include=("stock_item", "entry_quantity"),
+                name="stockentry_date_cover_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="stockwithdrawal",
+            index=models.Index(
+                fields=["stock_item", "withdraw_date"],
+                name="stockwithdrawal_item_date_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="stockwithdrawal",
+            index=models.Index(
+                fields=["withdraw_date"],
+                include=("stock_item", "withdraw_quantity"),
+                name="stockwithdrawal_date_cover_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="supplierorder",
+            index=models.Index(
+                fields=["-created", "-id"], name="supplierorder_created_id_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="supplierorder",
+            index=models.Index(
+                fields=["supplier", "-created"], name="supplierorder_supplier_idx"
+            ),
+        ),
+    ]
@@ -1,8 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 from stock.models import (
     Category,
+    FileStatus,
     Invoice,
     Product,
     Protocol,
@@ -24,9 +25,18 @@ class Order(models.Model):
     created = models.DateTimeField(default=timezone.now)
     updated = models.DateTimeField(default=timezone.now)
     file = models.TextField(blank=True, default=None, null=True)
+    file_status = models.CharField(
+        max_length=16, choices=FileStatus.choices, null=True, editable=False
+    )
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(fields=["-created", "-id"], name="order_created_id_idx"),
+            models.Index(
+                fields=["client", "-created", "-id"], name="order_client_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Order {self.id}"
@@ -44,6 +54,9 @@ class OrderItem(models.Model):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(fields=["-created", "-id"], name="orderitem_created_id_idx"),
+        ]
 
     def __str__(self):
         return (
@@ -60,7 +73,25 @@ class OrderItem(models.Model):
         )
 
 
-class StockWithdrawal(models.Model):
+class StockMovement(models.Model):
+    """
+    Stock entries and withdrawals drive ``StockItem.quantity`` through
+    ``order.signals``; saving and deleting atomically keeps both in step.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+
+class StockWithdrawal(StockMovement):
     stock_item = models.ForeignKey(
         StockItem, related_name="stock_withdraw", on_delete=models.CASCADE
     )
@@ -72,12 +103,26 @@ class StockWithdrawal(models.Model):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(
+                fields=["stock_item", "withdraw_date"],
+                name="stockwithdrawal_item_date_idx",
+            ),
+            models.Index(
+                fields=["withdraw_date"],
+                include=["stock_item", "withdraw_quantity"],
+                name="stockwithdrawal_date_cover_idx",
+            ),
+            models.Index(
+                fields=["-created", "-id"], name="stockwithdrawal_created_id_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"StockWithdrawal {self.id}"
 
 
-class StockEntry(models.Model):
+class StockEntry(StockMovement):
     stock_item = models.ForeignKey(
         StockItem, related_name="stock_entry", on_delete=models.CASCADE
     )
@@ -93,6 +138,17 @@ class StockEntry(models.Model):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(
+                fields=["stock_item", "entry_date"], name="stockentry_item_date_idx"
+            ),
+            models.Index(
+                fields=["entry_date"],
+                include=["stock_item", "entry_quantity"],
+                name="stockentry_date_cover_idx",
+            ),
+            models.Index(fields=["-created", "-id"], name="stockentry_created_id_idx"),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=["order_item"], name="%(app_label)s_%(class)s_unique"
@@ -115,6 +171,14 @@ class SupplierOrder(models.Model):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(
+                fields=["-created", "-id"], name="supplierorder_created_id_idx"
+            ),
+            models.Index(
+                fields=["supplier", "-created"], name="supplierorder_supplier_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"SupplierOrder {self.id}"
@@ -131,6 +195,11 @@ class SupplierOrderItem(models.Model):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(
+                fields=["-created", "-id"], name="supplierorderitem_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"SupplierOrderItem {self.id}"
@@ -151,6 +220,16 @@ class ProtocolWithdrawal(models.Model):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(
+                fields=["protocol_item"],
+                include=["withdraw_quantity"],
+                name="protocolwithdraw_item_qty_idx",
+            ),
+            models.Index(
+                fields=["-created", "-id"], name="protocolwithdraw_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"ProtocolWithdrawal {self.id}"
@@ -1,9 +1,8 @@
-import base64
-import os
-
-import boto3
+from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import serializers
 
+from stock.models import Product, ProtocolItem, Supplier
 from stock.serializers import (
     ProductMeSerializer,
     ProtocolCodeSerializer,
@@ -12,6 +11,8 @@ from stock.serializers import (
     StockItemMeSerializer,
     SupplierNameSerializer,
 )
+from stock.services import WAREHOUSE_STOCK_ID
+from stock.storage import get_presigned_url
 from user.serializers import ClientNameSerializer
 
 from .models import (
@@ -25,17 +26,11 @@ from .models import (
     SupplierOrderItem,
 )
 
-client = boto3.client(
-    "s3",
-    region_name=os.environ.get("AWS_REGION_NAME"),
-    aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
-)
-
 
 class RetrieveOrderItemSerializer(serializers.ModelSerializer):
     product = ProductMeSerializer()
     supplier = SupplierNameSerializer()
+    select_related_fields = ("product__measure", "supplier")
 
     class Meta:
         model = OrderItem
@@ -48,18 +43,19 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class OrderItemApprovalSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    added_quantity = serializers.IntegerField(min_value=0)
+
+
 class RetrieveOrderSerializer(serializers.ModelSerializer):
     client = ClientNameSerializer()
     file = serializers.SerializerMethodField()
+    select_related_fields = ("client",)
 
     def get_file(self, obj):
         if obj.file:
-            bucket_name = os.environ.get("AWS_BUCKET_NAME")
-            key = f"confirm-order/{obj.id}"
-            file_obj = client.get_object(Bucket=bucket_name, Key=key)
-            file_content = file_obj["Body"].read()
-            encoded_file = base64.b64encode(file_content).decode("utf-8")
-            return encoded_file
+            return get_presigned_url(f"confirm-order/{obj.id}")
         return None
 
     class Meta:
@@ -71,22 +67,80 @@ class OrderSerializer(serializers.ModelSerializer):
     file = serializers.SerializerMethodField()
 
     def get_file(self, obj):
-        url = client.generate_presigned_url(
-            "get_object",
-            Params={
-                "Bucket": os.environ.get("AWS_BUCKET_NAME"),
-                "Key": f"confirm-order/{obj.id}",
-            },
-            ExpiresIn=os.environ.get("AWS_EXPIRES_SECONDS"),
-            HttpMethod="GET",
-        )
-        return url
+        if obj.file:
+            return get_presigned_url(f"confirm-order/{obj.id}")
+        return None
 
     class Meta:
         model = Order
         fields = "__all__"
 
 
+class OrderLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)
+    supplier_quantity = serializers.IntegerField(min_value=0, required=False)
+    supplier = serializers.IntegerField(required=False, allow_null=True)
+
+
+class OrderWithItemsSerializer(serializers.ModelSerializer):
+    """
+    An order with all of its items, validated with one query per related model
+    and inserted in one transaction. Warehouse clients receive the ordered
+    quantity from the supplier, as when their items are created one by one.
+    """
+
+    items = OrderLineSerializer(many=True, allow_empty=False, write_only=True)
+
+    class Meta:
+        model = Order
+        fields = ("id", "client", "items")
+
+    def validate_items(self, items):
+        for model, field in ((Product, "product"), (Supplier, "supplier")):
+            ids = {item[field] for item in items if item.get(field) is not None}
+            missing = ids - set(
+                model.objects.filter(id__in=ids).values_list("id", flat=True)
+            )
+            if missing:
+                raise serializers.ValidationError(
+                    f"Invalid {field} ids: {sorted(missing)}"
+                )
+        return items
+
+    def create(self, validated_data):
+        items = validated_data.pop("items")
+        request = self.context.get("request")
+        from_supplier = (
+            request is not None and request.user.client.stock_id == WAREHOUSE_STOCK_ID
+        )
+        with transaction.atomic():
+            order = Order.objects.create(**validated_data)
+            order.order_items = OrderItem.objects.bulk_create(
+                [
+                    OrderItem(
+                        order=order,
+                        product_id=item["product"],
+                        quantity=item["quantity"],
+                        supplier_quantity=(
+                            item["quantity"]
+                            if from_supplier
+                            else item.get("supplier_quantity", 0)
+                        ),
+                        supplier_id=item.get("supplier"),
+                    )
+                    for item in items
+                ],
+                batch_size=1000,
+            )
+        return order
+
+    def to_representation(self, instance):
+        data = OrderSerializer(instance, context=self.context).data
+        data["items"] = OrderItemSerializer(instance.order_items, many=True).data
+        return data
+
+
 class OrderMeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
@@ -102,6 +156,7 @@ class OrderMeSerializer(serializers.ModelSerializer):
 
 class RetrieveStockWithdrawalSerializer(serializers.ModelSerializer):
     stock_item = StockItemMeSerializer()
+    select_related_fields = ("stock_item__product__measure",)
 
     class Meta:
         model = StockWithdrawal
@@ -117,6 +172,7 @@ class StockWithdrawalSerializer(serializers.ModelSerializer):
 class RetrieveStockEntrySerializer(serializers.ModelSerializer):
     stock_item = StockItemMeSerializer()
     order_item = OrderItemSerializer()
+    select_related_fields = ("stock_item__product__measure", "order_item")
 
     class Meta:
         model = StockEntry
@@ -134,6 +190,7 @@ class RetrieveSupplierOrderSerializer(serializers.ModelSerializer):
     supplier = SupplierNameSerializer()
     protocol = ProtocolCodeSerializer()
     public_defense = PublicDefenseSerializer()
+    select_related_fields = ("client", "supplier", "protocol", "public_defense")
 
     class Meta:
         model = SupplierOrder
@@ -148,6 +205,7 @@ class SupplierOrderSerializer(serializers.ModelSerializer):
 
 class RetrieveSupplierOrderItemSerializer(serializers.ModelSerializer):
     product = ProductMeSerializer()
+    select_related_fields = ("product__measure",)
 
     class Meta:
         model = SupplierOrderItem
@@ -162,6 +220,14 @@ class SupplierOrderItemSerializer(serializers.ModelSerializer):
 
 class RetrieveProtocolWithdrawalSerializer(serializers.ModelSerializer):
     protocol_item = RetrieveProtocolItemSerializer()
+    prefetch_related_fields = (
+        Prefetch(
+            "protocol_item",
+            queryset=ProtocolItem.objects.with_remaining_quantity().select_related(
+                *RetrieveProtocolItemSerializer.select_related_fields
+            ),
+        ),
+    )
 
     class Meta:
         model = ProtocolWithdrawal
@@ -177,20 +243,11 @@ class ProtocolWithdrawalSerializer(serializers.ModelSerializer):
 class RetrieveMaterialsOrderSerializer(serializers.ModelSerializer):
     file = serializers.SerializerMethodField()
     supplier = SupplierNameSerializer()
+    select_related_fields = ("supplier",)
 
     def get_file(self, obj):
         if obj.file:
-            code = obj.id
-            url = client.generate_presigned_url(
-                "get_object",
-                Params={
-                    "Bucket": os.environ.get("AWS_BUCKET_NAME"),
-                    "Key": f"materials-order/{code}",
-                },
-                ExpiresIn=os.environ.get("AWS_EXPIRES_SECONDS"),
-                HttpMethod="GET",
-            )
-            return url
+            return get_presigned_url(f"materials-order/{obj.id}")
         return None
 
     class Meta:
@@ -203,17 +260,7 @@ class MaterialsOrderSerializer(serializers.ModelSerializer):
 
     def get_file(self, obj):
         if obj.file:
-            code = obj.id
-            url = client.generate_presigned_url(
-                "get_object",
-                Params={
-                    "Bucket": os.environ.get("AWS_BUCKET_NAME"),
-                    "Key": f"materials-order/{code}",
-                },
-                ExpiresIn=os.environ.get("AWS_EXPIRES_SECONDS"),
-                HttpMethod="GET",
-            )
-            return url
+            return get_presigned_url(f"materials-order/{obj.id}")
         return None
 
     class Meta:
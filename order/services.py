@@ -0,0 +1,196 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from rest_framework.exceptions import NotFound
+
+from stock.models import DispatchReport, ReceivingReport
+from stock.services import (
+    WAREHOUSE_STOCK_ID,
+    add_stock_item_quantities,
+    apply_stock_movements,
+    get_or_create_stock_items,
+    refresh_report_balances,
+)
+from user.services import invalidate_me_cache
+
+from .errors import QuantityTooBigException
+from .models import Order, OrderItem, StockEntry
+
+
+def update_order_status(order_ids):
+    """
+    Recompute the stock flags of ``order_ids`` with one aggregate query and at
+    most two updates: orders whose items were all added are complete, orders
+    with any added item are partial.
+    """
+    totals = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values("order_id")
+        .annotate(
+            items=Count("id"),
+            added=Count("id", filter=Q(quantity=F("added_quantity"))),
+            any_added=Count("id", filter=~Q(added_quantity=0)),
+        )
+        .order_by()
+    )
+    completed, partial = [], []
+    for row in totals:
+        if row["added"] == row["items"]:
+            completed.append(row["order_id"])
+        elif row["any_added"]:
+            partial.append(row["order_id"])
+    Order.objects.filter(id__in=completed).update(
+        completely_added_to_stock=True, partially_added_to_stock=False, is_sent=True
+    )
+    Order.objects.filter(id__in=partial).update(
+        completely_added_to_stock=False, partially_added_to_stock=True, is_sent=True
+    )
+
+
+def approve_order_items(added_quantities, user_stock):
+    """
+    Set ``added_quantity`` for many order items (``{order_item_id: quantity}``)
+    in one transaction, moving the difference into ``user_stock`` like a
+    single order item update does, with batched inserts and stock updates.
+    Returns the updated order items.
+    """
+    with transaction.atomic():
+        order_ids = set(
+            OrderItem.objects.filter(id__in=added_quantities).values_list(
+                "order_id", flat=True
+            )
+        )
+        # Lock the orders before their items, as single item updates do.
+        list(Order.objects.select_for_update().filter(id__in=order_ids).order_by("id"))
+        order_items = list(
+            OrderItem.objects.select_for_update()
+            .filter(id__in=added_quantities)
+            .order_by("id")
+        )
+        missing = set(added_quantities) - {item.id for item in order_items}
+        if missing:
+            raise NotFound(f"Order items not found: {sorted(missing)}")
+
+        changed = []
+        for order_item in order_items:
+            added_quantity = added_quantities[order_item.id]
+            if added_quantity and added_quantity > order_item.quantity:
+                raise QuantityTooBigException
+            if added_quantity and order_item.added_quantity != added_quantity:
+                changed.append(order_item)
+
+        if user_stock.id == WAREHOUSE_STOCK_ID:
+            _receive_in_warehouse(changed, added_quantities)
+        else:
+            _dispatch_to_sector(changed, added_quantities, user_stock)
+
+        for order_item in changed:
+            order_item.added_quantity = added_quantities[order_item.id]
+        OrderItem.objects.bulk_update(changed, ["added_quantity"], batch_size=1000)
+        update_order_status(order_ids)
+
+        client_ids = set(
+            Order.objects.filter(id__in=order_ids).values_list("client_id", flat=True)
+        )
+
+        def invalidate():
+            invalidate_me_cache("stock", user_stock.id)
+            for client_id in client_ids:
+                invalidate_me_cache("client", client_id)
+
+        transaction.on_commit(invalidate)
+    return order_items
+
+
+def _receive_in_warehouse(order_items, added_quantities):
+    movements = defaultdict(int)
+    receiving_reports = []
+    for order_item in order_items:
+        movements[(WAREHOUSE_STOCK_ID, order_item.product_id)] += added_quantities[
+            order_item.id
+        ]
+        receiving_reports.append(
+            ReceivingReport(
+                supplier_id=order_item.supplier_id,
+                product_id=order_item.product_id,
+                quantity=order_item.supplier_quantity,
+            )
+        )
+    apply_stock_movements(movements)
+    refresh_report_balances(
+        ReceivingReport.objects.bulk_create(receiving_reports, batch_size=1000)
+    )
+
+
+def _dispatch_to_sector(order_items, added_quantities, user_stock):
+    stock_items = get_or_create_stock_items(
+        (user_stock.id, order_item.product_id)
+        for order_item in order_items
+        if order_item.added_quantity == 0
+    )
+    stock_entries = {
+        stock_entry.order_item_id: stock_entry
+        for stock_entry in StockEntry.objects.select_related(
+            "stock_item__stock__sector"
+        ).filter(order_item__in=[item for item in order_items if item.added_quantity])
+    }
+
+    new_entries, updated_entries = [], []
+    ledger = defaultdict(int)
+    movements = defaultdict(int)
+    receiving_reports, dispatch_reports = [], []
+    for order_item in order_items:
+        added_quantity = added_quantities[order_item.id]
+        if order_item.added_quantity == 0:
+            stock_item = stock_items[(user_stock.id, order_item.product_id)]
+            new_entries.append(
+                StockEntry(
+                    order_item=order_item,
+                    stock_item=stock_item,
+                    entry_quantity=added_quantity,
+                )
+            )
+            ledger[stock_item.id] += added_quantity
+            public_defense_id = user_stock.sector.public_defense_id
+        else:
+            stock_entry = stock_entries[order_item.id]
+            ledger[stock_entry.stock_item_id] += (
+                added_quantity - stock_entry.entry_quantity
+            )
+            stock_entry.entry_quantity = added_quantity
+            updated_entries.append(stock_entry)
+            public_defense_id = stock_entry.stock_item.stock.sector.public_defense_id
+
+        quantity = added_quantity - order_item.added_quantity
+        warehouse_key = (WAREHOUSE_STOCK_ID, order_item.product_id)
+        movements[warehouse_key] -= quantity
+        if (
+            order_item.supplier_quantity
+            and order_item.quantity == added_quantity
+            and order_item.supplier_id
+        ):
+            movements[warehouse_key] += order_item.supplier_quantity
+            receiving_reports.append(
+                ReceivingReport(
+                    supplier_id=order_item.supplier_id,
+                    product_id=order_item.product_id,
+                    quantity=order_item.supplier_quantity,
+                )
+            )
+        dispatch_reports.append(
+            DispatchReport(
+                product_id=order_item.product_id,
+                quantity=quantity,
+                public_defense_id=public_defense_id,
+            )
+        )
+
+    StockEntry.objects.bulk_create(new_entries, batch_size=1000)
+    StockEntry.objects.bulk_update(updated_entries, ["entry_quantity"], batch_size=1000)
+    add_stock_item_quantities(ledger)
+    apply_stock_movements(movements)
+    refresh_report_balances(
+        ReceivingReport.objects.bulk_create(receiving_reports, batch_size=1000)
+        + DispatchReport.objects.bulk_create(dispatch_reports, batch_size=1000)
+    )
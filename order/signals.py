@@ -0,0 +1,59 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from stock.services import apply_stock_item_movement
+
+from .models import StockEntry, StockWithdrawal
+
+MOVEMENT_QUANTITY_FIELDS = {
+    StockEntry: ("entry_quantity", 1),
+    StockWithdrawal: ("withdraw_quantity", -1),
+}
+
+
+def _signed_quantity(sender, quantity):
+    return MOVEMENT_QUANTITY_FIELDS[sender][1] * quantity
+
+
+@receiver(pre_save, sender=StockEntry)
+@receiver(pre_save, sender=StockWithdrawal)
+def remember_previous_movement(sender, instance, **kwargs):
+    quantity_field = MOVEMENT_QUANTITY_FIELDS[sender][0]
+    instance._previous_movement = None
+    if instance.pk:
+        instance._previous_movement = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("stock_item_id", quantity_field)
+            .first()
+        )
+
+
+@receiver(post_save, sender=StockEntry)
+@receiver(post_save, sender=StockWithdrawal)
+def apply_saved_movement(sender, instance, update_fields=None, **kwargs):
+    quantity_field = MOVEMENT_QUANTITY_FIELDS[sender][0]
+    previous = getattr(instance, "_previous_movement", None)
+    instance._previous_movement = None
+    tracked_fields = {quantity_field, "stock_item"}
+    if update_fields is not None and not tracked_fields & set(update_fields):
+        return
+
+    quantity = _signed_quantity(sender, getattr(instance, quantity_field))
+    if previous:
+        previous_stock_item_id, previous_quantity = previous
+        previous_quantity = _signed_quantity(sender, previous_quantity)
+        if previous_stock_item_id == instance.stock_item_id:
+            quantity -= previous_quantity
+        else:
+            apply_stock_item_movement(previous_stock_item_id, -previous_quantity)
+    apply_stock_item_movement(instance.stock_item_id, quantity)
+
+
+@receiver(post_delete, sender=StockEntry)
+@receiver(post_delete, sender=StockWithdrawal)
+def revert_deleted_movement(sender, instance, **kwargs):
+    quantity_field = MOVEMENT_QUANTITY_FIELDS[sender][0]
+    apply_stock_item_movement(
+        instance.stock_item_id,
+        -_signed_quantity(sender, getattr(instance, quantity_field)),
+    )
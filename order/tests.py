@@ -0,0 +1,404 @@
+import io
+import threading
+from datetime import date
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import DataError, connection, connections, transaction
+from rest_framework.test import APIClient
+
+from order.models import Order, OrderItem, StockEntry, StockWithdrawal, SupplierOrder
+from order.serializers import OrderWithItemsSerializer
+from order.services import update_order_status
+from SIRI_BACK.date_ranges import date_span_range, in_range
+from stock.models import DispatchReport, Product, ReceivingReport, StockItem
+from stock.services import WAREHOUSE_STOCK_ID
+
+LIST_QUERIES = [
+    ("/order/", 2),
+    ("/order/order-items/", 2),
+    ("/order/order-items/all/", 1),
+    ("/order/stock-withdrawals/", 2),
+    ("/order/stock-entries/", 2),
+    ("/order/supplier-orders/", 2),
+    ("/order/supplier-order-items/", 2),
+    ("/order/protocol-withdrawals/", 3),
+    ("/order/materials-order/", 2),
+]
+LIST_URLS = [
+    "/order/",
+    "/order/order-items/",
+    "/order/order-items/all/",
+    "/order/stock-withdrawals/",
+    "/order/stock-entries/",
+    "/order/supplier-orders/",
+    "/order/supplier-order-items/",
+    "/order/protocol-withdrawals/",
+    "/order/materials-order/",
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url", LIST_URLS)
+def test_list_stays_within_query_budget(api_client, make_listings, s3, url):
+    make_listings(20)
+
+    response = api_client.get(url)
+
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("page_size", [1, 100])
+@pytest.mark.parametrize("url,queries", LIST_QUERIES)
+def test_list_queries_do_not_grow_with_page_size(
+    api_client,
+    make_listings,
+    set_page_size,
+    s3,
+    django_assert_num_queries,
+    url,
+    queries,
+    page_size,
+):
+    make_listings(page_size)
+    set_page_size(page_size)
+
+    with django_assert_num_queries(queries):
+        response = api_client.get(url)
+
+    rows = response.data["results"] if "results" in response.data else response.data
+    assert len(rows) >= page_size
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("sector_item_exists", [False, True])
+def test_concurrent_approvals_move_every_quantity(
+    warehouse, admin_user, client, product, sector_item_exists
+):
+    StockItem.objects.create(stock=warehouse, product=product, quantity=100)
+    if sector_item_exists:
+        StockItem.objects.create(stock=client.stock, product=product)
+    order_items = [
+        OrderItem.objects.create(
+            order=Order.objects.create(client=client), product=product, quantity=3
+        )
+        for _ in range(8)
+    ]
+    barrier = threading.Barrier(len(order_items))
+    responses = []
+
+    def approve(order_item):
+        api_client = APIClient()
+        api_client.force_authenticate(admin_user)
+        try:
+            barrier.wait()
+            responses.append(
+                api_client.patch(
+                    f"/order/order-items/{order_item.id}/",
+                    {"added_quantity": 3},
+                    format="json",
+                )
+            )
+        finally:
+            connections.close_all()
+
+    threads = [
+        threading.Thread(target=approve, args=(order_item,))
+        for order_item in order_items
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [response.status_code for response in responses] == [200] * 8
+    sector_items = StockItem.objects.filter(stock=client.stock, product=product)
+    assert sector_items.count() == 1
+    assert sector_items.get().quantity == 24
+    assert StockEntry.objects.count() == 8
+    warehouse_item = StockItem.objects.get(stock_id=WAREHOUSE_STOCK_ID)
+    assert warehouse_item.quantity == 100 - 24
+    assert not Order.objects.filter(completely_added_to_stock=False).exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="PostgreSQL plans")
+def test_supplier_order_date_span_uses_the_supplier_index(supplier):
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+
+    created_range = date_span_range(date(2024, 1, 1), date(2024, 1, 31))
+    plan = SupplierOrder.objects.filter(
+        in_range("created", created_range), supplier=supplier
+    ).explain()
+
+    assert "Index Scan using supplierorder_supplier_idx" in plan
+    assert "created >=" in plan.split("Index Cond:")[1]
+
+
+@pytest.fixture
+def sector_item(warehouse, stock, product):
+    return StockItem.objects.create(stock=stock, product=product)
+
+
+def quantity(stock_item):
+    stock_item.refresh_from_db()
+    return stock_item.quantity
+
+
+@pytest.mark.django_db
+def test_movements_keep_the_stock_balance(sector_item, stock, category, measure):
+    other_product = Product.objects.create(
+        category=category, measure=measure, name="other", code="other"
+    )
+    other_item = StockItem.objects.create(stock=stock, product=other_product)
+
+    entry = StockEntry.objects.create(stock_item=sector_item, entry_quantity=10)
+    assert quantity(sector_item) == 10
+    withdrawal = StockWithdrawal.objects.create(
+        stock_item=sector_item, withdraw_quantity=3
+    )
+    assert quantity(sector_item) == 7
+
+    entry.entry_quantity = 12
+    entry.save()
+    assert quantity(sector_item) == 9
+
+    withdrawal.delete()
+    assert quantity(sector_item) == 12
+
+    entry.stock_item = other_item
+    entry.entry_quantity = 5
+    entry.save()
+    assert quantity(sector_item) == 0
+    assert quantity(other_item) == 5
+
+    entry.delete()
+    assert quantity(other_item) == 0
+
+
+@pytest.mark.django_db
+def test_warehouse_balance_is_not_driven_by_the_ledger(warehouse, product):
+    warehouse_item = StockItem.objects.create(
+        stock=warehouse, product=product, quantity=5
+    )
+
+    StockEntry.objects.create(stock_item=warehouse_item, entry_quantity=10)
+
+    assert quantity(warehouse_item) == 5
+
+
+@pytest.mark.django_db
+def test_rebuild_stock_balances_reports_negative_ledgers(sector_item, stock, product):
+    StockEntry.objects.create(stock_item=sector_item, entry_quantity=4)
+    StockItem.objects.filter(id=sector_item.id).update(quantity=1)
+    negative_item = StockItem.objects.create(stock=stock, product=product)
+    StockWithdrawal.objects.bulk_create(
+        [StockWithdrawal(stock_item=negative_item, withdraw_quantity=2)]
+    )
+
+    with pytest.raises(CommandError, match="drifted"):
+        call_command("rebuild_stock_balances", "--check", stdout=io.StringIO())
+    with pytest.raises(CommandError, match=f": {negative_item.id}$"):
+        call_command("rebuild_stock_balances", stdout=io.StringIO())
+
+    assert quantity(sector_item) == 4
+    assert quantity(negative_item) == 0
+
+
+APPROVAL_ROUNDS = [
+    # (order item index, added quantity) per round; the second round updates
+    # items that already have a stock entry.
+    [(0, 2), (1, 4), (2, 5)],
+    [(0, 3), (2, 5), (3, 1)],
+]
+
+
+@pytest.fixture
+def approval_items(warehouse, client, supplier, category, measure, product):
+    other_product = Product.objects.create(
+        category=category, measure=measure, name="other", code="other"
+    )
+    for item_product in (product, other_product):
+        StockItem.objects.create(stock=warehouse, product=item_product, quantity=50)
+    orders = [Order.objects.create(client=client) for _ in range(2)]
+    items = [
+        (orders[0], product, 3, 0),
+        (orders[0], other_product, 4, 0),
+        (orders[1], product, 5, 7),
+        (orders[1], other_product, 2, 0),
+    ]
+    return [
+        OrderItem.objects.create(
+            order=item_order,
+            product=item_product,
+            quantity=item_quantity,
+            supplier=supplier,
+            supplier_quantity=supplier_quantity,
+        )
+        for item_order, item_product, item_quantity, supplier_quantity in items
+    ]
+
+
+def approval_state():
+    return {
+        "stock_items": sorted(
+            StockItem.objects.values_list("stock_id", "product_id", "quantity")
+        ),
+        "stock_entries": sorted(
+            StockEntry.objects.values_list(
+                "order_item_id", "stock_item__stock_id", "entry_quantity"
+            )
+        ),
+        "dispatch_reports": sorted(
+            DispatchReport.objects.values_list(
+                "product_id", "public_defense_id", "quantity"
+            )
+        ),
+        "receiving_reports": sorted(
+            ReceivingReport.objects.values_list("supplier_id", "product_id", "quantity")
+        ),
+        "order_items": sorted(OrderItem.objects.values_list("id", "added_quantity")),
+        "orders": sorted(
+            Order.objects.values_list(
+                "id", "completely_added_to_stock", "partially_added_to_stock", "is_sent"
+            )
+        ),
+    }
+
+
+def approve_in_rounds(api_client, approval_items, bulk):
+    """Run ``APPROVAL_ROUNDS`` and return the resulting state, rolled back."""
+    with transaction.atomic():
+        for approvals in APPROVAL_ROUNDS:
+            if bulk:
+                response = api_client.patch(
+                    "/order/order-items/approve/",
+                    [
+                        {"id": approval_items[index].id, "added_quantity": added}
+                        for index, added in approvals
+                    ],
+                    format="json",
+                )
+                assert response.status_code == 200
+                continue
+            for index, added in approvals:
+                response = api_client.patch(
+                    f"/order/order-items/{approval_items[index].id}/",
+                    {"added_quantity": added},
+                    format="json",
+                )
+                assert response.status_code == 200
+        state = approval_state()
+        transaction.set_rollback(True)
+    return state
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("in_warehouse", [False, True])
+def test_bulk_approval_matches_one_at_a_time(
+    warehouse, approval_items, api_client, client, in_warehouse
+):
+    if in_warehouse:
+        client.stock = warehouse
+        client.save()
+
+    one_at_a_time = approve_in_rounds(api_client, approval_items, bulk=False)
+    bulk = approve_in_rounds(api_client, approval_items, bulk=True)
+
+    assert bulk == one_at_a_time
+    assert [row[1:] for row in bulk["orders"]] == [
+        (True, False, True),
+        (False, True, True),
+    ]
+    assert bool(bulk["dispatch_reports"]) != in_warehouse
+    assert bulk["receiving_reports"]
+
+
+@pytest.mark.django_db
+def test_update_order_status_flags_complete_and_partial_orders(order, product):
+    partial = Order.objects.create(client=order.client)
+    untouched = Order.objects.create(client=order.client)
+    OrderItem.objects.create(order=order, product=product, quantity=2, added_quantity=2)
+    OrderItem.objects.create(
+        order=partial, product=product, quantity=2, added_quantity=1
+    )
+    OrderItem.objects.create(order=partial, product=product, quantity=2)
+    OrderItem.objects.create(order=untouched, product=product, quantity=2)
+
+    update_order_status([order.id, partial.id, untouched.id])
+
+    flags = dict(
+        (row[0], row[1:])
+        for row in Order.objects.values_list(
+            "id", "completely_added_to_stock", "partially_added_to_stock", "is_sent"
+        )
+    )
+    assert flags == {
+        order.id: (True, False, True),
+        partial.id: (False, True, True),
+        untouched.id: (False, False, False),
+    }
+
+
+@pytest.fixture
+def order_lines(monkeypatch, category, measure):
+    monkeypatch.setenv("RESTRICTED_DATES", "[]")
+
+    def order_lines(count):
+        return [
+            {
+                "product": Product.objects.create(
+                    category=category, measure=measure, name=f"p{i}", code=f"p{i}"
+                ).id,
+                "quantity": 2,
+            }
+            for i in range(count)
+        ]
+
+    return order_lines
+
+
+@pytest.mark.django_db
+def test_order_with_an_unknown_product_is_not_created(api_client, client, order_lines):
+    items = order_lines(2) + [{"product": 0, "quantity": 1}]
+
+    response = api_client.post(
+        "/order/with-items/", {"client": client.id, "items": items}, format="json"
+    )
+
+    assert response.status_code == 400
+    assert "Invalid product ids: [0]" in str(response.data["items"])
+    assert not Order.objects.exists()
+
+
+@pytest.mark.django_db
+def test_order_with_items_rolls_back_when_an_item_fails(client, order_lines):
+    # Passes validation but overflows the integer column on insert.
+    items = order_lines(2) + [dict(order_lines(1)[0], quantity=2**31)]
+    serializer = OrderWithItemsSerializer(data={"client": client.id, "items": items})
+    assert serializer.is_valid(), serializer.errors
+
+    with pytest.raises(DataError):
+        serializer.save()
+
+    assert not Order.objects.exists()
+    assert not OrderItem.objects.exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("count", [1, 50])
+def test_order_with_items_queries_do_not_grow_with_items(
+    api_client, client, supplier, order_lines, django_assert_num_queries, count
+):
+    items = [dict(item, supplier=supplier.id) for item in order_lines(count)]
+
+    with django_assert_num_queries(7):
+        response = api_client.post(
+            "/order/with-items/", {"client": client.id, "items": items}, format="json"
+        )
+
+    assert response.status_code == 201
+    assert len(response.data["items"]) == count
+    assert OrderItem.objects.filter(order_id=response.data["id"]).count() == count
@@ -4,10 +4,13 @@ from .views import (
     AllOrderItemsView,
     MaterialsOrderListCreateView,
     MaterialsOrderRetrieveUpdateDestroyView,
+    OrderFileDownloadView,
+    OrderItemBulkApproveView,
     OrderItemListCreateView,
     OrderItemRetrieveUpdateDestroyView,
     OrderListCreateView,
     OrderRetrieveUpdateDestroyView,
+    OrderWithItemsCreateView,
     ProtocolWithdrawalListCreateView,
     ProtocolWithdrawalRetrieveUpdateDestroyView,
     StockEntryListCreateView,
@@ -24,15 +27,22 @@ app_name = "order"
 
 urlpatterns = [
     path("", OrderListCreateView.as_view(), name="order-list-create"),
+    path("with-items/", OrderWithItemsCreateView.as_view(), name="order-with-items"),
     path(
         "<int:pk>/",
         OrderRetrieveUpdateDestroyView.as_view(),
         name="order-retrieve-update-destroy",
     ),
+    path("<int:pk>/file/", OrderFileDownloadView.as_view(), name="order-file-download"),
     path(
         "order-items/", OrderItemListCreateView.as_view(), name="order-item-list-create"
     ),
     path("order-items/all/", AllOrderItemsView.as_view(), name="all-order-items"),
+    path(
+        "order-items/approve/",
+        OrderItemBulkApproveView.as_view(),
+        name="order-item-bulk-approve",
+    ),
     path(
         "order-items/<int:pk>/",
         OrderItemRetrieveUpdateDestroyView.as_view(),
@@ -1,27 +1,36 @@
 import datetime
 import os
-import tempfile
 
-import boto3
+from botocore.exceptions import ClientError
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
 from django.db.models import Sum
+from django.http import Http404, StreamingHttpResponse
 from django.utils.dateparse import parse_date
 from rest_framework import generics, permissions, status
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from SIRI_BACK.date_ranges import date_span_range, in_range
+from stock.mixins import EagerLoadingMixin
 from stock.models import (
     Category,
     DispatchReport,
     ProtocolItem,
     ReceivingReport,
-    Stock,
-    StockItem,
     Supplier,
 )
-from stock.pagination import SupplierOrderItemPagination
-from user.models import Client
+from stock.pagination import CreatedCursorPagination
+from stock.services import (
+    WAREHOUSE_STOCK_ID,
+    apply_stock_movements,
+    get_or_create_stock_item,
+    reserve_stock_item_quantity,
+)
+from stock.storage import get_client, open_object_stream
+from stock.tasks import queue_email, queue_upload
 
 from .errors import (
     MaterialsOrderAlreadyExistsException,
@@ -42,8 +51,10 @@ from .models import (
 )
 from .serializers import (
     MaterialsOrderSerializer,
+    OrderItemApprovalSerializer,
     OrderItemSerializer,
     OrderSerializer,
+    OrderWithItemsSerializer,
     ProtocolWithdrawalSerializer,
     RetrieveMaterialsOrderSerializer,
     RetrieveOrderItemSerializer,
@@ -58,25 +69,23 @@ from .serializers import (
     SupplierOrderItemSerializer,
     SupplierOrderSerializer,
 )
+from .services import approve_order_items
 
-client = boto3.client(
-    "s3",
-    region_name=os.environ.get("AWS_REGION_NAME"),
-    aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
-)
+
+def check_restricted_dates():
+    restricted_dates = os.environ.get("RESTRICTED_DATES").strip("][").split(",")
+    today = datetime.date.today().strftime("%d/%m/%Y")
+    if today in restricted_dates:
+        raise RestrictedDateException()
 
 
-class OrderListCreateView(generics.ListCreateAPIView):
+class OrderListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = Order.objects.all()
     serializer_class = RetrieveOrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def create(self, request, *args, **kwargs):
-        restricted_dates = os.environ.get("RESTRICTED_DATES").strip("][").split(",")
-        today = datetime.date.today().strftime("%d/%m/%Y")
-        if today in restricted_dates:
-            raise RestrictedDateException()
+        check_restricted_dates()
         return super().create(request, *args, **kwargs)
 
     def get_serializer_class(self):
@@ -86,7 +95,19 @@ class OrderListCreateView(generics.ListCreateAPIView):
             return OrderSerializer
 
 
-class OrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class OrderWithItemsCreateView(generics.CreateAPIView):
+    queryset = Order.objects.all()
+    serializer_class = OrderWithItemsSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        check_restricted_dates()
+        return super().create(request, *args, **kwargs)
+
+
+class OrderRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = Order.objects.all()
     serializer_class = RetrieveOrderSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -95,17 +116,12 @@ class OrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         instance = serializer.save()
         file_data = self.request.data.get("file")
         if file_data:
-            with tempfile.TemporaryFile() as tmp_file:
-                for chunk in file_data.file:
-                    tmp_file.write(chunk)
-                tmp_file.seek(0)
-                client.upload_fileobj(
-                    tmp_file,
-                    os.environ.get("AWS_BUCKET_NAME"),
-                    f"confirm-order/{instance.id}",
-                )
-            instance.file = str(instance.id)
-        instance.save()
+            queue_upload(
+                instance,
+                file_data,
+                f"confirm-order/{instance.id}",
+                file_value=str(instance.id),
+            )
 
     def perform_destroy(self, instance):
         if instance.partially_added_to_stock or instance.completely_added_to_stock:
@@ -119,7 +135,29 @@ class OrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return OrderSerializer
 
 
-class AllOrderItemsView(generics.GenericAPIView):
+class OrderFileDownloadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk, *args, **kwargs):
+        order = get_object_or_404(Order, pk=pk)
+        if not order.file:
+            raise Http404
+        try:
+            s3_object, chunks = open_object_stream(f"confirm-order/{order.id}")
+        except ClientError as error:
+            if error.response["Error"]["Code"] == "NoSuchKey":
+                raise Http404
+            raise
+        response = StreamingHttpResponse(
+            chunks,
+            content_type=s3_object.get("ContentType") or "application/octet-stream",
+        )
+        response["Content-Length"] = s3_object["ContentLength"]
+        response["Content-Disposition"] = f'attachment; filename="order-{order.id}"'
+        return response
+
+
+class AllOrderItemsView(EagerLoadingMixin, generics.GenericAPIView):
     queryset = OrderItem.objects.all()
     serializer_class = RetrieveOrderItemSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -137,10 +175,11 @@ class AllOrderItemsView(generics.GenericAPIView):
         return Response(serializer.data)
 
 
-class OrderItemListCreateView(generics.ListCreateAPIView):
+class OrderItemListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = OrderItem.objects.all()
     serializer_class = RetrieveOrderItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedCursorPagination
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -167,7 +206,9 @@ class OrderItemListCreateView(generics.ListCreateAPIView):
         serializer.save()
 
 
-class OrderItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class OrderItemRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = OrderItem.objects.all()
     serializer_class = RetrieveOrderItemSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -175,158 +216,128 @@ class OrderItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     def perform_destroy(self, instance):
         description = self.request.query_params.get("description")
         if description:
-            recipient = Client.objects.get(id=instance.order.client.id).email
-            from_email = os.environ.get("EMAIL_HOST_USER")
-            email = EmailMultiAlternatives(
-                subject=f"Item {instance.product.name} do pedido {instance.order.id} NEGADO",
-                body=f"Motivo: {description}",
-                from_email=from_email,
-                to=[recipient],
-                reply_to=[from_email],
+            queue_email(
+                f"Item {instance.product.name} do pedido {instance.order.id} NEGADO",
+                f"Motivo: {description}",
+                [instance.order.client.email],
             )
-            email.send()
         instance.delete()
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
-        serializer = OrderItemSerializer(
-            instance, data=request.data, partial=kwargs.get("partial", False)
-        )
-        serializer.is_valid(raise_exception=True)
-        added_quantity = serializer.validated_data.get("added_quantity")
-        warehouse_stock = Stock.objects.get(id=1)
-        user_stock = request.user.client.stock
+        with transaction.atomic():
+            order = Order.objects.select_for_update().get(id=instance.order_id)
+            instance = OrderItem.objects.select_for_update().get(id=instance.id)
+            instance.order = order
+            serializer = OrderItemSerializer(
+                instance, data=request.data, partial=kwargs.get("partial", False)
+            )
+            serializer.is_valid(raise_exception=True)
+            added_quantity = serializer.validated_data.get("added_quantity")
+
+            if added_quantity and added_quantity > instance.quantity:
+                raise QuantityTooBigException
 
-        if added_quantity and added_quantity > instance.quantity:
-            raise QuantityTooBigException
+            if added_quantity and instance.added_quantity != added_quantity:
+                self.add_to_stock(instance, request.user.client.stock, added_quantity)
 
-        if instance.added_quantity == 0 and added_quantity:
-            stock_item, created = StockItem.objects.get_or_create(
-                product=instance.product, stock=user_stock
+            self.perform_update(serializer)
+
+            order_items = OrderItem.objects.filter(order=order)
+            all_quantities_added = all(
+                order_item.quantity == order_item.added_quantity
+                for order_item in order_items
+            )
+            any_quantity_added = any(
+                order_item.added_quantity != 0 for order_item in order_items
             )
-            if user_stock.id == warehouse_stock.id:
-                stock_item.quantity = stock_item.quantity + added_quantity
-                stock_item.save(update_fields=["quantity"])
-                ReceivingReport.objects.create(
-                    supplier=instance.supplier,
-                    product=instance.product,
-                    quantity=instance.supplier_quantity,
-                )
-            if user_stock.id != warehouse_stock.id:
-                stock_entry = StockEntry.objects.create(
-                    order_item=instance,
-                    stock_item=stock_item,
-                    entry_quantity=added_quantity,
-                )
-                quantity = stock_entry.entry_quantity - instance.added_quantity
-                if (
-                    instance.supplier_quantity
-                    and instance.quantity == added_quantity
-                    and instance.supplier
-                ):
-                    warehouse_stock_item, created = StockItem.objects.get_or_create(
-                        stock=warehouse_stock, product=instance.product
-                    )
-                    warehouse_stock_item.quantity = (
-                        warehouse_stock_item.quantity + instance.supplier_quantity
-                    )
-                    warehouse_stock_item.save(update_fields=["quantity"])
-                    ReceivingReport.objects.create(
-                        supplier=instance.supplier,
-                        product=instance.product,
-                        quantity=instance.supplier_quantity,
-                    )
-                warehouse_stock_item = StockItem.objects.get(
-                    stock=warehouse_stock, product=instance.product
-                )
-                warehouse_stock_item.quantity = warehouse_stock_item.quantity - quantity
-                warehouse_stock_item.save(update_fields=["quantity"])
-                DispatchReport.objects.create(
-                    product=stock_item.product,
-                    quantity=quantity,
-                    public_defense=stock_entry.stock_item.stock.sector.public_defense,
-                )
-        elif instance.added_quantity != added_quantity and added_quantity:
-            if user_stock.id == warehouse_stock.id:
-                stock_item, created = StockItem.objects.get_or_create(
-                    product=instance.product, stock=warehouse_stock
-                )
-                stock_item.quantity = stock_item.quantity + added_quantity
-                stock_item.save(update_fields=["quantity"])
-                ReceivingReport.objects.create(
-                    supplier=instance.supplier,
-                    product=instance.product,
-                    quantity=instance.supplier_quantity,
-                )
-            if user_stock.id != warehouse_stock.id:
-                stock_entry = StockEntry.objects.get(order_item=instance)
-                stock_entry.entry_quantity = added_quantity
-                stock_entry.save(update_fields=["entry_quantity"])
-                stock_entry = StockEntry.objects.get(order_item=instance)
-                quantity = stock_entry.entry_quantity - instance.added_quantity
-                if (
-                    instance.supplier_quantity
-                    and instance.quantity == added_quantity
-                    and instance.supplier
-                ):
-                    warehouse_stock_item = StockItem.objects.get(
-                        stock=warehouse_stock, product=instance.product
-                    )
-                    warehouse_stock_item.quantity = (
-                        warehouse_stock_item.quantity + instance.supplier_quantity
-                    )
-                    warehouse_stock_item.save(update_fields=["quantity"])
-                    ReceivingReport.objects.create(
-                        supplier=instance.supplier,
-                        product=instance.product,
-                        quantity=instance.supplier_quantity,
-                    )
-                warehouse_stock_item = StockItem.objects.get(
-                    stock=warehouse_stock, product=instance.product
-                )
-                warehouse_stock_item.quantity = warehouse_stock_item.quantity - quantity
-                warehouse_stock_item.save(update_fields=["quantity"])
-                DispatchReport.objects.create(
-                    product=stock_entry.stock_item.product,
-                    quantity=quantity,
-                    public_defense=stock_entry.stock_item.stock.sector.public_defense,
-                )
 
-        self.perform_update(serializer)
+            if all_quantities_added:
+                order.completely_added_to_stock = True
+                order.partially_added_to_stock = False
+                order.is_sent = True
+            elif any_quantity_added:
+                order.partially_added_to_stock = True
+                order.completely_added_to_stock = False
+                order.is_sent = True
+
+            order.save(
+                update_fields=[
+                    "completely_added_to_stock",
+                    "partially_added_to_stock",
+                    "is_sent",
+                ]
+            )
 
-        order_items = OrderItem.objects.filter(order=instance.order)
-        all_quantities_added = all(
-            order_item.quantity == order_item.added_quantity
-            for order_item in order_items
-        )
-        any_quantity_added = any(
-            order_item.added_quantity != 0 for order_item in order_items
-        )
+        return Response(serializer.data)
+
+    def add_to_stock(self, instance, user_stock, added_quantity):
+        """
+        Move the newly added quantity of ``instance`` into ``user_stock``.
+        Sector stocks receive it as a stock entry dispatched from the warehouse,
+        and the warehouse first receives the supplier quantity once the item is
+        fully added.
+        """
+        product = instance.product
+        if user_stock.id == WAREHOUSE_STOCK_ID:
+            apply_stock_movements({(WAREHOUSE_STOCK_ID, product.id): added_quantity})
+            ReceivingReport.objects.create(
+                supplier=instance.supplier,
+                product=product,
+                quantity=instance.supplier_quantity,
+            )
+            return
 
-        if all_quantities_added:
-            instance.order.completely_added_to_stock = True
-            instance.order.partially_added_to_stock = False
-            instance.order.is_sent = True
-        elif any_quantity_added:
-            instance.order.partially_added_to_stock = True
-            instance.order.completely_added_to_stock = False
-            instance.order.is_sent = True
-
-        instance.order.save(
-            update_fields=[
-                "completely_added_to_stock",
-                "partially_added_to_stock",
-                "is_sent",
-            ]
+        if instance.added_quantity == 0:
+            stock_entry = StockEntry.objects.create(
+                order_item=instance,
+                stock_item=get_or_create_stock_item(user_stock.id, product.id),
+                entry_quantity=added_quantity,
+            )
+        else:
+            stock_entry = StockEntry.objects.get(order_item=instance)
+            stock_entry.entry_quantity = added_quantity
+            stock_entry.save(update_fields=["entry_quantity"])
+
+        quantity = added_quantity - instance.added_quantity
+        warehouse_quantity = -quantity
+        if (
+            instance.supplier_quantity
+            and instance.quantity == added_quantity
+            and instance.supplier
+        ):
+            warehouse_quantity += instance.supplier_quantity
+            ReceivingReport.objects.create(
+                supplier=instance.supplier,
+                product=product,
+                quantity=instance.supplier_quantity,
+            )
+        apply_stock_movements({(WAREHOUSE_STOCK_ID, product.id): warehouse_quantity})
+        DispatchReport.objects.create(
+            product=product,
+            quantity=quantity,
+            public_defense=stock_entry.stock_item.stock.sector.public_defense,
         )
 
-        return Response(serializer.data)
+
+class OrderItemBulkApproveView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def patch(self, request, *args, **kwargs):
+        serializer = OrderItemApprovalSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        order_items = approve_order_items(
+            {item["id"]: item["added_quantity"] for item in serializer.validated_data},
+            request.user.client.stock,
+        )
+        return Response(OrderItemSerializer(order_items, many=True).data)
 
 
-class StockWithdrawalListCreateView(generics.ListCreateAPIView):
+class StockWithdrawalListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = StockWithdrawal.objects.all()
     serializer_class = RetrieveStockWithdrawalSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedCursorPagination
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -342,8 +353,18 @@ class StockWithdrawalListCreateView(generics.ListCreateAPIView):
         elif self.request.method in ["POST"]:
             return StockWithdrawalSerializer
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            reserve_stock_item_quantity(
+                serializer.validated_data["stock_item"].id,
+                serializer.validated_data.get("withdraw_quantity", 0),
+            )
+            serializer.save()
+
 
-class StockWithdrawalRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class StockWithdrawalRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = StockWithdrawal.objects.all()
     serializer_class = RetrieveStockWithdrawalSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -354,11 +375,28 @@ class StockWithdrawalRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPI
         elif self.request.method in ["PUT", "PATCH"]:
             return StockWithdrawalSerializer
 
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        stock_item = serializer.validated_data.get("stock_item", instance.stock_item)
+        quantity = serializer.validated_data.get(
+            "withdraw_quantity", instance.withdraw_quantity
+        )
+        if stock_item.id == instance.stock_item_id:
+            quantity -= instance.withdraw_quantity
+        with transaction.atomic():
+            reserve_stock_item_quantity(stock_item.id, quantity)
+            serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
 
-class StockEntryListCreateView(generics.ListCreateAPIView):
+class StockEntryListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = StockEntry.objects.all()
     serializer_class = RetrieveStockEntrySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedCursorPagination
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -375,7 +413,9 @@ class StockEntryListCreateView(generics.ListCreateAPIView):
             return StockEntrySerializer
 
 
-class StockEntryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class StockEntryRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = StockEntry.objects.all()
     serializer_class = RetrieveStockEntrySerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -387,7 +427,7 @@ class StockEntryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView)
             return StockEntrySerializer
 
 
-class SupplierOrderListCreateView(generics.ListCreateAPIView):
+class SupplierOrderListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = SupplierOrder.objects.all()
     serializer_class = RetrieveSupplierOrderSerializer
     permission_classes = [IsAdminUser]
@@ -407,7 +447,9 @@ class SupplierOrderListCreateView(generics.ListCreateAPIView):
             return SupplierOrderSerializer
 
 
-class SupplierOrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class SupplierOrderRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = SupplierOrder.objects.all()
     serializer_class = RetrieveSupplierOrderSerializer
     permission_classes = [IsAdminUser]
@@ -419,10 +461,11 @@ class SupplierOrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIVi
             return SupplierOrderSerializer
 
 
-class SupplierOrderItemListCreateView(generics.ListCreateAPIView):
+class SupplierOrderItemListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = SupplierOrderItem.objects.all()
     serializer_class = RetrieveSupplierOrderItemSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = CreatedCursorPagination
 
     def create(self, request, *args, **kwargs):
         try:
@@ -453,7 +496,6 @@ class SupplierOrderItemListCreateView(generics.ListCreateAPIView):
         category_id = self.request.query_params.get("category_id")
 
         if not (supplier_id and initial_date and final_date and category_id):
-            self.pagination_class = SupplierOrderItemPagination
             queryset = super().get_queryset()
             supplier_order_ids = self.request.query_params.get("supplier_order_id")
             if supplier_order_ids:
@@ -466,8 +508,9 @@ class SupplierOrderItemListCreateView(generics.ListCreateAPIView):
             supplier = Supplier.objects.get(id=supplier_id)
             initial_date = parse_date(initial_date)
             final_date = parse_date(final_date)
+            created_range = date_span_range(initial_date, final_date)
             category = Category.objects.get(id=category_id)
-        except (ValueError, Supplier.DoesNotExist, Category.DoesNotExist):
+        except (TypeError, ValueError, Supplier.DoesNotExist, Category.DoesNotExist):
             return Response(
                 {"detail": "Invalid query parameters."},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -475,9 +518,8 @@ class SupplierOrderItemListCreateView(generics.ListCreateAPIView):
 
         supplier_orders = (
             SupplierOrder.objects.filter(
+                in_range("created", created_range),
                 supplier=supplier,
-                created__date__gte=initial_date,
-                created__date__lte=final_date,
                 protocol__category=category,
             )
             .annotate(total_quantity=Sum("supplierorderitem__quantity"))
@@ -529,7 +571,9 @@ class SupplierOrderItemListCreateView(generics.ListCreateAPIView):
             return SupplierOrderItemSerializer
 
 
-class SupplierOrderItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class SupplierOrderItemRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = SupplierOrderItem.objects.all()
     serializer_class = SupplierOrderItemSerializer
     permission_classes = [IsAdminUser]
@@ -539,10 +583,11 @@ class SupplierOrderItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyA
         instance.delete()
 
 
-class ProtocolWithdrawalListCreateView(generics.ListCreateAPIView):
+class ProtocolWithdrawalListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = ProtocolWithdrawal.objects.all()
     serializer_class = RetrieveProtocolWithdrawalSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = CreatedCursorPagination
 
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
@@ -560,14 +605,14 @@ class ProtocolWithdrawalListCreateView(generics.ListCreateAPIView):
 
 
 class ProtocolWithdrawalRetrieveUpdateDestroyView(
-    generics.RetrieveUpdateDestroyAPIView
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
 ):
     queryset = ProtocolWithdrawal.objects.all()
     serializer_class = ProtocolWithdrawalSerializer
     permission_classes = [IsAdminUser]
 
 
-class MaterialsOrderListCreateView(generics.ListCreateAPIView):
+class MaterialsOrderListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = MaterialsOrder.objects.all()
     serializer_class = RetrieveMaterialsOrderSerializer
     permission_classes = [IsAdminUser]
@@ -579,7 +624,9 @@ class MaterialsOrderListCreateView(generics.ListCreateAPIView):
             return MaterialsOrderSerializer
 
 
-class MaterialsOrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class MaterialsOrderRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = MaterialsOrder.objects.all()
     serializer_class = RetrieveMaterialsOrderSerializer
     permission_classes = [IsAdminUser]
@@ -587,7 +634,7 @@ class MaterialsOrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIV
     def perform_update(self, serializer):
         instance = serializer.save()
         file_data = self.request.data.get("file")
-        client.upload_fileobj(
+        get_client().upload_fileobj(
             file_data,
             os.environ.get("AWS_BUCKET_NAME"),
             f"materials-order/{instance.id}",
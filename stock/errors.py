@@ -11,3 +11,33 @@ class ProtocolItemAlreadyExistsException(APIException):
     status_code = 400
     default_detail = "The requested protocol item already exists"
     default_code = 7
+
+
+class InsufficientStockException(APIException):
+    status_code = 400
+    default_detail = "The stock item does not have enough quantity"
+    default_code = 8
+
+
+class FileUploadPendingException(APIException):
+    status_code = 409
+    default_detail = "The file is still being uploaded, try again in a moment"
+    default_code = 9
+
+
+class UploadNotFoundException(APIException):
+    status_code = 400
+    default_detail = "The uploaded file was not found in storage"
+    default_code = 10
+
+
+class FileRequiredException(APIException):
+    status_code = 400
+    default_detail = "A file is required"
+    default_code = 11
+
+
+class UploadTokenInvalidException(APIException):
+    status_code = 400
+    default_detail = "The upload token is invalid"
+    default_code = 12
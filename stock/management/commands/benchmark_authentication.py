@@ -0,0 +1,63 @@
+import base64
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.authtoken.models import Token
+
+from user.authentication import ExpiringTokenAuthentication, get_token_cache_key
+
+
+class Command(BaseCommand):
+    help = "Measure per-request authentication cost of Basic and token auth"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+
+    def handle(self, *args, **options):
+        requests = options["requests"]
+        factory = RequestFactory()
+
+        with transaction.atomic():
+            username = f"benchmark-{uuid.uuid4().hex[:12]}"
+            password = uuid.uuid4().hex
+            user = User.objects.create_user(username=username, password=password)
+            token = Token.objects.create(user=user)
+
+            credentials = base64.b64encode(f"{username}:{password}".encode())
+            basic_request = factory.get(
+                "/", HTTP_AUTHORIZATION=f"Basic {credentials.decode()}"
+            )
+            token_request = factory.get("/", HTTP_AUTHORIZATION=f"Token {token.key}")
+
+            self.run("basic", BasicAuthentication(), basic_request, requests)
+
+            authentication = ExpiringTokenAuthentication()
+            start = time.perf_counter()
+            for _ in range(requests):
+                cache.delete(get_token_cache_key(token.key))
+                authentication.authenticate(token_request)
+            self.report("token (uncached)", start, requests)
+
+            self.run("token (cached)", authentication, token_request, requests)
+
+            cache.delete(get_token_cache_key(token.key))
+            transaction.set_rollback(True)
+
+    def run(self, label, authentication, request, requests):
+        start = time.perf_counter()
+        for _ in range(requests):
+            authentication.authenticate(request)
+        self.report(label, start, requests)
+
+    def report(self, label, start, requests):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{label}: {elapsed * 1000:.1f}ms total, "
+            f"{elapsed * 1000 / requests:.3f}ms per request"
+        )
@@ -0,0 +1,376 @@
+import random
+import re
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from order.models import (
+    Order,
+    ProtocolWithdrawal,
+    StockEntry,
+    StockWithdrawal,
+    SupplierOrder,
+)
+from SIRI_BACK.date_ranges import date_span_range, day_range, in_range
+from stock.models import (
+    Category,
+    DispatchReport,
+    Invoice,
+    Measure,
+    Product,
+    Protocol,
+    ProtocolItem,
+    PublicDefense,
+    ReceivingReport,
+    Sector,
+    Stock,
+    StockItem,
+    Supplier,
+)
+from user.models import Client
+
+NEW_INDEXES = (
+    (Order, "order_created_id_idx"),
+    (Order, "order_client_created_idx"),
+    (StockWithdrawal, "stockwithdrawal_item_date_idx"),
+    (StockWithdrawal, "stockwithdrawal_date_cover_idx"),
+    (StockEntry, "stockentry_item_date_idx"),
+    (StockEntry, "stockentry_date_cover_idx"),
+    (SupplierOrder, "supplierorder_created_id_idx"),
+    (SupplierOrder, "supplierorder_supplier_idx"),
+    (ProtocolWithdrawal, "protocolwithdraw_item_qty_idx"),
+    (Product, "product_created_idx"),
+    (StockItem, "stockitem_stock_created_idx"),
+    (Protocol, "protocol_created_idx"),
+    (Protocol, "protocol_end_date_idx"),
+    (Invoice, "invoice_created_idx"),
+)
+HISTORY_DAYS = 3 * 365
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed the movement and report tables and compare EXPLAIN (ANALYZE, "
+        "BUFFERS) of the hot queries with and without the composite indexes. "
+        "Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sectors", type=int, default=40)
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument(
+            "--movements",
+            type=int,
+            default=200000,
+            help="Stock entries and withdrawals to create, each",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--plans", action="store_true", help="Print the full query plans"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Query plans are only comparable on PostgreSQL")
+        random.seed(options["seed"])
+
+        with transaction.atomic():
+            start = time.perf_counter()
+            context = self.seed(options)
+            self.stdout.write(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+            self.analyze()
+            after = self.explain_all(context)
+            with connection.schema_editor(atomic=False) as schema_editor:
+                for model, name in NEW_INDEXES:
+                    index = next(i for i in model._meta.indexes if i.name == name)
+                    schema_editor.remove_index(model, index)
+            self.analyze()
+            before = self.explain_all(context)
+
+            for label in after:
+                self.report(label, before[label], after[label], options["plans"])
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        now = timezone.now()
+        suffix = uuid.uuid4().hex[:8]
+
+        public_defense = PublicDefense.objects.create(
+            name=f"benchmark-{suffix}", district="benchmark", address="benchmark"
+        )
+        sectors = Sector.objects.bulk_create(
+            Sector(name=f"benchmark-{suffix}-{i}", public_defense=public_defense)
+            for i in range(options["sectors"])
+        )
+        stocks = Stock.objects.bulk_create(Stock(sector=sector) for sector in sectors)
+        category = Category.objects.create(name=f"benchmark-{suffix}")
+        measure = Measure.objects.create(name=f"benchmark-{suffix}")
+        products = Product.objects.bulk_create(
+            (
+                Product(
+                    category=category,
+                    measure=measure,
+                    name=f"benchmark-{suffix}-{i}",
+                    code=f"B{i:06d}",
+                    price=random.uniform(1, 100),
+                )
+                for i in range(options["products"])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        stock_items = StockItem.objects.bulk_create(
+            (
+                StockItem(stock=stock, product=product, quantity=random.randint(0, 50))
+                for stock in stocks
+                for product in random.sample(products, len(products) // 10 or 1)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+        def history():
+            return now - timedelta(days=random.uniform(0, HISTORY_DAYS))
+
+        StockEntry.objects.bulk_create(
+            (
+                StockEntry(
+                    stock_item=random.choice(stock_items),
+                    entry_quantity=random.randint(1, 20),
+                    created=history(),
+                )
+                for _ in range(options["movements"])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        StockWithdrawal.objects.bulk_create(
+            (
+                StockWithdrawal(
+                    stock_item=random.choice(stock_items),
+                    withdraw_quantity=random.randint(1, 10),
+                    created=history(),
+                )
+                for _ in range(options["movements"])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        # The movement dates are auto_now, so bulk_create stamps them all with
+        # the current time; spread them like the created dates instead.
+        StockEntry.objects.filter(stock_item__stock__in=stocks).update(
+            entry_date=F("created")
+        )
+        StockWithdrawal.objects.filter(stock_item__stock__in=stocks).update(
+            withdraw_date=F("created")
+        )
+
+        supplier = Supplier.objects.create(name=f"benchmark-{suffix}")
+        protocols = Protocol.objects.bulk_create(
+            Protocol(
+                code=f"benchmark-{suffix}-{i}",
+                supplier=supplier,
+                category=category,
+                start_date=history(),
+                end_date=now + timedelta(days=random.uniform(-HISTORY_DAYS, 365)),
+                created=history(),
+            )
+            for i in range(max(len(products) // 20, 1))
+        )
+        protocol_items = ProtocolItem.objects.bulk_create(
+            (
+                ProtocolItem(
+                    protocol=random.choice(protocols),
+                    product=product,
+                    original_quantity=1000,
+                    quantity=1000,
+                )
+                for product in products
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        ProtocolWithdrawal.objects.bulk_create(
+            (
+                ProtocolWithdrawal(
+                    protocol_item=random.choice(protocol_items),
+                    withdraw_quantity=random.randint(1, 10),
+                    created=history(),
+                )
+                for _ in range(options["movements"] // 4)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+        user = User.objects.create_user(username=f"benchmark-{suffix}")
+        client = Client.objects.create(
+            user=user, name=f"benchmark-{suffix}", stock=stocks[0]
+        )
+        Order.objects.bulk_create(
+            (
+                Order(client=client, created=history())
+                for _ in range(options["movements"] // 10)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        SupplierOrder.objects.bulk_create(
+            (
+                SupplierOrder(
+                    client=client,
+                    supplier=supplier,
+                    protocol=random.choice(protocols),
+                    public_defense=public_defense,
+                    created=history(),
+                )
+                for _ in range(options["movements"] // 10)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+        receiving_reports = ReceivingReport.objects.bulk_create(
+            (
+                ReceivingReport(
+                    product=random.choice(products),
+                    supplier=supplier,
+                    quantity=random.randint(1, 20),
+                )
+                for _ in range(options["movements"] // 4)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        dispatch_reports = DispatchReport.objects.bulk_create(
+            (
+                DispatchReport(
+                    product=random.choice(products),
+                    public_defense=public_defense,
+                    quantity=random.randint(1, 20),
+                )
+                for _ in range(options["movements"] // 4)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        # Report dates are auto_now_add too; bulk_update writes them as given.
+        for report in receiving_reports + dispatch_reports:
+            report.created = history()
+        ReceivingReport.objects.bulk_update(
+            receiving_reports, ["created"], batch_size=BATCH_SIZE
+        )
+        DispatchReport.objects.bulk_update(
+            dispatch_reports, ["created"], batch_size=BATCH_SIZE
+        )
+
+        return {
+            "now": now,
+            "sectors": sectors,
+            "stock": stocks[len(stocks) // 2],
+            "stock_item": random.choice(stock_items),
+            "protocol": random.choice(protocols),
+            "supplier": supplier,
+            "client": client,
+        }
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def queries(self, context):
+        now = context["now"]
+        month = (now - timedelta(days=30), now)
+        year = (now - timedelta(days=365), now)
+        today = timezone.localdate(now)
+        in_ninety_days = today + timedelta(days=90)
+        span = (today - timedelta(days=90), today - timedelta(days=60))
+        sector_ids = [sector.id for sector in context["sectors"][:5]]
+        sector_filter = Q(stock_item__stock__sector_id__in=sector_ids) & ~Q(
+            stock_item__stock_id=1
+        )
+        return {
+            "stock report entries (month)": StockEntry.objects.filter(
+                sector_filter, entry_date__range=month
+            )
+            .values("stock_item__product_id", "stock_item__stock__sector_id")
+            .annotate(total=Sum("entry_quantity"))
+            .order_by(),
+            "stock report withdrawals (month)": StockWithdrawal.objects.filter(
+                sector_filter, withdraw_date__range=month
+            )
+            .values("stock_item__product_id", "stock_item__stock__sector_id")
+            .annotate(total=Sum("withdraw_quantity"))
+            .order_by(),
+            "stock item entries (year)": StockEntry.objects.filter(
+                stock_item=context["stock_item"], entry_date__range=year
+            ).order_by("entry_date"),
+            "stock item withdrawals (year)": StockWithdrawal.objects.filter(
+                stock_item=context["stock_item"], withdraw_date__range=year
+            ).order_by("withdraw_date"),
+            "protocol remaining quantities": ProtocolItem.objects.with_remaining_quantity()
+            .filter(protocol=context["protocol"])
+            .order_by(),
+            "receiving report (month)": ReceivingReport.objects.filter(
+                created__range=month
+            )
+            .values("product_id")
+            .annotate(total=Sum("quantity"))
+            .order_by(),
+            "dispatch report (month)": DispatchReport.objects.filter(
+                created__range=month
+            )
+            .values("product_id")
+            .annotate(total=Sum("quantity"))
+            .order_by(),
+            "supplier orders by supplier": SupplierOrder.objects.filter(
+                supplier=context["supplier"], created__gte=year[0]
+            ).order_by("-created")[:15],
+            "supplier orders page": SupplierOrder.objects.order_by("-created", "-id")[
+                :15
+            ],
+            "open protocols": Protocol.objects.filter(end_date__gte=now).order_by(
+                "end_date"
+            ),
+            # Function-wrapped date lookups next to their index-friendly ranges.
+            "protocols ending in 90 days (__date)": Protocol.objects.filter(
+                end_date__date=in_ninety_days
+            ),
+            "protocols ending in 90 days": Protocol.objects.filter(
+                in_range("end_date", day_range(in_ninety_days))
+            ),
+            "supplier orders of a span (__date)": SupplierOrder.objects.filter(
+                supplier=context["supplier"],
+                created__date__gte=span[0],
+                created__date__lte=span[1],
+            ),
+            "supplier orders of a span": SupplierOrder.objects.filter(
+                in_range("created", date_span_range(*span)),
+                supplier=context["supplier"],
+            ),
+            "stock items of a stock": StockItem.objects.filter(stock=context["stock"])
+            .exclude(quantity=0)
+            .order_by("-created", "-id")[:15],
+            "orders of a client": Order.objects.filter(
+                client=context["client"]
+            ).order_by("-created", "-id")[:15],
+            "orders page": Order.objects.order_by("-created", "-id")[:15],
+            "products page": Product.objects.order_by("-created")[:15],
+            "invoices page": Invoice.objects.order_by("-created")[:15],
+        }
+
+    def explain_all(self, context):
+        return {
+            label: queryset.explain(analyze=True, buffers=True)
+            for label, queryset in self.queries(context).items()
+        }
+
+    def report(self, label, before, after, plans):
+        self.stdout.write(f"{label}: {self.summary(before)} -> {self.summary(after)}")
+        if plans:
+            self.stdout.write(f"  before:\n{before}\n  after:\n{after}\n")
+
+    def summary(self, plan):
+        execution = re.search(r"Execution Time: ([\d.]+) ms", plan)
+        buffers = re.search(r"Buffers: shared hit=(\d+)(?: read=(\d+))?", plan)
+        pages = sum(int(group or 0) for group in buffers.groups()) if buffers else 0
+        node = plan.splitlines()[0].split("  (")[0].strip()
+        return f"{float(execution.group(1)):.2f}ms, {pages} pages, {node}"
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from stock.storage import (
+    PresignedUrlCache,
+    get_bucket_name,
+    get_client,
+    get_expires_seconds,
+)
+
+
+class Command(BaseCommand):
+    help = "Measure presigned URL signing cost per 1,000 serialized rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument(
+            "--distinct-keys",
+            type=int,
+            default=None,
+            help="Number of distinct object keys among the rows (defaults to --rows)",
+        )
+        parser.add_argument("--prefix", default="protocols")
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        distinct_keys = options["distinct_keys"] or rows
+        keys = [f"{options['prefix']}/{index % distinct_keys}" for index in range(rows)]
+        bucket = get_bucket_name() or "benchmark-bucket"
+        expires_in = get_expires_seconds()
+        client = get_client()
+
+        start = time.perf_counter()
+        for key in keys:
+            client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": bucket, "Key": key},
+                ExpiresIn=expires_in,
+                HttpMethod="GET",
+            )
+        self.report("uncached", start, rows)
+
+        cache = PresignedUrlCache(max_size=max(distinct_keys, 1))
+        start = time.perf_counter()
+        for key in keys:
+            cache.get_url(key, bucket)
+        self.report("cached (cold)", start, rows)
+
+        start = time.perf_counter()
+        for key in keys:
+            cache.get_url(key, bucket)
+        self.report("cached (warm)", start, rows)
+
+    def report(self, label, start, rows):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{label}: {elapsed * 1000:.1f}ms total, "
+            f"{elapsed * 1000 / rows * 1000:.1f}ms per 1,000 rows"
+        )
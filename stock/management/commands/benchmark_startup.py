@@ -0,0 +1,163 @@
+import json
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# What each kind of process does before it can do its first piece of work.
+TARGETS = {
+    "check": ["manage.py", "check"],
+    "wsgi": [
+        "-c",
+        "import SIRI_BACK.wsgi\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns",
+    ],
+    "asgi": [
+        "-c",
+        "import SIRI_BACK.asgi\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns",
+    ],
+    "celery": [
+        "-c",
+        "from SIRI_BACK.celery import app\n"
+        "app.loader.import_default_modules()\n"
+        "app.finalize()",
+    ],
+}
+WATCHED_MODULES = [
+    "django",
+    "rest_framework",
+    "celery",
+    "django_celery_beat",
+    "boto3",
+    "drf_yasg.views",
+    "stock.storage",
+    "stock.views",
+    "order.views",
+]
+
+
+def parse_import_times(output):
+    """``{module: (self us, cumulative us)}`` from ``python -X importtime``."""
+    times = {}
+    for line in output.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            times[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return times
+
+
+def _ms(microseconds):
+    return round(microseconds / 1000, 2)
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the web, ASGI and Celery worker entry points and `manage.py "
+        "check` in fresh interpreters with -X importtime, and report their "
+        "cold-start time and where it goes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            action="append",
+            choices=list(TARGETS),
+            help="Entry points to measure (defaults to all of them)",
+        )
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--top", type=int, default=15)
+        parser.add_argument(
+            "--module",
+            action="append",
+            default=[],
+            help="Also report the cumulative import time of this module",
+        )
+        parser.add_argument("--format", choices=["text", "json"], default="text")
+        parser.add_argument("--output", help="Write the JSON results to this file")
+
+    def handle(self, *args, **options):
+        modules = WATCHED_MODULES + options["module"]
+        results = {
+            "python": platform.python_version(),
+            "runs": options["runs"],
+            "targets": {
+                target: self.measure(target, options["runs"], modules, options["top"])
+                for target in options["target"] or TARGETS
+            },
+        }
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+        if options["format"] == "json":
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+
+    def measure(self, target, runs, modules, top):
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            process = subprocess.run(
+                [sys.executable, "-X", "importtime", *TARGETS[target]],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+            )
+            elapsed = time.perf_counter() - start
+            if process.returncode:
+                raise CommandError(f"{target} failed:\n{process.stderr[-2000:]}")
+            samples.append((elapsed, parse_import_times(process.stderr)))
+
+        wall = [round(elapsed * 1000, 1) for elapsed, _ in samples]
+        imports = [
+            _ms(sum(self_us for self_us, _ in times.values())) for _, times in samples
+        ]
+        watched = {}
+        for module in modules:
+            cumulative = [times[module][1] for _, times in samples if module in times]
+            watched[module] = _ms(statistics.median(cumulative)) if cumulative else None
+        times = samples[-1][1]
+        slowest = sorted(times.items(), key=lambda item: -item[1][0])[:top]
+        return {
+            "wall_ms": statistics.median(wall),
+            "wall_ms_runs": wall,
+            "import_ms": statistics.median(imports),
+            "modules_imported": len(times),
+            "modules_ms": watched,
+            "slowest": [
+                {"module": module, "self_ms": _ms(self_us), "cumulative_ms": _ms(cum)}
+                for module, (self_us, cum) in slowest
+            ],
+        }
+
+    def report(self, results):
+        for target, result in results["targets"].items():
+            self.stdout.write(
+                f"{target}: {result['wall_ms']:.0f}ms wall, "
+                f"{result['import_ms']:.0f}ms importing "
+                f"{result['modules_imported']} modules "
+                f"(median of {results['runs']} runs)"
+            )
+            for module, cumulative in result["modules_ms"].items():
+                if cumulative is None:
+                    self.stdout.write(f"  {module}: not imported")
+                else:
+                    self.stdout.write(f"  {module}: {cumulative:.1f}ms")
+            if result["slowest"]:
+                self.stdout.write("  slowest by self time (last run):")
+            for row in result["slowest"]:
+                self.stdout.write(
+                    f"    {row['module']}: {row['self_ms']:.1f}ms self, "
+                    f"{row['cumulative_ms']:.1f}ms cumulative"
+                )
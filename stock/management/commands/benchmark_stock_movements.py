@@ -0,0 +1,138 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.test.utils import setup_databases, teardown_databases
+
+from stock.models import (
+    Category,
+    Measure,
+    Product,
+    PublicDefense,
+    Sector,
+    Stock,
+    StockItem,
+)
+from stock.services import (
+    WAREHOUSE_STOCK_ID,
+    apply_stock_movements,
+    get_or_create_stock_item,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply stock movements to one stock item from parallel threads on a "
+        "throwaway test database and report movements per second"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument(
+            "--movements", type=int, default=50, help="Movements per thread"
+        )
+        parser.add_argument(
+            "--legacy",
+            action="store_true",
+            help="Use the previous read-modify-write updates for comparison",
+        )
+        parser.add_argument(
+            "--keepdb", action="store_true", help="Keep the test database"
+        )
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(
+            verbosity=0,
+            interactive=False,
+            keepdb=options["keepdb"],
+            aliases={"default"},
+            serialized_aliases=set(),
+        )
+        try:
+            self.benchmark(options)
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0, keepdb=options["keepdb"])
+
+    def benchmark(self, options):
+        key = (WAREHOUSE_STOCK_ID, self.create_product().id)
+        stock_item = get_or_create_stock_item(*key)
+        initial = StockItem.objects.get(id=stock_item.id).quantity
+
+        threads = options["threads"]
+        movements = options["movements"]
+        move = self.legacy_move if options["legacy"] else self.move
+        barrier = threading.Barrier(threads)
+        lock = threading.Lock()
+        applied = []
+        errors = []
+
+        def worker():
+            count = 0
+            try:
+                barrier.wait()
+                for _ in range(movements):
+                    try:
+                        move(key, stock_item.id)
+                        count += 1
+                    except Exception as error:
+                        with lock:
+                            errors.append(error)
+            finally:
+                with lock:
+                    applied.append(count)
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        final = StockItem.objects.get(id=stock_item.id).quantity
+        expected = initial + sum(applied)
+        total = threads * movements
+        self.stdout.write(
+            f"{total} movements from {threads} threads in {elapsed * 1000:.1f}ms "
+            f"({total / elapsed:.0f} movements/s)"
+        )
+        if errors:
+            self.stderr.write(
+                f"{len(errors)} movements failed, first error: "
+                f"{type(errors[0]).__name__}: {errors[0]}"
+            )
+        if final != expected:
+            raise CommandError(
+                f"Lost {expected - final} updates: expected {expected}, got {final}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"No lost updates ({final} == {expected})")
+        )
+
+    def create_product(self):
+        public_defense = PublicDefense.objects.create(
+            name="benchmark", district="benchmark", address="benchmark"
+        )
+        sector = Sector.objects.create(name="warehouse", public_defense=public_defense)
+        Stock.objects.create(id=WAREHOUSE_STOCK_ID, sector=sector)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Stock]):
+                cursor.execute(sql)
+        return Product.objects.create(
+            category=Category.objects.create(name="benchmark", code="benchmark"),
+            measure=Measure.objects.create(name="benchmark"),
+            name="benchmark",
+            code="benchmark",
+        )
+
+    def move(self, key, stock_item_id):
+        apply_stock_movements({key: 1})
+
+    def legacy_move(self, key, stock_item_id):
+        stock_item = StockItem.objects.get(id=stock_item_id)
+        stock_item.quantity = stock_item.quantity + 1
+        stock_item.save(update_fields=["quantity"])
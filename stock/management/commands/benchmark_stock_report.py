@@ -0,0 +1,125 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q, Sum
+from django.test.utils import CaptureQueriesContext
+
+from order.models import StockEntry, StockWithdrawal
+from stock.models import Product, PublicDefense, Sector
+from stock.reports import get_stock_report
+
+
+def legacy_stock_report(
+    initial_date, final_date, product_ids, public_defense_ids, sector_ids, categories
+):
+    """Per-(product, group) aggregate loop previously run by StockReport.get."""
+    if public_defense_ids:
+        group_key, group_model = "public_defense", PublicDefense
+        group_ids = public_defense_ids
+        group_filter = "stock_item__stock__sector__public_defense_id"
+    else:
+        group_key, group_model = "sector", Sector
+        group_ids = sector_ids
+        group_filter = "stock_item__stock__sector_id"
+    if not product_ids:
+        product_ids = Product.objects.values_list("id", flat=True)
+
+    output_dict = {}
+    for product_id in product_ids:
+        product = Product.objects.get(id=product_id)
+        if categories and str(product.category_id) not in categories:
+            continue
+        for group_id in group_ids:
+            group = group_model.objects.get(id=group_id)
+            movement_filters = Q(stock_item__product_id=product_id)
+            movement_filters &= Q(**{group_filter: group_id})
+            movement_filters &= ~Q(stock_item__stock_id=1)
+            entry_quantity = (
+                StockEntry.objects.filter(
+                    movement_filters,
+                    entry_date__gte=initial_date,
+                    entry_date__lte=final_date,
+                ).aggregate(Sum("entry_quantity"))["entry_quantity__sum"]
+                or 0
+            )
+            withdrawal_quantity = (
+                StockWithdrawal.objects.filter(
+                    movement_filters,
+                    withdraw_date__gte=initial_date,
+                    withdraw_date__lte=final_date,
+                ).aggregate(Sum("withdraw_quantity"))["withdraw_quantity__sum"]
+                or 0
+            )
+            item = {
+                group_key: group.name,
+                "product_code": product.code,
+                "product_name": product.name,
+                "entry_quantity": entry_quantity,
+                "withdrawal_quantity": withdrawal_quantity,
+                "entry_price": product.price * entry_quantity,
+                "withdrawal_price": product.price * withdrawal_quantity,
+            }
+            key = (product.code, group.name)
+            if key not in output_dict:
+                output_dict[key] = item
+            else:
+                for field in (
+                    "entry_quantity",
+                    "withdrawal_quantity",
+                    "entry_price",
+                    "withdrawal_price",
+                ):
+                    output_dict[key][field] += item[field]
+    return list(output_dict.values())
+
+
+class Command(BaseCommand):
+    help = "Compare query count and latency of the stock report engines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--initial-date", required=True, help="YYYY-MM-DD")
+        parser.add_argument("--final-date", required=True, help="YYYY-MM-DD")
+        parser.add_argument("--product", action="append", default=[])
+        parser.add_argument("--public-defense", action="append", default=[])
+        parser.add_argument("--sector", action="append", default=[])
+        parser.add_argument("--category", action="append", default=[])
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument(
+            "--skip-legacy",
+            action="store_true",
+            help="Only run the grouped engine (the legacy path can take minutes)",
+        )
+
+    def handle(self, *args, **options):
+        arguments = (
+            options["initial_date"],
+            options["final_date"],
+            options["product"],
+            options["public_defense"],
+            options["sector"],
+            options["category"],
+        )
+        engines = [("grouped", get_stock_report)]
+        if not options["skip_legacy"]:
+            engines.append(("legacy", legacy_stock_report))
+
+        results = {}
+        for name, engine in engines:
+            timings = []
+            for _ in range(options["repeat"]):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    results[name] = engine(*arguments)
+                    timings.append(time.perf_counter() - start)
+            self.stdout.write(
+                f"{name}: rows={len(results[name])} queries={len(queries)} "
+                f"best={min(timings) * 1000:.1f}ms "
+                f"mean={sum(timings) / len(timings) * 1000:.1f}ms"
+            )
+
+        if "legacy" in results:
+            if results["grouped"] == results["legacy"]:
+                self.stdout.write(self.style.SUCCESS("Reports are identical"))
+            else:
+                self.stdout.write(self.style.ERROR("Reports differ"))
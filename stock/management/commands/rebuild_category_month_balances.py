@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from stock.services import rebuild_category_month_balances
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the open monthly category balances used by the accountant "
+        "report from their receiving and dispatch reports"
+    )
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_category_month_balances()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {rebuilt} monthly category balances")
+        )
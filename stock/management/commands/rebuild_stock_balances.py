@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from stock.models import StockItem
+from stock.services import with_ledger_quantity
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the materialized StockItem.quantity of sector stock items from "
+        "their stock entries and withdrawals"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report drifted balances and exit non-zero if any are found",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = list(
+                with_ledger_quantity(StockItem.objects.select_for_update())
+                .exclude(quantity=F("ledger_quantity"))
+                .only("id", "quantity")
+            )
+            negative = [item for item in drifted if item.ledger_quantity < 0]
+            for stock_item in drifted:
+                self.stdout.write(
+                    f"StockItem {stock_item.id}: stored={stock_item.quantity} "
+                    f"ledger={stock_item.ledger_quantity}"
+                )
+            if options["check"]:
+                if drifted:
+                    raise CommandError(f"{len(drifted)} stock item balances drifted")
+                self.stdout.write(self.style.SUCCESS("All stock item balances match"))
+                return
+
+            drifted = [item for item in drifted if item.ledger_quantity >= 0]
+            for stock_item in drifted:
+                stock_item.quantity = stock_item.ledger_quantity
+            StockItem.objects.bulk_update(drifted, ["quantity"], batch_size=1000)
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {len(drifted)} stock item balances")
+        )
+        if negative:
+            raise CommandError(
+                f"{len(negative)} stock items have more withdrawals than entries "
+                f"and were not rebuilt: "
+                f"{', '.join(str(item.id) for item in negative)}"
+            )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from stock.services import refresh_warehouse_valuation
+
+
+class Command(BaseCommand):
+    help = "Rebuild the warehouse valuation snapshot from the warehouse stock items"
+
+    def handle(self, *args, **options):
+        refreshed = refresh_warehouse_valuation()
+        self.stdout.write(
+            self.style.SUCCESS(f"Refreshed {refreshed} warehouse valuation rows")
+        )
@@ -0,0 +1,54 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stock", "0009_dispatchreport_stock_item_receivingreport_stock_item"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accountantreport",
+            name="file_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("uploaded", "Uploaded"),
+                    ("failed", "Failed"),
+                ],
+                editable=False,
+                max_length=16,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="invoice",
+            name="file_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("uploaded", "Uploaded"),
+                    ("failed", "Failed"),
+                ],
+                editable=False,
+                max_length=16,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="protocol",
+            name="file_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("uploaded", "Uploaded"),
+                    ("failed", "Failed"),
+                ],
+                editable=False,
+                max_length=16,
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stock", "0010_accountantreport_file_status_invoice_file_status_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="dispatchreport",
+            index=models.Index(
+                fields=["-created", "-id"], name="dispatchreport_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="receivingreport",
+            index=models.Index(
+                fields=["-created", "-id"], name="receivingreport_created_id_idx"
+            ),
+        ),
+    ]
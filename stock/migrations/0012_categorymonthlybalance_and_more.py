@@ -0,0 +1,50 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stock", "0011_dispatchreport_dispatchreport_created_id_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryMonthlyBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField()),
+                ("entry_value", models.FloatField(default=0.0)),
+                ("output_value", models.FloatField(default=0.0)),
+                ("closed", models.BooleanField(default=False)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="monthly_balances",
+                        to="stock.category",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-month",),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="categorymonthlybalance",
+            constraint=models.UniqueConstraint(
+                fields=("category", "month"), name="stock_categorymonthlybalance_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.1.7 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stock", "0012_categorymonthlybalance_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WarehouseValuation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("product_code", models.CharField(max_length=255)),
+                ("product_measure", models.CharField(max_length=255)),
+                ("product_name", models.CharField(max_length=200)),
+                ("price", models.FloatField(default=0.0)),
+                ("average_price", models.FloatField(default=0.0)),
+                ("quantity", models.BigIntegerField(default=0)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ("product_code", "product_measure"),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="warehousevaluation",
+            constraint=models.UniqueConstraint(
+                fields=("product_code", "product_measure"),
+                name="stock_warehousevaluation_unique",
+            ),
+        ),
+    ]
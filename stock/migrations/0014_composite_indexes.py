@@ -0,0 +1,37 @@
+# Generated by Django 4.1.7 on 2026-10-18 11:15
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("stock", "0013_warehousevaluation_and_more"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="invoice",
+            index=models.Index(fields=["-created"], name="invoice_created_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(fields=["-created"], name="product_created_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="protocol",
+            index=models.Index(fields=["-created"], name="protocol_created_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="protocol",
+            index=models.Index(fields=["end_date"], name="protocol_end_date_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="stockitem",
+            index=models.Index(
+                fields=["stock", "-created", "-id"], name="stockitem_stock_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.1.7 on 2026-10-18 11:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stock", "0014_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEmail",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("subject", models.CharField(max_length=255)),
+                ("body", models.TextField()),
+                ("html_body", models.TextField(blank=True, default="")),
+                (
+                    "from_email",
+                    models.CharField(blank=True, default="", max_length=254),
+                ),
+                ("to", models.JSONField(default=list)),
+                ("reply_to", models.JSONField(default=list)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("sent", "Sent"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, default="")),
+                (
+                    "next_attempt",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+                ("created", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "ordering": ("-created",),
+            },
+        ),
+        migrations.AddIndex(
+            model_name="outboxemail",
+            index=models.Index(
+                fields=["status", "next_attempt"], name="outboxemail_pending_idx"
+            ),
+        ),
+    ]
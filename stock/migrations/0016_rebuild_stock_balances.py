@@ -0,0 +1,57 @@
+from django.db import migrations
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+# stock.services.WAREHOUSE_STOCK_ID; warehouse items are not driven by the ledger.
+WAREHOUSE_STOCK_ID = 1
+
+
+def _ledger_total(model, quantity_field):
+    totals = (
+        model.objects.filter(stock_item=OuterRef("pk"))
+        .order_by()
+        .values("stock_item")
+        .annotate(total=Sum(quantity_field))
+        .values("total")
+    )
+    return Coalesce(Subquery(totals), Value(0), output_field=IntegerField())
+
+
+def rebuild_stock_balances(apps, schema_editor):
+    """
+    Sector balances are only adjusted by deltas from here on, so bring every
+    one in line with its ledger once. Items whose withdrawals exceed their
+    entries can't be stored and are listed for ``rebuild_stock_balances``.
+    """
+    StockItem = apps.get_model("stock", "StockItem")
+    StockEntry = apps.get_model("order", "StockEntry")
+    StockWithdrawal = apps.get_model("order", "StockWithdrawal")
+
+    def ledger_quantity():
+        return _ledger_total(StockEntry, "entry_quantity") - _ledger_total(
+            StockWithdrawal, "withdraw_quantity"
+        )
+
+    items = StockItem.objects.exclude(stock_id=WAREHOUSE_STOCK_ID).alias(
+        ledger_quantity=ledger_quantity()
+    )
+    items.filter(ledger_quantity__gte=0).exclude(quantity=F("ledger_quantity")).update(
+        quantity=ledger_quantity()
+    )
+    negative = list(items.filter(ledger_quantity__lt=0).values_list("id", flat=True))
+    if negative:
+        print(
+            f"\n  {len(negative)} stock items have more withdrawals than entries "
+            f"and were left as they are: {', '.join(map(str, negative))}"
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stock", "0015_outbox_email"),
+        ("order", "0010_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_stock_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,141 @@
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.fields import BooleanField
+from rest_framework.response import Response
+
+from .errors import FileRequiredException
+from .reference_cache import (
+    get_reference_etag,
+    get_reference_versions,
+    reference_payloads,
+)
+from .renderers import CSVRenderer, ExportRenderer, XLSXRenderer
+from .tasks import queue_upload
+from .uploads import UPLOAD_TARGETS, start_direct_upload
+
+
+class EagerLoadingMixin:
+    """
+    Apply the relations the view's serializer declares in
+    ``select_related_fields`` and ``prefetch_related_fields`` to its queryset,
+    so nested serializers read them from the same query instead of one extra
+    query per row.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        select_related_fields = getattr(serializer_class, "select_related_fields", ())
+        prefetch_related_fields = getattr(
+            serializer_class, "prefetch_related_fields", ()
+        )
+        if select_related_fields:
+            queryset = queryset.select_related(*select_related_fields)
+        if prefetch_related_fields:
+            queryset = queryset.prefetch_related(*prefetch_related_fields)
+        return queryset
+
+
+class ExportMixin:
+    """
+    Add ``?format=csv`` and ``?format=xlsx`` to an API view. When
+    ``export_format`` is set the view returns ``export(...)``, which streams its
+    rows as a spreadsheet instead of building a JSON response.
+    """
+
+    export_renderer_classes = (CSVRenderer, XLSXRenderer)
+    export_chunk_size = 2000
+
+    def get_renderers(self):
+        return super().get_renderers() + [
+            renderer() for renderer in self.export_renderer_classes
+        ]
+
+    @property
+    def export_format(self):
+        renderer = getattr(self.request, "accepted_renderer", None)
+        return renderer.format if isinstance(renderer, ExportRenderer) else None
+
+    def export(self, columns, rows, filename):
+        renderer = self.request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        response = StreamingHttpResponse(
+            renderer.iter_rows(columns, rows), content_type=content_type
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="{filename}.{renderer.format}"'
+        return response
+
+
+class ReferenceCacheMixin:
+    """
+    Serve a whole-table list from ``stock.reference_cache``. The payload and
+    its ``ETag``/``Last-Modified`` headers follow the versions of
+    ``reference_models``, which ``stock.signals`` bumps on every change, so
+    revalidations answer ``304 Not Modified`` and cache hits run no queries.
+    """
+
+    reference_models = ()
+
+    def get(self, request, *args, **kwargs):
+        versions = get_reference_versions(self.reference_models)
+        etag = get_reference_etag(
+            self.__class__.__name__, versions, request.META.get("QUERY_STRING", "")
+        )
+        last_modified = max(modified for _, modified in versions)
+
+        response = get_conditional_response(
+            request, etag=quote_etag(etag), last_modified=last_modified
+        )
+        if response is None:
+            data = reference_payloads.get(etag)
+            if data is None:
+                data = self.get_serializer(self.get_queryset(), many=True).data
+                reference_payloads.set(etag, data)
+            response = Response(data)
+        response["ETag"] = quote_etag(etag)
+        response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class FileCreateMixin:
+    """
+    Create a document together with its file. The file is either sent as a
+    multipart ``file`` and uploaded to S3 in the background or, with
+    ``direct_upload`` set, posted to S3 by the browser with the ``upload``
+    policy returned in the response and then confirmed through
+    ``UploadConfirmView``. ``upload_target`` names the ``UPLOAD_TARGETS``
+    entry the file is stored as.
+    """
+
+    upload_target = None
+
+    def create(self, request, *args, **kwargs):
+        self.upload_policy = None
+        response = super().create(request, *args, **kwargs)
+        if self.upload_policy:
+            response.data["upload"] = self.upload_policy
+        return response
+
+    def perform_create(self, serializer):
+        file_data = self.request.FILES.get("file")
+        direct_upload = (
+            self.request.data.get("direct_upload") in BooleanField.TRUE_VALUES
+        )
+        if not (file_data or direct_upload):
+            raise FileRequiredException
+        target = UPLOAD_TARGETS[self.upload_target]
+        with transaction.atomic():
+            instance = serializer.save()
+            if file_data:
+                queue_upload(instance, file_data, target.get_key(instance))
+            else:
+                self.upload_policy = start_direct_upload(
+                    target, instance, self.request.data.get("content_type")
+                )
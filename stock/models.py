@@ -1,8 +1,16 @@
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
+class FileStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    UPLOADED = "uploaded", "Uploaded"
+    FAILED = "failed", "Failed"
+
+
 class PublicDefense(models.Model):
     name = models.CharField("Name", max_length=255)
     district = models.CharField("District", max_length=255)
@@ -106,6 +114,9 @@ class Product(models.Model):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(fields=["-created"], name="product_created_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -122,6 +133,11 @@ class StockItem(models.Model):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(
+                fields=["stock", "-created", "-id"], name="stockitem_stock_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -161,14 +177,29 @@ class Protocol(models.Model):
     end_date = models.DateTimeField(null=True, blank=True)
     created = models.DateTimeField(default=timezone.now)
     updated = models.DateTimeField(default=timezone.now)
+    file_status = models.CharField(
+        max_length=16, choices=FileStatus.choices, null=True, editable=False
+    )
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(fields=["-created"], name="protocol_created_idx"),
+            models.Index(fields=["end_date"], name="protocol_end_date_idx"),
+        ]
 
     def __str__(self):
         return self.code
 
 
+class ProtocolItemQuerySet(models.QuerySet):
+    def with_remaining_quantity(self):
+        return self.annotate(
+            remaining_quantity=F("original_quantity")
+            - Coalesce(Sum("protocol_withdraw__withdraw_quantity"), 0)
+        )
+
+
 class ProtocolItem(models.Model):
     protocol = models.ForeignKey(
         Protocol,
@@ -183,6 +214,8 @@ class ProtocolItem(models.Model):
     created = models.DateTimeField(default=timezone.now)
     updated = models.DateTimeField(default=timezone.now)
 
+    objects = ProtocolItemQuerySet.as_manager()
+
     class Meta:
         ordering = ("-created",)
 
@@ -205,11 +238,17 @@ class Invoice(models.Model):
     total_value = models.DecimalField(
         max_digits=10, decimal_places=2, null=False, blank=False
     )
+    file_status = models.CharField(
+        max_length=16, choices=FileStatus.choices, null=True, editable=False
+    )
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(fields=["-created"], name="invoice_created_idx"),
+        ]
 
     def __str__(self):
         return self.code
@@ -229,6 +268,11 @@ class ReceivingReport(models.Model):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(
+                fields=["-created", "-id"], name="receivingreport_created_id_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"ReceivingReport {self.id}"
@@ -248,6 +292,11 @@ class DispatchReport(models.Model):
 
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            models.Index(
+                fields=["-created", "-id"], name="dispatchreport_created_id_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"DispatchReport {self.id}"
@@ -274,6 +323,9 @@ class AccountantReport(models.Model):
     total_entry_value = models.FloatField(default=0.0)
     total_output_value = models.FloatField(default=0.0)
     total_current_value = models.FloatField(default=0.0)
+    file_status = models.CharField(
+        max_length=16, choices=FileStatus.choices, null=True, editable=False
+    )
     created = models.DateTimeField(default=timezone.now)
     updated = models.DateTimeField(default=timezone.now)
 
@@ -298,3 +350,96 @@ class CategoryBalance(models.Model):
 
     def __str__(self):
         return f"CategoryBalance {self.id}"
+
+
+class CategoryMonthlyBalance(models.Model):
+    """
+    Entry and output value of a category's receiving and dispatch reports in
+    one month, kept up to date by ``stock.signals``. Closed months are frozen.
+    """
+
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="monthly_balances"
+    )
+    month = models.DateField()
+    entry_value = models.FloatField(default=0.0)
+    output_value = models.FloatField(default=0.0)
+    closed = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ("-month",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "month"], name="%(app_label)s_%(class)s_unique"
+            )
+        ]
+
+    def __str__(self):
+        return f"CategoryMonthlyBalance {self.category_id} {self.month:%m-%Y}"
+
+
+class WarehouseValuation(models.Model):
+    """
+    Snapshot of the warehouse stock value per product code and measure, kept
+    in step with warehouse stock items and products by ``stock.signals``.
+    """
+
+    product_code = models.CharField(max_length=255)
+    product_measure = models.CharField(max_length=255)
+    product_name = models.CharField(max_length=200)
+    price = models.FloatField(default=0.0)
+    average_price = models.FloatField(default=0.0)
+    quantity = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ("product_code", "product_measure")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product_code", "product_measure"],
+                name="%(app_label)s_%(class)s_unique",
+            )
+        ]
+
+    def __str__(self):
+        return f"WarehouseValuation {self.product_code}"
+
+
+class EmailStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    SENT = "sent", "Sent"
+    FAILED = "failed", "Failed"
+
+
+class OutboxEmail(models.Model):
+    """
+    An email queued by a request and delivered by ``stock.tasks.send_queued_emails``.
+    """
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=254, blank=True, default="")
+    to = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list)
+    status = models.CharField(
+        max_length=16, choices=EmailStatus.choices, default=EmailStatus.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    next_attempt = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ("-created",)
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt"], name="outboxemail_pending_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"OutboxEmail {self.id}"
@@ -1,5 +1,18 @@
-from rest_framework.pagination import LimitOffsetPagination, PageNumberPagination
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib import parse
+
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    LimitOffsetPagination,
+    _positive_int,
+)
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class InfinitePagination(LimitOffsetPagination):
@@ -7,15 +20,167 @@ class InfinitePagination(LimitOffsetPagination):
     max_limit = 100000000000
 
 
-class SupplierOrderItemPagination(PageNumberPagination):
+def estimate_count(queryset):
+    """
+    Row count for ``queryset`` from the PostgreSQL planner estimate, which
+    avoids scanning the table. Other databases fall back to an exact count.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class CreatedCursorPagination(BasePagination):
+    """
+    Keyset pagination over (``created``, ``id``), newest first.
+
+    Each page continues from the last row of the previous one instead of an
+    OFFSET, so deep pages cost the same as the first. The response keeps the
+    ``count``/``next``/``previous``/``results`` shape; ``?count=estimate`` swaps
+    the exact ``COUNT(*)`` for the planner estimate.
+    """
+
     page_size = 15
-    page_query_param = 'page'
+    page_size_query_param = "page_size"
     max_page_size = 1000
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        self.count = self.get_count(queryset, request)
+        position, reverse = self.decode_cursor(request)
+
+        if reverse:
+            queryset = queryset.order_by("created", "id")
+        else:
+            queryset = queryset.order_by("-created", "-id")
+        if position:
+            created, pk = position
+            if reverse:
+                queryset = queryset.filter(created__gte=created).exclude(
+                    created=created, id__lte=pk
+                )
+            else:
+                queryset = queryset.filter(created__lte=created).exclude(
+                    created=created, id__gte=pk
+                )
+
+        results = list(queryset[: page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = position is not None if not reverse else has_more
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_count(self, queryset, request):
+        if request.query_params.get(self.count_query_param) == "estimate":
+            return estimate_count(queryset)
+        return queryset.count()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            querystring = b64decode(encoded.encode("ascii")).decode("ascii")
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            created = parse_datetime(tokens["c"][0])
+            pk = int(tokens["i"][0])
+            reverse = bool(int(tokens.get("r", ["0"])[0]))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (created, pk), reverse
+
+    def encode_cursor(self, instance, reverse):
+        tokens = {"c": instance.created.isoformat(), "i": instance.pk}
+        if reverse:
+            tokens["r"] = "1"
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
 
     def get_paginated_response(self, data):
-        return Response({
-            'count': self.page.paginator.count,
-            'next': self.get_next_link(),
-            'previous': self.get_previous_link(),
-            'results': data
-        })
+        return Response(
+            OrderedDict(
+                [
+                    ("count", self.count),
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "count": {"type": "integer", "example": 123},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Use `estimate` for a planner estimate of the count.",
+                "schema": {"type": "string", "enum": ["exact", "estimate"]},
+            },
+        ]
@@ -0,0 +1,98 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+REFERENCE_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def _version_key(model):
+    return f"reference-version:{model._meta.label_lower}"
+
+
+def _version_timeout():
+    """
+    Versions only expire when they live in a per-process cache: a bump there
+    is never seen by the other processes, so they pick up changes once their
+    own versions expire instead of serving stale payloads indefinitely.
+    """
+    if settings.REDIS_CACHE_URL:
+        return None
+    return settings.REFERENCE_VERSION_TIMEOUT
+
+
+def bump_reference_version(model):
+    cache.set(
+        _version_key(model),
+        (uuid.uuid4().hex, int(time.time())),
+        timeout=_version_timeout(),
+    )
+
+
+def get_reference_versions(models):
+    """
+    The current ``(token, modified timestamp)`` of each model. Models without
+    a version yet get one now, so a cold cache never serves stale payloads.
+    """
+    keys = {_version_key(model): model for model in models}
+    versions = cache.get_many(keys)
+    for key, model in keys.items():
+        if key not in versions:
+            cache.add(
+                key, (uuid.uuid4().hex, int(time.time())), timeout=_version_timeout()
+            )
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_reference_etag(name, versions, query_string=""):
+    tokens = ":".join(token for token, _ in versions)
+    return hashlib.md5(
+        f"{name}:{tokens}:{query_string}".encode(), usedforsecurity=False
+    ).hexdigest()
+
+
+class ReferenceCache:
+    """
+    Serialized reference-data payloads keyed by their ETag, which embeds the
+    versions of every model they were built from. Payloads live in a
+    per-process LRU and in the shared Django cache, so a version bump retires
+    them everywhere without deleting anything.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag):
+        with self._lock:
+            if etag in self._entries:
+                self._entries.move_to_end(etag)
+                return self._entries[etag]
+        data = cache.get(f"reference:{etag}")
+        if data is not None:
+            self._remember(etag, data)
+        return data
+
+    def set(self, etag, data):
+        cache.set(f"reference:{etag}", data, timeout=REFERENCE_CACHE_TIMEOUT)
+        self._remember(etag, data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, etag, data):
+        with self._lock:
+            self._entries[etag] = data
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+reference_payloads = ReferenceCache()
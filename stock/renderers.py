@@ -0,0 +1,162 @@
+import csv
+import io
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from rest_framework.renderers import BaseRenderer
+
+EXPORT_BATCH_SIZE = 500
+XML_ILLEGAL_CHARACTERS = re.compile(
+    "[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]"
+)
+XLSX_ESCAPE_SEQUENCE = re.compile("_(?=x[0-9A-Fa-f]{4}_)")
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Renders a list of row dicts as a spreadsheet. Views stream their rows
+    through ``iter_rows`` instead (see ``stock.mixins.ExportMixin``); ``render``
+    is only used for regular responses such as errors.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        columns = list(rows[0]) if rows else []
+        return b"".join(self.iter_rows(columns, rows))
+
+    def iter_rows(self, columns, rows):
+        raise NotImplementedError
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def iter_rows(self, columns, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for index, row in enumerate(rows, 1):
+            writer.writerow([row[column] for column in columns])
+            if index % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+
+
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/'
+        'vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+        'relationships"><Relationship Id="rId1" Type="http://schemas.'
+        'openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/'
+        'relationships"><sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/>'
+        "</sheets></workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+        'relationships"><Relationship Id="rId1" Type="http://schemas.'
+        'openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/></Relationships>'
+    ),
+}
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    "<sheetData>"
+)
+XLSX_SHEET_END = "</sheetData></worksheet>"
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """A write-only, unseekable file that hands out what was written so far."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _xlsx_text(value):
+    """
+    Escape ``value`` for an inline string. Characters XML 1.0 can't contain
+    become ``_xHHHH_`` escapes, which Excel decodes back, so one control
+    character doesn't make it reject the whole workbook; text that already
+    looks like an escape gets its underscore escaped to stay as written.
+    """
+    value = XLSX_ESCAPE_SEQUENCE.sub("_x005F_", value)
+    value = XML_ILLEGAL_CHARACTERS.sub(
+        lambda match: f"_x{ord(match.group()):04X}_", value
+    )
+    return escape(value)
+
+
+def _xlsx_cell(value):
+    if isinstance(value, bool) or value is None:
+        value = "" if value is None else str(value)
+    if isinstance(value, (int, float, Decimal)):
+        return f"<c><v>{value}</v></c>"
+    return f'<c t="inlineStr"><is><t>{_xlsx_text(str(value))}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return (
+        "<row>" + "".join(_xlsx_cell(value) for value in values) + "</row>"
+    ).encode()
+
+
+class XLSXRenderer(ExportRenderer):
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    format = "xlsx"
+    charset = None
+    render_style = "binary"
+
+    def iter_rows(self, columns, rows):
+        buffer = _ChunkBuffer()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, content in XLSX_PARTS.items():
+                archive.writestr(name, content)
+            with archive.open(
+                "xl/worksheets/sheet1.xml", "w", force_zip64=True
+            ) as sheet:
+                sheet.write(XLSX_SHEET_START.encode())
+                sheet.write(_xlsx_row(columns))
+                for index, row in enumerate(rows, 1):
+                    sheet.write(_xlsx_row(row[column] for column in columns))
+                    if index % EXPORT_BATCH_SIZE == 0:
+                        yield buffer.pop()
+                sheet.write(XLSX_SHEET_END.encode())
+        yield buffer.pop()
@@ -0,0 +1,240 @@
+from itertools import groupby
+from operator import attrgetter
+
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import NotFound
+
+from order.models import StockEntry, StockWithdrawal
+
+from .models import CategoryMonthlyBalance, Product, PublicDefense, Sector
+
+
+def _get_in_bulk(queryset, ids):
+    """The objects of ``ids`` in order, or a 404 naming the unknown ids."""
+    ids = [str(id) for id in ids]
+    objects = queryset.in_bulk({int(id) for id in ids if id.isdigit()})
+    missing = [id for id in ids if not id.isdigit() or int(id) not in objects]
+    if missing:
+        raise NotFound(f"Unknown {queryset.model._meta.verbose_name} ids: {missing}")
+    return [objects[int(id)] for id in ids]
+
+
+def _grouped_totals(
+    model, date_field, quantity_field, group_field, filters, initial_date, final_date
+):
+    filters &= Q(
+        **{f"{date_field}__gte": initial_date, f"{date_field}__lte": final_date}
+    )
+    filters &= ~Q(stock_item__stock_id=1)
+    rows = (
+        model.objects.filter(filters)
+        .values("stock_item__product_id", group_field)
+        .annotate(total=Sum(quantity_field))
+        .order_by()
+    )
+    return {
+        (row["stock_item__product_id"], row[group_field]): row["total"] for row in rows
+    }
+
+
+STOCK_REPORT_COLUMNS = (
+    "product_code",
+    "product_name",
+    "entry_quantity",
+    "withdrawal_quantity",
+    "entry_price",
+    "withdrawal_price",
+)
+
+
+def _prepare_stock_report(
+    initial_date, final_date, product_ids, public_defense_ids, sector_ids, category_ids
+):
+    if public_defense_ids:
+        group_key = "public_defense"
+        group_field = "stock_item__stock__sector__public_defense_id"
+        groups = _get_in_bulk(
+            PublicDefense.objects.only("id", "name"), public_defense_ids
+        )
+    elif sector_ids:
+        group_key = "sector"
+        group_field = "stock_item__stock__sector_id"
+        groups = _get_in_bulk(Sector.objects.only("id", "name"), sector_ids)
+    else:
+        return None
+
+    products = Product.objects.only("id", "category_id", "code", "name", "price")
+    filters = Q(**{f"{group_field}__in": {group.id for group in groups}})
+    if product_ids:
+        products = _get_in_bulk(products, product_ids)
+        filters &= Q(stock_item__product_id__in={product.id for product in products})
+        if category_ids:
+            products = [
+                product
+                for product in products
+                if str(product.category_id) in category_ids
+            ]
+    elif category_ids:
+        products = products.filter(category_id__in=category_ids)
+    if category_ids:
+        filters &= Q(stock_item__product__category_id__in=category_ids)
+
+    entries = _grouped_totals(
+        StockEntry,
+        "entry_date",
+        "entry_quantity",
+        group_field,
+        filters,
+        initial_date,
+        final_date,
+    )
+    withdrawals = _grouped_totals(
+        StockWithdrawal,
+        "withdraw_date",
+        "withdraw_quantity",
+        group_field,
+        filters,
+        initial_date,
+        final_date,
+    )
+    return group_key, groups, products, entries, withdrawals
+
+
+def _add_stock_report_rows(rows, group_key, groups, product, entries, withdrawals):
+    """Add ``product``'s totals per group to ``rows``, merging repeated codes."""
+    for group in groups:
+        entry_quantity = entries.get((product.id, group.id), 0)
+        withdrawal_quantity = withdrawals.get((product.id, group.id), 0)
+        key = (product.code, group.name)
+        if key not in rows:
+            rows[key] = {
+                group_key: group.name,
+                "product_code": product.code,
+                "product_name": product.name,
+                "entry_quantity": entry_quantity,
+                "withdrawal_quantity": withdrawal_quantity,
+                "entry_price": product.price * entry_quantity,
+                "withdrawal_price": product.price * withdrawal_quantity,
+            }
+        else:
+            rows[key]["entry_quantity"] += entry_quantity
+            rows[key]["withdrawal_quantity"] += withdrawal_quantity
+            rows[key]["entry_price"] += product.price * entry_quantity
+            rows[key]["withdrawal_price"] += product.price * withdrawal_quantity
+
+
+def get_stock_report(
+    initial_date,
+    final_date,
+    product_ids=None,
+    public_defense_ids=None,
+    sector_ids=None,
+    category_ids=None,
+):
+    """
+    Entry and withdrawal totals per (product, public defense) or
+    (product, sector), computed with one grouped query per movement table.
+    """
+    report = _prepare_stock_report(
+        initial_date,
+        final_date,
+        product_ids,
+        public_defense_ids,
+        sector_ids,
+        category_ids,
+    )
+    if report is None:
+        return []
+    group_key, groups, products, entries, withdrawals = report
+
+    output_dict = {}
+    for product in products:
+        _add_stock_report_rows(
+            output_dict, group_key, groups, product, entries, withdrawals
+        )
+    return list(output_dict.values())
+
+
+def stream_stock_report(
+    initial_date,
+    final_date,
+    product_ids=None,
+    public_defense_ids=None,
+    sector_ids=None,
+    category_ids=None,
+    chunk_size=2000,
+):
+    """
+    The columns and a row iterator of ``get_stock_report``, ordered by product
+    code. Products are read ``chunk_size`` at a time and rows are yielded as
+    soon as each code is complete, so memory does not grow with the catalog.
+    """
+    report = _prepare_stock_report(
+        initial_date,
+        final_date,
+        product_ids,
+        public_defense_ids,
+        sector_ids,
+        category_ids,
+    )
+    if report is None:
+        return list(STOCK_REPORT_COLUMNS), iter(())
+    group_key, groups, products, entries, withdrawals = report
+    if isinstance(products, list):
+        products = sorted(products, key=attrgetter("code"))
+    else:
+        # Within a code, keep the default (newest first) order so the merged
+        # row is named after the same product as in ``get_stock_report``.
+        products = products.order_by("code", *Product._meta.ordering).iterator(
+            chunk_size=chunk_size
+        )
+
+    def rows():
+        for _, same_code in groupby(products, key=attrgetter("code")):
+            code_rows = {}
+            for product in same_code:
+                _add_stock_report_rows(
+                    code_rows, group_key, groups, product, entries, withdrawals
+                )
+            yield from code_rows.values()
+
+    return [group_key, *STOCK_REPORT_COLUMNS], rows()
+
+
+def get_accountant_report_categories(month):
+    """
+    Entry and output value of each category in ``month``, with the balance it
+    carries over from earlier months, read from the monthly rollup in one query.
+    """
+    previous_balance = (
+        CategoryMonthlyBalance.objects.filter(
+            category=OuterRef("category"), month__lt=OuterRef("month")
+        )
+        .order_by()
+        .values("category")
+        .annotate(total=Sum(F("entry_value") - F("output_value")))
+        .values("total")
+    )
+    return (
+        CategoryMonthlyBalance.objects.filter(month=month)
+        .annotate(
+            code=F("category__code"),
+            name=F("category__name"),
+            balance=F("entry_value") - F("output_value"),
+            previous_balance=Coalesce(
+                Subquery(previous_balance, output_field=FloatField()), Value(0.0)
+            ),
+        )
+        .annotate(current_balance=F("previous_balance") + F("balance"))
+        .order_by("code")
+        .values(
+            "code",
+            "name",
+            "entry_value",
+            "output_value",
+            "balance",
+            "previous_balance",
+            "current_balance",
+        )
+    )
@@ -1,6 +1,3 @@
-import os
-
-import boto3
 from rest_framework import serializers
 
 from .models import (
@@ -8,6 +5,7 @@ from .models import (
     BiddingExemption,
     Category,
     DispatchReport,
+    FileStatus,
     Invoice,
     Measure,
     Product,
@@ -20,17 +18,13 @@ from .models import (
     StockItem,
     Supplier,
 )
-
-client = boto3.client(
-    "s3",
-    region_name=os.environ.get("AWS_REGION_NAME"),
-    aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
-)
+from .storage import get_presigned_url
+from .uploads import UPLOAD_TARGETS
 
 
 class RetrieveStockSerializer(serializers.ModelSerializer):
     sector = serializers.StringRelatedField()
+    select_related_fields = ("sector",)
 
     class Meta:
         model = Stock
@@ -51,6 +45,7 @@ class PublicDefenseSerializer(serializers.ModelSerializer):
 
 class RetrieveSectorSerializer(serializers.ModelSerializer):
     public_defense = PublicDefenseSerializer()
+    select_related_fields = ("public_defense",)
 
     class Meta:
         model = Sector
@@ -78,6 +73,7 @@ class MeasureSerializer(serializers.ModelSerializer):
 class RetrieveProductSerializer(serializers.ModelSerializer):
     category = CategorySerializer()
     measure = MeasureSerializer()
+    select_related_fields = ("category", "measure")
 
     class Meta:
         model = Product
@@ -112,6 +108,7 @@ class ProductMeSerializer(serializers.ModelSerializer):
 class RetrieveStockItemSerializer(serializers.ModelSerializer):
     stock = RetrieveStockSerializer()
     product = ProductMeSerializer()
+    select_related_fields = ("stock__sector", "product__measure")
 
     class Meta:
         model = StockItem
@@ -129,6 +126,7 @@ class StockItemSerializer(serializers.ModelSerializer):
 
 class StockItemMeSerializer(serializers.ModelSerializer):
     product = ProductMeSerializer()
+    select_related_fields = ("product__measure",)
 
     class Meta:
         model = StockItem
@@ -140,6 +138,7 @@ class StockItemMeSerializer(serializers.ModelSerializer):
 
 class RetrieveSupplierSerializer(serializers.ModelSerializer):
     category = CategorySerializer(many=True)
+    prefetch_related_fields = ("category",)
 
     class Meta:
         model = Supplier
@@ -162,19 +161,12 @@ class RetrieveProtocolSerializer(serializers.ModelSerializer):
     file = serializers.SerializerMethodField()
     supplier = SupplierNameSerializer()
     category = CategorySerializer()
+    select_related_fields = ("supplier", "category")
 
     def get_file(self, obj):
-        code = obj.code
-        url = client.generate_presigned_url(
-            "get_object",
-            Params={
-                "Bucket": os.environ.get("AWS_BUCKET_NAME"),
-                "Key": f"protocols/{code}",
-            },
-            ExpiresIn=os.environ.get("AWS_EXPIRES_SECONDS"),
-            HttpMethod="GET",
-        )
-        return url
+        if obj.file_status in (FileStatus.PENDING, FileStatus.FAILED):
+            return None
+        return get_presigned_url(f"protocols/{obj.code}")
 
     class Meta:
         model = Protocol
@@ -186,6 +178,7 @@ class RetrieveProtocolSerializer(serializers.ModelSerializer):
             "supplier",
             "category",
             "file",
+            "file_status",
         ]
 
 
@@ -193,17 +186,9 @@ class ProtocolSerializer(serializers.ModelSerializer):
     file = serializers.SerializerMethodField()
 
     def get_file(self, obj):
-        code = obj.code
-        url = client.generate_presigned_url(
-            "get_object",
-            Params={
-                "Bucket": os.environ.get("AWS_BUCKET_NAME"),
-                "Key": f"protocols/{code}",
-            },
-            ExpiresIn=os.environ.get("AWS_EXPIRES_SECONDS"),
-            HttpMethod="GET",
-        )
-        return url
+        if obj.file_status in (FileStatus.PENDING, FileStatus.FAILED):
+            return None
+        return get_presigned_url(f"protocols/{obj.code}")
 
     class Meta:
         model = Protocol
@@ -215,6 +200,7 @@ class ProtocolSerializer(serializers.ModelSerializer):
             "supplier",
             "category",
             "file",
+            "file_status",
         ]
 
 
@@ -226,6 +212,13 @@ class ProtocolCodeSerializer(serializers.ModelSerializer):
 
 class RetrieveProtocolItemSerializer(serializers.ModelSerializer):
     product = ProductMeSerializer()
+    quantity = serializers.SerializerMethodField()
+    select_related_fields = ("product__measure",)
+
+    def get_quantity(self, obj):
+        # ProtocolItem.quantity is no longer maintained; querysets using this
+        # serializer must come from ProtocolItem.objects.with_remaining_quantity().
+        return obj.remaining_quantity
 
     class Meta:
         model = ProtocolItem
@@ -233,6 +226,17 @@ class RetrieveProtocolItemSerializer(serializers.ModelSerializer):
 
 
 class ProtocolItemSerializer(serializers.ModelSerializer):
+    quantity = serializers.SerializerMethodField()
+
+    def get_quantity(self, obj):
+        # The same remaining quantity RetrieveProtocolItemSerializer returns,
+        # read back after the write since it may change original_quantity.
+        return (
+            ProtocolItem.objects.with_remaining_quantity()
+            .values_list("remaining_quantity", flat=True)
+            .get(pk=obj.pk)
+        )
+
     class Meta:
         model = ProtocolItem
         fields = "__all__"
@@ -242,19 +246,12 @@ class RetrieveInvoiceSerializer(serializers.ModelSerializer):
     file = serializers.SerializerMethodField()
     supplier = SupplierNameSerializer()
     public_defense = PublicDefenseSerializer()
+    select_related_fields = ("supplier", "public_defense")
 
     def get_file(self, obj):
-        code = obj.code
-        url = client.generate_presigned_url(
-            "get_object",
-            Params={
-                "Bucket": os.environ.get("AWS_BUCKET_NAME"),
-                "Key": f"invoices/{code}",
-            },
-            ExpiresIn=os.environ.get("AWS_EXPIRES_SECONDS"),
-            HttpMethod="GET",
-        )
-        return url
+        if obj.file_status in (FileStatus.PENDING, FileStatus.FAILED):
+            return None
+        return get_presigned_url(f"invoices/{obj.code}")
 
     class Meta:
         model = Invoice
@@ -264,6 +261,7 @@ class RetrieveInvoiceSerializer(serializers.ModelSerializer):
             "public_defense",
             "supplier",
             "file",
+            "file_status",
             "code",
             "created",
             "updated",
@@ -275,17 +273,9 @@ class InvoiceSerializer(serializers.ModelSerializer):
     file = serializers.SerializerMethodField()
 
     def get_file(self, obj):
-        code = obj.code
-        url = client.generate_presigned_url(
-            "get_object",
-            Params={
-                "Bucket": os.environ.get("AWS_BUCKET_NAME"),
-                "Key": f"invoices/{code}",
-            },
-            ExpiresIn=os.environ.get("AWS_EXPIRES_SECONDS"),
-            HttpMethod="GET",
-        )
-        return url
+        if obj.file_status in (FileStatus.PENDING, FileStatus.FAILED):
+            return None
+        return get_presigned_url(f"invoices/{obj.code}")
 
     class Meta:
         model = Invoice
@@ -295,6 +285,7 @@ class InvoiceSerializer(serializers.ModelSerializer):
             "public_defense",
             "supplier",
             "file",
+            "file_status",
             "code",
             "created",
             "updated",
@@ -306,20 +297,11 @@ class RetrieveReceivingReportSerializer(serializers.ModelSerializer):
     file = serializers.SerializerMethodField()
     product = ProductMeSerializer()
     supplier = SupplierNameSerializer()
+    select_related_fields = ("product__measure", "supplier")
 
     def get_file(self, obj):
         if obj.file:
-            code = obj.id
-            url = client.generate_presigned_url(
-                "get_object",
-                Params={
-                    "Bucket": os.environ.get("AWS_BUCKET_NAME"),
-                    "Key": f"receiving-reports/{code}",
-                },
-                ExpiresIn=os.environ.get("AWS_EXPIRES_SECONDS"),
-                HttpMethod="GET",
-            )
-            return url
+            return get_presigned_url(f"receiving-reports/{obj.id}")
         return None
 
     class Meta:
@@ -342,17 +324,7 @@ class ReceivingReportSerializer(serializers.ModelSerializer):
 
     def get_file(self, obj):
         if obj.file:
-            code = obj.id
-            url = client.generate_presigned_url(
-                "get_object",
-                Params={
-                    "Bucket": os.environ.get("AWS_BUCKET_NAME"),
-                    "Key": f"receiving-reports/{code}",
-                },
-                ExpiresIn=os.environ.get("AWS_EXPIRES_SECONDS"),
-                HttpMethod="GET",
-            )
-            return url
+            return get_presigned_url(f"receiving-reports/{obj.id}")
         return None
 
     class Meta:
@@ -374,20 +346,11 @@ class RetrieveDispatchReportSerializer(serializers.ModelSerializer):
     file = serializers.SerializerMethodField()
     product = ProductMeSerializer()
     public_defense = PublicDefenseSerializer()
+    select_related_fields = ("product__measure", "public_defense")
 
     def get_file(self, obj):
         if obj.file:
-            code = obj.id
-            url = client.generate_presigned_url(
-                "get_object",
-                Params={
-                    "Bucket": os.environ.get("AWS_BUCKET_NAME"),
-                    "Key": f"dispatch-reports/{code}",
-                },
-                ExpiresIn=os.environ.get("AWS_EXPIRES_SECONDS"),
-                HttpMethod="GET",
-            )
-            return url
+            return get_presigned_url(f"dispatch-reports/{obj.id}")
         return None
 
     class Meta:
@@ -410,17 +373,7 @@ class DispatchReportSerializer(serializers.ModelSerializer):
 
     def get_file(self, obj):
         if obj.file:
-            code = obj.id
-            url = client.generate_presigned_url(
-                "get_object",
-                Params={
-                    "Bucket": os.environ.get("AWS_BUCKET_NAME"),
-                    "Key": f"dispatch-reports/{code}",
-                },
-                ExpiresIn=os.environ.get("AWS_EXPIRES_SECONDS"),
-                HttpMethod="GET",
-            )
-            return url
+            return get_presigned_url(f"dispatch-reports/{obj.id}")
         return None
 
     class Meta:
@@ -447,6 +400,7 @@ class InvoiceCodeSerializer(serializers.ModelSerializer):
 class RetrieveBiddingExemptionSerializer(serializers.ModelSerializer):
     product = ProductMeSerializer()
     invoice = InvoiceCodeSerializer()
+    select_related_fields = ("product__measure", "invoice")
 
     class Meta:
         model = BiddingExemption
@@ -463,17 +417,9 @@ class AccountantReportSerializer(serializers.ModelSerializer):
     file = serializers.SerializerMethodField()
 
     def get_file(self, obj):
-        month = obj.month
-        url = client.generate_presigned_url(
-            "get_object",
-            Params={
-                "Bucket": os.environ.get("AWS_BUCKET_NAME"),
-                "Key": f"accountant-reports/{month}",
-            },
-            ExpiresIn=os.environ.get("AWS_EXPIRES_SECONDS"),
-            HttpMethod="GET",
-        )
-        return url
+        if obj.file_status in (FileStatus.PENDING, FileStatus.FAILED):
+            return None
+        return get_presigned_url(f"accountant-reports/{obj.month}")
 
     class Meta:
         model = AccountantReport
@@ -483,14 +429,15 @@ class AccountantReportSerializer(serializers.ModelSerializer):
             "total_previous_value",
             "total_entry_value",
             "file",
+            "file_status",
             "total_output_value",
             "total_current_value",
         ]
 
 
 class AccountantReportCategorySerializer(serializers.Serializer):
-    code = serializers.CharField(source="product__category__code")
-    name = serializers.CharField(source="product__category__name")
+    code = serializers.CharField()
+    name = serializers.CharField()
     entry_value = serializers.DecimalField(max_digits=18, decimal_places=2)
     output_value = serializers.DecimalField(max_digits=18, decimal_places=2)
     balance = serializers.DecimalField(max_digits=18, decimal_places=2)
@@ -501,3 +448,13 @@ class AccountantReportCategorySerializer(serializers.Serializer):
 class EmailSerializer(serializers.Serializer):
     subject = serializers.CharField()
     message = serializers.CharField()
+
+
+class UploadSerializer(serializers.Serializer):
+    target = serializers.ChoiceField(choices=list(UPLOAD_TARGETS))
+    id = serializers.IntegerField()
+    content_type = serializers.CharField(required=False, max_length=255)
+
+
+class UploadConfirmSerializer(UploadSerializer):
+    token = serializers.CharField()
@@ -1,6 +1,40 @@
-from django.db.models import Sum
+from collections import defaultdict
 
-from order.models import ProtocolWithdrawal, StockEntry, StockWithdrawal
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Case,
+    Count,
+    DateField,
+    F,
+    FloatField,
+    IntegerField,
+    Max,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from order.models import StockEntry, StockWithdrawal
+from SIRI_BACK.date_ranges import in_range, month_range, start_of_day
+from user.services import invalidate_me_cache
+
+from .errors import InsufficientStockException
+from .models import (
+    CategoryMonthlyBalance,
+    DispatchReport,
+    Product,
+    ReceivingReport,
+    Stock,
+    StockItem,
+    WarehouseValuation,
+)
+
+WAREHOUSE_STOCK_ID = 1
 
 
 def get_stock_item_quantity(stock_item):
@@ -19,11 +53,423 @@ def get_stock_item_quantity(stock_item):
     return entries - withdrawals
 
 
-def get_protocol_item_quantity(protocol_item):
-    withdrawals = (
-        ProtocolWithdrawal.objects.filter(protocol_item=protocol_item).aggregate(
-            Sum("withdraw_quantity")
-        )["withdraw_quantity__sum"]
-        or 0
+def apply_stock_item_movement(stock_item_id, quantity):
+    """
+    Add ``quantity`` (negative for withdrawals) to the materialized balance of
+    a sector stock item. Warehouse items are not driven by the ledger.
+    """
+    if not quantity:
+        return
+    StockItem.objects.filter(id=stock_item_id).exclude(
+        stock_id=WAREHOUSE_STOCK_ID
+    ).update(quantity=F("quantity") + quantity)
+
+
+def get_or_create_stock_item(stock_id, product_id):
+    """
+    The stock item of ``product_id`` in ``stock_id``. Creating a missing item
+    locks its stock row first, so concurrent first movements of a product do
+    not insert it twice.
+    """
+    stock_item = StockItem.objects.filter(stock_id=stock_id, product_id=product_id)
+    stock_item = stock_item.order_by("id").first()
+    if stock_item:
+        return stock_item
+    with transaction.atomic():
+        Stock.objects.select_for_update().only("id").get(id=stock_id)
+        stock_item = (
+            StockItem.objects.filter(stock_id=stock_id, product_id=product_id)
+            .order_by("id")
+            .first()
+        )
+        return stock_item or StockItem.objects.create(
+            stock_id=stock_id, product_id=product_id
+        )
+
+
+def _find_stock_items(keys):
+    stock_items = {}
+    for stock_item in StockItem.objects.filter(
+        stock_id__in={stock_id for stock_id, _ in keys},
+        product_id__in={product_id for _, product_id in keys},
+    ).order_by("-id"):
+        key = (stock_item.stock_id, stock_item.product_id)
+        if key in keys:
+            stock_items[key] = stock_item
+    return stock_items
+
+
+def get_or_create_stock_items(keys):
+    """
+    ``get_or_create_stock_item`` for many ``(stock_id, product_id)`` keys, with
+    the missing items inserted in one batch under the same stock row locks.
+    """
+    keys = set(keys)
+    stock_items = _find_stock_items(keys)
+    missing = keys - set(stock_items)
+    if not missing:
+        return stock_items
+    with transaction.atomic():
+        list(
+            Stock.objects.select_for_update()
+            .filter(id__in={stock_id for stock_id, _ in missing})
+            .order_by("id")
+            .values_list("id")
+        )
+        stock_items.update(_find_stock_items(missing))
+        created = StockItem.objects.bulk_create(
+            [
+                StockItem(stock_id=stock_id, product_id=product_id)
+                for stock_id, product_id in sorted(missing - set(stock_items))
+            ]
+        )
+    for stock_item in created:
+        stock_items[(stock_item.stock_id, stock_item.product_id)] = stock_item
+    return stock_items
+
+
+def add_stock_item_quantities(quantities):
+    """
+    Add ``{stock_item_id: quantity}`` to the stock items with a single ``F()``
+    update, after locking the rows in id order so concurrent movements neither
+    lose updates nor deadlock.
+    """
+    quantities = {id: quantity for id, quantity in quantities.items() if quantity}
+    if not quantities:
+        return
+    with transaction.atomic():
+        stock_items = StockItem.objects.filter(id__in=quantities)
+        list(stock_items.select_for_update().order_by("id").values_list("id"))
+        stock_items.update(
+            quantity=F("quantity")
+            + Case(
+                *[
+                    When(id=id, then=Value(quantity))
+                    for id, quantity in quantities.items()
+                ],
+                output_field=IntegerField(),
+            ),
+            updated=timezone.now(),
+        )
+
+
+def apply_stock_movements(movements):
+    """
+    Add the ``{(stock_id, product_id): quantity}`` deltas (negative for
+    withdrawals) to the stock items' quantity in one transaction, creating
+    missing items. Returns the stock items by key.
+
+    Sector balances are driven by their entries and withdrawals, so this is
+    meant for the warehouse and for reverting movements that bypass the ledger.
+    """
+    with transaction.atomic():
+        stock_items = get_or_create_stock_items(movements)
+        add_stock_item_quantities(
+            {stock_items[key].id: quantity for key, quantity in movements.items()}
+        )
+
+        stock_ids = {stock_id for stock_id, _ in movements}
+        warehouse_product_ids = [
+            product_id
+            for (stock_id, product_id), quantity in movements.items()
+            if stock_id == WAREHOUSE_STOCK_ID and quantity
+        ]
+
+        def refresh():
+            for stock_id in stock_ids:
+                invalidate_me_cache("stock", stock_id)
+            if warehouse_product_ids:
+                refresh_warehouse_valuation(
+                    list(
+                        Product.objects.filter(
+                            id__in=warehouse_product_ids
+                        ).values_list("code", flat=True)
+                    )
+                )
+
+        if any(movements.values()):
+            transaction.on_commit(refresh)
+    return stock_items
+
+
+def reserve_stock_item_quantity(stock_item_id, quantity):
+    """
+    Lock the stock item until the end of the current transaction and make sure
+    ``quantity`` can still be withdrawn from it.
+    """
+    available = (
+        StockItem.objects.select_for_update()
+        .filter(id=stock_item_id)
+        .values_list("quantity", flat=True)
+        .get()
+    )
+    if quantity > available:
+        raise InsufficientStockException
+
+
+def _ledger_total(model, quantity_field):
+    totals = (
+        model.objects.filter(stock_item=OuterRef("pk"))
+        .order_by()
+        .values("stock_item")
+        .annotate(total=Sum(quantity_field))
+        .values("total")
+    )
+    return Coalesce(Subquery(totals), Value(0), output_field=IntegerField())
+
+
+def with_ledger_quantity(queryset):
+    """Annotate sector stock items with the balance computed from the ledger."""
+    return queryset.exclude(stock_id=WAREHOUSE_STOCK_ID).annotate(
+        ledger_quantity=_ledger_total(StockEntry, "entry_quantity")
+        - _ledger_total(StockWithdrawal, "withdraw_quantity")
+    )
+
+
+REPORT_VALUE_FIELDS = {
+    ReceivingReport: "entry_value",
+    DispatchReport: "output_value",
+}
+
+
+def get_report_month(created):
+    return timezone.localtime(created).date().replace(day=1)
+
+
+def get_category_month_values(category_id, month):
+    """
+    Entry and output value of the reports of ``category_id`` in ``month`` at
+    current prices, the same totals ``rebuild_category_month_balances`` uses.
+    """
+    values = {}
+    for model, value_field in REPORT_VALUE_FIELDS.items():
+        totals = model.objects.filter(
+            in_range("created", month_range(month)), product__category_id=category_id
+        ).aggregate(
+            value=Sum(F("product__price") * F("quantity"), output_field=FloatField())
+        )
+        values[value_field] = totals["value"] or 0.0
+    return values
+
+
+def refresh_category_month_balance(category_id, month):
+    """
+    Recompute the rollup row of ``category_id`` for ``month`` from its
+    reports, creating it on first use. The row is locked while it is
+    recomputed, so concurrent reports of the same month are all counted.
+    Closed months are frozen and left untouched.
+    """
+    balances = CategoryMonthlyBalance.objects.filter(
+        category_id=category_id, month=month
+    )
+    balance = balances.select_for_update().first()
+    if balance and balance.closed:
+        return
+    values = get_category_month_values(category_id, month)
+    if balance:
+        balances.update(**values)
+        return
+    if not any(values.values()):
+        return
+    try:
+        with transaction.atomic():
+            CategoryMonthlyBalance.objects.create(
+                category_id=category_id, month=month, **values
+            )
+    except IntegrityError:
+        refresh_category_month_balance(category_id, month)
+
+
+def refresh_category_month_balances(keys):
+    """Refresh the rollup rows of ``keys``, (category id, month) pairs."""
+    for category_id, month in sorted(set(keys)):
+        refresh_category_month_balance(category_id, month)
+
+
+def refresh_report_balances(reports):
+    """
+    Refresh the rollup rows that ``reports`` (receiving and dispatch reports
+    saved without signals, e.g. by ``bulk_create``) count towards, once per
+    (category, month).
+    """
+    categories = dict(
+        Product.objects.filter(
+            id__in={report.product_id for report in reports}
+        ).values_list("id", "category_id")
+    )
+    refresh_category_month_balances(
+        (categories[report.product_id], get_report_month(report.created))
+        for report in reports
+    )
+
+
+def get_product_report_months(product_id):
+    """The months in which ``product_id`` has receiving or dispatch reports."""
+    months = set()
+    for model in REPORT_VALUE_FIELDS:
+        months.update(
+            model.objects.filter(product_id=product_id)
+            .annotate(month=TruncMonth("created", output_field=DateField()))
+            .order_by()
+            .values_list("month", flat=True)
+            .distinct()
+        )
+    return months
+
+
+def get_category_month_totals(model, **filters):
+    """Per-(category, month) value of ``model`` reports at current prices."""
+    return (
+        model.objects.filter(**filters)
+        .annotate(month=TruncMonth("created", output_field=DateField()))
+        .values("product__category_id", "month")
+        .annotate(
+            value=Sum(F("product__price") * F("quantity"), output_field=FloatField())
+        )
+        .order_by()
+    )
+
+
+def rebuild_category_month_balances(before=None, close=False):
+    """
+    Recompute the open ``CategoryMonthlyBalance`` rows (only months before
+    ``before`` when given) from their reports, and freeze them if ``close``.
+    Months up to the last closed one are never touched again.
+    """
+    with transaction.atomic():
+        balances = CategoryMonthlyBalance.objects.select_for_update()
+        last_closed = balances.filter(closed=True).aggregate(Max("month"))["month__max"]
+        filters = {}
+        if last_closed:
+            filters["created__gte"] = month_range(last_closed)[1]
+        if before:
+            filters["created__lt"] = start_of_day(before)
+
+        totals = defaultdict(dict)
+        for model, value_field in REPORT_VALUE_FIELDS.items():
+            for row in get_category_month_totals(model, **filters):
+                key = (row["product__category_id"], row["month"])
+                totals[key][value_field] = row["value"] or 0.0
+
+        rebuilt = []
+        for (category_id, month), values in totals.items():
+            balance, _ = CategoryMonthlyBalance.objects.update_or_create(
+                category_id=category_id,
+                month=month,
+                defaults={
+                    "entry_value": values.get("entry_value", 0.0),
+                    "output_value": values.get("output_value", 0.0),
+                    "closed": close,
+                },
+            )
+            rebuilt.append(balance.id)
+
+        emptied = balances.filter(closed=False).exclude(id__in=rebuilt)
+        if before:
+            emptied = emptied.filter(month__lt=before)
+        emptied.update(entry_value=0.0, output_value=0.0, closed=close)
+    return len(rebuilt)
+
+
+def get_warehouse_valuation_rows(product_codes=None):
+    """
+    Warehouse quantity and value per product code and measure, with the name
+    of the newest product using the code, in a single query.
+    """
+    product_name = (
+        Product.objects.filter(code=OuterRef("product__code"))
+        .order_by("-created")
+        .values("name")[:1]
+    )
+    queryset = StockItem.objects.filter(stock_id=WAREHOUSE_STOCK_ID)
+    if product_codes is not None:
+        queryset = queryset.filter(product__code__in=product_codes)
+    return (
+        queryset.values("product__code", "product__measure__name")
+        .annotate(
+            product_name=Subquery(product_name),
+            total_price=Sum(
+                F("quantity") * F("product__price"), output_field=FloatField()
+            ),
+            total_quantity=Sum("quantity"),
+        )
+        .order_by("product__code")
+    )
+
+
+def refresh_warehouse_valuation(product_codes=None):
+    """
+    Rewrite the ``WarehouseValuation`` snapshot, only for ``product_codes``
+    (a list or a ``values("code")`` queryset) when given.
+    """
+    valuations = []
+    for row in get_warehouse_valuation_rows(product_codes):
+        price = round(row["total_price"] or 0.0, 2)
+        quantity = row["total_quantity"] or 0
+        valuations.append(
+            WarehouseValuation(
+                product_code=row["product__code"],
+                product_measure=row["product__measure__name"],
+                product_name=row["product_name"],
+                price=price,
+                average_price=round(price / quantity, 2) if quantity > 0 else 0,
+                quantity=quantity,
+            )
+        )
+
+    with transaction.atomic():
+        WarehouseValuation.objects.bulk_create(
+            valuations,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=["product_code", "product_measure"],
+            update_fields=[
+                "product_name",
+                "price",
+                "average_price",
+                "quantity",
+                "updated",
+            ],
+        )
+        stale = WarehouseValuation.objects.all()
+        if product_codes is not None:
+            stale = stale.filter(product_code__in=product_codes)
+        current = {(item.product_code, item.product_measure) for item in valuations}
+        stale_ids = [
+            id
+            for id, code, measure in stale.values_list(
+                "id", "product_code", "product_measure"
+            )
+            if (code, measure) not in current
+        ]
+        WarehouseValuation.objects.filter(id__in=stale_ids).delete()
+    return len(valuations)
+
+
+WAREHOUSE_VALUATION_COLUMNS = (
+    "product_name",
+    "product_code",
+    "product_measure",
+    "price",
+    "average_price",
+    "quantity",
+)
+
+
+def get_warehouse_valuation():
+    """
+    The valuation snapshot rows, cached per snapshot version (row count and
+    latest update) so unchanged snapshots skip reading and building the rows.
+    """
+    version = WarehouseValuation.objects.aggregate(
+        count=Count("id"), updated=Max("updated")
+    )
+    cache_key = (
+        f"warehouse-valuation:{version['count']}:"
+        f"{version['updated'].timestamp() if version['updated'] else 0}"
     )
-    return protocol_item.original_quantity - withdrawals
+    rows = cache.get(cache_key)
+    if rows is None:
+        rows = list(WarehouseValuation.objects.values(*WAREHOUSE_VALUATION_COLUMNS))
+        cache.set(cache_key, rows, timeout=None)
+    return rows
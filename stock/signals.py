@@ -0,0 +1,166 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import (
+    Category,
+    DispatchReport,
+    Measure,
+    Product,
+    Protocol,
+    PublicDefense,
+    ReceivingReport,
+    Sector,
+    Stock,
+    StockItem,
+    Supplier,
+)
+from .reference_cache import bump_reference_version
+from .services import (
+    WAREHOUSE_STOCK_ID,
+    get_product_report_months,
+    get_report_month,
+    refresh_category_month_balances,
+    refresh_warehouse_valuation,
+)
+
+
+def _report_key(report):
+    """The (category, month) rollup row a report counts towards."""
+    category_id = (
+        Product.objects.filter(pk=report.product_id)
+        .values_list("category_id", flat=True)
+        .get()
+    )
+    return category_id, get_report_month(report.created)
+
+
+@receiver(pre_save, sender=ReceivingReport)
+@receiver(pre_save, sender=DispatchReport)
+def remember_previous_report(sender, instance, **kwargs):
+    instance._previous_report_key = None
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).first()
+        if previous:
+            instance._previous_report_key = _report_key(previous)
+
+
+@receiver(post_save, sender=ReceivingReport)
+@receiver(post_save, sender=DispatchReport)
+def refresh_saved_report_balance(sender, instance, update_fields=None, **kwargs):
+    previous_key = getattr(instance, "_previous_report_key", None)
+    instance._previous_report_key = None
+    if update_fields is not None and not {"product", "quantity"} & set(update_fields):
+        return
+    keys = {_report_key(instance), previous_key}
+    keys.discard(None)
+    refresh_category_month_balances(keys)
+
+
+@receiver(post_delete, sender=ReceivingReport)
+@receiver(post_delete, sender=DispatchReport)
+def refresh_deleted_report_balance(sender, instance, **kwargs):
+    refresh_category_month_balances([_report_key(instance)])
+
+
+def _refresh_valuation_on_commit(product_codes):
+    product_codes = list(product_codes)
+    transaction.on_commit(lambda: refresh_warehouse_valuation(product_codes))
+
+
+@receiver(post_save, sender=StockItem)
+@receiver(post_delete, sender=StockItem)
+def refresh_warehouse_item_valuation(sender, instance, **kwargs):
+    if instance.stock_id != WAREHOUSE_STOCK_ID:
+        return
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and not {"quantity", "product"} & set(update_fields):
+        return
+    _refresh_valuation_on_commit(
+        Product.objects.filter(pk=instance.product_id).values_list("code", flat=True)
+    )
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_product(sender, instance, **kwargs):
+    instance._previous_code = None
+    instance._previous_pricing = None
+    if instance.pk:
+        previous = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("code", "category_id", "price")
+            .first()
+        )
+        if previous:
+            instance._previous_code = previous[0]
+            instance._previous_pricing = previous[1:]
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_valuation(sender, instance, **kwargs):
+    product_codes = {instance.code, getattr(instance, "_previous_code", None)}
+    product_codes.discard(None)
+    _refresh_valuation_on_commit(product_codes)
+
+
+@receiver(pre_save, sender=Measure)
+def remember_previous_measure_name(sender, instance, **kwargs):
+    instance._previous_name = None
+    if instance.pk:
+        instance._previous_name = (
+            sender.objects.filter(pk=instance.pk).values_list("name", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Measure)
+def refresh_measure_valuation(sender, instance, created, **kwargs):
+    """The snapshot is keyed on the measure name, so renames rewrite its rows."""
+    previous_name = getattr(instance, "_previous_name", None)
+    if created or previous_name == instance.name:
+        return
+    _refresh_valuation_on_commit(
+        Product.objects.filter(measure=instance).values_list("code", flat=True)
+    )
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_report_balances(sender, instance, **kwargs):
+    """
+    Reports are valued at their product's current price, so a new price or
+    category changes every open month the product has reports in.
+    """
+    previous = getattr(instance, "_previous_pricing", None)
+    instance._previous_pricing = None
+    if previous is None or previous == (instance.category_id, instance.price):
+        return
+    category_ids = {previous[0], instance.category_id}
+    refresh_category_month_balances(
+        (category_id, month)
+        for category_id in category_ids
+        for month in get_product_report_months(instance.pk)
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Measure)
+@receiver(post_delete, sender=Measure)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Protocol)
+@receiver(post_delete, sender=Protocol)
+@receiver(post_save, sender=PublicDefense)
+@receiver(post_delete, sender=PublicDefense)
+@receiver(post_save, sender=Sector)
+@receiver(post_delete, sender=Sector)
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+@receiver(post_save, sender=Supplier)
+@receiver(post_delete, sender=Supplier)
+def bump_reference_data_version(sender, **kwargs):
+    transaction.on_commit(lambda: bump_reference_version(sender))
+
+
+@receiver(m2m_changed, sender=Supplier.category.through)
+def bump_supplier_categories_version(sender, **kwargs):
+    transaction.on_commit(lambda: bump_reference_version(Supplier))
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.cache import caches
+
+MAX_COPY_OBJECT_SIZE = 5 * 1024**3
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The S3 client shared by the whole process, created on first use. Importing
+    boto3 and resolving the S3 endpoint is slow, so processes that never touch
+    S3 (most management commands, beat) don't pay for it. botocore clients are
+    thread-safe, so every thread uses the same one.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import boto3
+
+                _client = boto3.session.Session().client(
+                    "s3",
+                    region_name=os.environ.get("AWS_REGION_NAME"),
+                    aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
+                    aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
+                )
+    return _client
+
+
+def get_bucket_name():
+    return os.environ.get("AWS_BUCKET_NAME")
+
+
+def get_expires_seconds():
+    return int(os.environ.get("AWS_EXPIRES_SECONDS") or 3600)
+
+
+class PresignedUrlCache:
+    """
+    Presigned GET URLs keyed by (bucket, key).
+
+    Entries live in a per-process LRU and, when ``REDIS_CACHE_URL`` is set, in
+    the shared Django cache so every worker reuses the same signature. An entry
+    is dropped ``safety_margin`` before the URL itself expires, so a cached URL
+    always has time left for the client to use it.
+    """
+
+    def __init__(self, max_size=4096, min_safety_margin=60):
+        self.max_size = max_size
+        self.min_safety_margin = min_safety_margin
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_ttl(self, expires_in):
+        return expires_in - max(self.min_safety_margin, expires_in // 10)
+
+    def get_url(self, key, bucket=None):
+        bucket = bucket or get_bucket_name()
+        cache_key = (bucket, key)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(cache_key)
+                return entry[0]
+
+        shared_cache = self._get_shared_cache()
+        shared_key = f"presigned-url:{bucket}:{key}"
+        entry = shared_cache.get(shared_key) if shared_cache else None
+        if not entry or entry[1] <= now:
+            expires_in = get_expires_seconds()
+            ttl = self.get_ttl(expires_in)
+            url = get_client().generate_presigned_url(
+                "get_object",
+                Params={"Bucket": bucket, "Key": key},
+                ExpiresIn=expires_in,
+                HttpMethod="GET",
+            )
+            if ttl <= 0:
+                return url
+            entry = (url, now + ttl)
+            if shared_cache:
+                shared_cache.set(shared_key, entry, timeout=ttl)
+
+        with self._lock:
+            self._entries[cache_key] = entry
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_shared_cache(self):
+        if getattr(settings, "REDIS_CACHE_URL", None):
+            return caches["default"]
+        return None
+
+
+presigned_urls = PresignedUrlCache()
+
+
+def get_presigned_url(key, bucket=None):
+    return presigned_urls.get_url(key, bucket)
+
+
+def _iter_body(body, chunk_size):
+    try:
+        yield from body.iter_chunks(chunk_size)
+    finally:
+        body.close()
+
+
+def open_object_stream(key, bucket=None, chunk_size=64 * 1024):
+    """
+    Fetch an object and return its S3 metadata with an iterator that reads the
+    body ``chunk_size`` bytes at a time instead of buffering the whole file.
+    """
+    s3_object = get_client().get_object(Bucket=bucket or get_bucket_name(), Key=key)
+    return s3_object, _iter_body(s3_object["Body"], chunk_size)
+
+
+def move_object(source_key, destination_key, bucket=None):
+    """
+    Rename an object inside S3: it is copied server side with CopyObject (or a
+    multipart copy above the 5 GB CopyObject limit) and the source is deleted,
+    so none of its bytes pass through this process. Returns False when there
+    is no object at ``source_key``.
+    """
+    if source_key == destination_key:
+        return True
+    bucket = bucket or get_bucket_name()
+    client = get_client()
+    copy_source = {"Bucket": bucket, "Key": source_key}
+    try:
+        client.copy_object(CopySource=copy_source, Bucket=bucket, Key=destination_key)
+    except ClientError as error:
+        code = error.response["Error"]["Code"]
+        if code in ("NoSuchKey", "404"):
+            return False
+        if code != "InvalidRequest":
+            raise
+        from boto3.s3.transfer import TransferConfig
+
+        config = TransferConfig(
+            multipart_threshold=MAX_COPY_OBJECT_SIZE,
+            multipart_chunksize=512 * 1024**2,
+        )
+        client.copy(copy_source, bucket, destination_key, Config=config)
+    client.delete_object(Bucket=bucket, Key=source_key)
+    return True
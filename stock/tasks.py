@@ -0,0 +1,229 @@
+import os
+import smtplib
+import uuid
+from contextlib import suppress
+from datetime import timedelta
+
+from botocore.exceptions import BotoCoreError, ClientError
+from celery import shared_task
+from celery.utils.time import get_exponential_backoff_interval
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .errors import FileUploadPendingException
+from .models import EmailStatus, FileStatus, OutboxEmail
+from .storage import get_bucket_name, get_client, move_object
+
+
+def stage_upload(uploaded_file):
+    """Write an uploaded file to the staging directory shared with the workers."""
+    os.makedirs(settings.UPLOAD_STAGING_DIR, exist_ok=True)
+    staged_path = os.path.join(settings.UPLOAD_STAGING_DIR, uuid.uuid4().hex)
+    with open(staged_path, "wb") as staged_file:
+        for chunk in uploaded_file.chunks():
+            staged_file.write(chunk)
+    return staged_path
+
+
+def queue_upload(instance, uploaded_file, key, file_value=None):
+    """
+    Mark ``instance`` as pending, if it has a ``file_status``, and upload
+    ``uploaded_file`` to ``key`` in the background once the current
+    transaction commits. ``file_value`` is written to the instance's ``file``
+    field when the upload finishes.
+    """
+    staged_path = stage_upload(uploaded_file)
+    if hasattr(instance, "file_status"):
+        type(instance).objects.filter(pk=instance.pk).update(
+            file_status=FileStatus.PENDING
+        )
+        instance.file_status = FileStatus.PENDING
+    transaction.on_commit(
+        lambda: upload_staged_file.delay(
+            staged_path, key, instance._meta.label, instance.pk, file_value
+        )
+    )
+
+
+def move_uploaded_file(instance, source_key, destination_key):
+    """
+    Move the file of ``instance`` to a new key, e.g. after the code it is
+    named after changed. Files still being uploaded to the old key can't be
+    moved yet; nothing is checked when the key stays the same.
+    """
+    if source_key == destination_key:
+        return
+    if instance.file_status == FileStatus.PENDING:
+        raise FileUploadPendingException
+    move_object(source_key, destination_key)
+
+
+@shared_task(bind=True, max_retries=5)
+def upload_staged_file(self, staged_path, key, model_label, pk, file_value=None):
+    """
+    Upload a staged file to S3. Storage errors are retried with backoff; the
+    row is marked as failed once they run out or on any other error, such as
+    the staged file having gone missing.
+    """
+    model = apps.get_model(model_label)
+    try:
+        with open(staged_path, "rb") as staged_file:
+            get_client().upload_fileobj(staged_file, get_bucket_name(), key)
+    except Exception as error:
+        retryable = isinstance(error, (BotoCoreError, ClientError))
+        if retryable and self.request.retries < self.max_retries:
+            countdown = get_exponential_backoff_interval(
+                factor=5, retries=self.request.retries, maximum=600, full_jitter=True
+            )
+            raise self.retry(exc=error, countdown=countdown)
+        if hasattr(model, "file_status"):
+            model.objects.filter(pk=pk).update(file_status=FileStatus.FAILED)
+        _remove_staged_file(staged_path)
+        raise
+
+    fields = {}
+    if hasattr(model, "file_status"):
+        fields["file_status"] = FileStatus.UPLOADED
+    if file_value is not None:
+        fields["file"] = file_value
+    if fields:
+        model.objects.filter(pk=pk).update(**fields)
+    _remove_staged_file(staged_path)
+
+
+def _remove_staged_file(staged_path):
+    with suppress(FileNotFoundError):
+        os.remove(staged_path)
+
+
+def queue_email(subject, body, to, html_body="", from_email=None):
+    """
+    Store an email in the outbox, split into messages of at most
+    ``EMAIL_OUTBOX_MAX_RECIPIENTS`` recipients, and have a worker send it once
+    the current transaction commits.
+    """
+    from_email = from_email or settings.EMAIL_HOST_USER or ""
+    to = list(to)
+    size = settings.EMAIL_OUTBOX_MAX_RECIPIENTS
+    OutboxEmail.objects.bulk_create(
+        OutboxEmail(
+            subject=subject,
+            body=body,
+            html_body=html_body,
+            from_email=from_email,
+            to=to[start : start + size],
+            reply_to=[from_email] if from_email else [],
+        )
+        for start in range(0, len(to), size)
+    )
+    transaction.on_commit(send_queued_emails.delay)
+
+
+def _build_message(outbox_email, connection):
+    message = EmailMultiAlternatives(
+        subject=outbox_email.subject,
+        body=outbox_email.body,
+        from_email=outbox_email.from_email or None,
+        to=outbox_email.to,
+        reply_to=outbox_email.reply_to,
+        connection=connection,
+    )
+    if outbox_email.html_body:
+        message.attach_alternative(outbox_email.html_body, "text/html")
+    return message
+
+
+def _claim_due_emails():
+    """
+    Lease a batch of due emails to this worker by moving their
+    ``next_attempt`` past ``EMAIL_OUTBOX_CLAIM_TIMEOUT``. The claim is
+    committed before anything is sent, so other workers skip these emails and
+    a worker that dies mid-batch only delays the ones it had not sent yet.
+    """
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailStatus.PENDING, next_attempt__lte=timezone.now())
+            .order_by("next_attempt", "id")[: settings.EMAIL_OUTBOX_BATCH_SIZE]
+        )
+        OutboxEmail.objects.filter(id__in=[email.id for email in batch]).update(
+            next_attempt=timezone.now()
+            + timedelta(seconds=settings.EMAIL_OUTBOX_CLAIM_TIMEOUT)
+        )
+    return batch
+
+
+def _record_send_error(outbox_email, error):
+    outbox_email.attempts += 1
+    outbox_email.last_error = f"{type(error).__name__}: {error}"
+    # Bad headers and other invalid messages fail the same way on every try.
+    if (
+        isinstance(error, ValueError)
+        or outbox_email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+    ):
+        outbox_email.status = EmailStatus.FAILED
+    else:
+        outbox_email.next_attempt = timezone.now() + timedelta(
+            seconds=get_exponential_backoff_interval(
+                factor=60,
+                retries=outbox_email.attempts - 1,
+                maximum=6 * 3600,
+                full_jitter=True,
+            )
+        )
+
+
+@shared_task(bind=True, max_retries=5, rate_limit=settings.EMAIL_OUTBOX_RATE_LIMIT)
+def send_queued_emails(self):
+    """
+    Send a batch of due outbox emails over one SMTP connection, saving each
+    email's outcome as soon as it is known. Failed emails are retried with
+    exponential backoff up to ``EMAIL_OUTBOX_MAX_ATTEMPTS`` times, invalid
+    ones are failed at once; the task queues itself again while due emails
+    remain.
+    """
+    batch = _claim_due_emails()
+    if not batch:
+        return 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except (smtplib.SMTPException, OSError) as error:
+        OutboxEmail.objects.filter(id__in=[email.id for email in batch]).update(
+            next_attempt=timezone.now()
+        )
+        countdown = get_exponential_backoff_interval(
+            factor=30, retries=self.request.retries, maximum=3600, full_jitter=True
+        )
+        raise self.retry(exc=error, countdown=countdown)
+
+    sent = 0
+    try:
+        for outbox_email in batch:
+            try:
+                _build_message(outbox_email, connection).send()
+            except Exception as error:
+                _record_send_error(outbox_email, error)
+            else:
+                outbox_email.status = EmailStatus.SENT
+                outbox_email.sent_at = timezone.now()
+                sent += 1
+            outbox_email.save(
+                update_fields=[
+                    "status",
+                    "attempts",
+                    "last_error",
+                    "next_attempt",
+                    "sent_at",
+                ]
+            )
+    finally:
+        connection.close()
+
+    if len(batch) == settings.EMAIL_OUTBOX_BATCH_SIZE:
+        send_queued_emails.delay()
+    return sent
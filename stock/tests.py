@@ -0,0 +1,1038 @@
+import io
+import smtplib
+import time
+import zipfile
+from datetime import date, timedelta
+from xml.etree import ElementTree
+
+import pytest
+import requests
+from botocore.exceptions import ClientError
+from celery.exceptions import Retry
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from order.models import (
+    ProtocolWithdrawal,
+    StockEntry,
+    StockWithdrawal,
+    SupplierOrder,
+    SupplierOrderItem,
+)
+from SIRI_BACK.date_ranges import (
+    date_span_range,
+    day_range,
+    in_range,
+    month_range,
+    start_of_day,
+)
+from SIRI_BACK.query_budget import QueryBudgetExceeded, assert_max_queries
+from stock import storage, tasks
+from stock.management.commands.benchmark_stock_report import legacy_stock_report
+from stock.models import (
+    AccountantReport,
+    Category,
+    CategoryMonthlyBalance,
+    DispatchReport,
+    EmailStatus,
+    FileStatus,
+    Invoice,
+    Measure,
+    OutboxEmail,
+    Product,
+    Protocol,
+    ProtocolItem,
+    PublicDefense,
+    ReceivingReport,
+    Sector,
+    Stock,
+    StockItem,
+    WarehouseValuation,
+)
+from stock.pagination import CreatedCursorPagination
+from stock.renderers import XLSXRenderer
+from stock.reports import get_stock_report, stream_stock_report
+from stock.services import rebuild_category_month_balances
+from stock.tasks import send_queued_emails, upload_staged_file
+
+SHEET_NAMESPACE = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+LIST_QUERIES = [
+    ("/stock/", 2),
+    ("/stock/all-stocks/", 1),
+    ("/stock/sectors/", 2),
+    ("/stock/sectors/all/", 1),
+    ("/stock/products/", 2),
+    ("/stock/products/all/", 1),
+    ("/stock/stock-items/", 2),
+    ("/stock/suppliers/", 3),
+    ("/stock/suppliers/all/", 2),
+    ("/stock/protocols/", 2),
+    ("/stock/protocols/all/", 1),
+    ("/stock/protocol-items/", 2),
+    ("/stock/protocol-items/all/", 2),
+    ("/stock/invoices/", 2),
+    ("/stock/invoices/all/", 1),
+    ("/stock/receiving-reports/", 2),
+    ("/stock/dispatch-reports/", 2),
+    ("/stock/bidding-exemption/", 2),
+]
+LIST_URLS = [
+    "/stock/",
+    "/stock/all-stocks/",
+    "/stock/sectors/",
+    "/stock/sectors/all/",
+    "/stock/public-defenses/",
+    "/stock/public-defenses/all/",
+    "/stock/categories/",
+    "/stock/categories/all/",
+    "/stock/measures/",
+    "/stock/measures/all/",
+    "/stock/products/",
+    "/stock/products/all/",
+    "/stock/stock-items/",
+    "/stock/suppliers/",
+    "/stock/suppliers/all/",
+    "/stock/protocols/",
+    "/stock/protocols/all/",
+    "/stock/protocol-items/",
+    "/stock/protocol-items/all/",
+    "/stock/invoices/",
+    "/stock/invoices/all/",
+    "/stock/receiving-reports/",
+    "/stock/dispatch-reports/",
+    "/stock/bidding-exemption/",
+    "/stock/accountant-reports/",
+    "/stock/warehouse-items/",
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url", LIST_URLS)
+def test_list_stays_within_query_budget(api_client, make_listings, s3, url):
+    make_listings(20)
+
+    response = api_client.get(url)
+
+    assert response.status_code == 200
+    assert "queries" in response["Server-Timing"]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("page_size", [1, 100])
+@pytest.mark.parametrize("url,queries", LIST_QUERIES)
+def test_list_queries_do_not_grow_with_page_size(
+    api_client,
+    make_listings,
+    set_page_size,
+    s3,
+    django_assert_num_queries,
+    url,
+    queries,
+    page_size,
+):
+    make_listings(page_size)
+    set_page_size(page_size)
+
+    with django_assert_num_queries(queries):
+        response = api_client.get(url)
+
+    rows = response.data["results"] if "results" in response.data else response.data
+    assert len(rows) >= page_size
+
+
+@pytest.mark.django_db
+def test_strict_query_budget_fails_request_over_budget(api_client, settings):
+    settings.QUERY_BUDGETS = {"stock:measure-list-create": 0}
+
+    with pytest.raises(QueryBudgetExceeded):
+        api_client.get("/stock/measures/")
+
+
+@pytest.mark.django_db
+def test_query_budget_only_logs_when_not_strict(api_client, settings, caplog):
+    settings.QUERY_BUDGET_STRICT = False
+    settings.QUERY_BUDGETS = {"stock:measure-list-create": 0}
+
+    response = api_client.get("/stock/measures/")
+
+    assert response.status_code == 200
+    assert any(record.levelname == "WARNING" for record in caplog.records)
+
+
+@pytest.mark.django_db
+def test_assert_max_queries(measure):
+    with assert_max_queries(1) as recorder:
+        list(Measure.objects.all())
+    assert recorder.count == 1
+
+    with pytest.raises(QueryBudgetExceeded):
+        with assert_max_queries(1):
+            list(Measure.objects.all())
+            list(Measure.objects.all())
+
+
+@pytest.fixture
+def tied_measures():
+    """Measures newest first by (created, id), three of them sharing a time."""
+    now = timezone.now()
+    measures = []
+    for minutes in (0, 0, 0, 1, 1, 2, 3):
+        measures.append(
+            Measure.objects.create(
+                name=f"measure_{len(measures)}",
+                created=now - timedelta(minutes=minutes),
+            )
+        )
+    return sorted(measures, key=lambda measure: (measure.created, measure.id))[::-1]
+
+
+def paginate(url):
+    request = Request(APIRequestFactory().get(url))
+    paginator = CreatedCursorPagination()
+    page = paginator.paginate_queryset(Measure.objects.all(), request)
+    return (
+        [measure.id for measure in page],
+        paginator.get_next_link(),
+        paginator.get_previous_link(),
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("page_size", [1, 2, 3])
+def test_cursor_pages_cover_ties_on_created(tied_measures, page_size):
+    pages, previous_links = [], []
+    url = f"/measures/?page_size={page_size}"
+    while url and len(pages) < len(tied_measures):
+        page, url, previous = paginate(url)
+        pages.append(page)
+        previous_links.append(previous)
+
+    assert sum(pages, []) == [measure.id for measure in tied_measures]
+    assert all(len(page) == page_size for page in pages[:-1])
+    assert previous_links[0] is None
+    assert None not in previous_links[1:]
+
+    # Walk back from the last page: each previous link returns the page before.
+    url = previous_links[-1]
+    for expected in pages[-2::-1]:
+        page, next_link, url = paginate(url)
+        assert page == expected
+        assert next_link is not None
+    assert url is None
+
+
+@pytest.mark.django_db
+def test_cursor_next_link_continues_after_a_previous_page(tied_measures):
+    ids = [measure.id for measure in tied_measures]
+    _, second, _ = paginate("/measures/?page_size=2")
+    _, third, _ = paginate(second)
+    page, _, back = paginate(third)
+    assert page == ids[4:6]
+
+    page, next_link, _ = paginate(back)
+    assert page == ids[2:4]
+    assert paginate(next_link)[0] == ids[4:6]
+
+
+@pytest.mark.django_db
+def test_invalid_cursor_is_not_found():
+    with pytest.raises(NotFound):
+        paginate("/measures/?cursor=bm90IGEgY3Vyc29y")
+
+
+@pytest.fixture
+def staging_dir(settings, tmp_path):
+    settings.UPLOAD_STAGING_DIR = str(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.django_db
+def test_create_protocol_uploads_file_in_background(
+    api_client,
+    supplier,
+    category,
+    s3,
+    staging_dir,
+    celery_eager,
+    django_capture_on_commit_callbacks,
+):
+    data = {
+        "code": "P-1",
+        "supplier": supplier.id,
+        "category": category.id,
+        "file": SimpleUploadedFile("protocol.pdf", b"%PDF-1.4"),
+    }
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.post("/stock/protocols/", data, format="multipart")
+
+    assert response.status_code == 201
+    assert Protocol.objects.get().file_status == FileStatus.UPLOADED
+    body = s3.get_object(Bucket="test-bucket", Key="protocols/P-1")["Body"]
+    assert body.read() == b"%PDF-1.4"
+    assert list(staging_dir.iterdir()) == []
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "url", ["/stock/protocols/", "/stock/invoices/", "/stock/accountant-reports/"]
+)
+def test_create_without_file_is_rejected(api_client, supplier, category, url):
+    data = {
+        "code": "P-1",
+        "supplier": supplier.id,
+        "category": category.id,
+        "total_value": "10.00",
+        "month": "01-2024",
+    }
+
+    response = api_client.post(url, data, format="multipart")
+
+    assert response.status_code == 400
+    assert response.data["detail"].code == 11
+    assert not Protocol.objects.exists()
+    assert not Invoice.objects.exists()
+    assert not AccountantReport.objects.exists()
+
+
+@pytest.mark.django_db
+def test_upload_of_missing_staged_file_fails(supplier, s3, staging_dir):
+    protocol = Protocol.objects.create(
+        code="P-1", supplier=supplier, file_status=FileStatus.PENDING
+    )
+
+    with pytest.raises(FileNotFoundError):
+        upload_staged_file.apply(
+            args=(str(staging_dir / "missing"), "protocols/P-1", "stock.Protocol"),
+            kwargs={"pk": protocol.pk},
+            throw=True,
+        )
+
+    protocol.refresh_from_db()
+    assert protocol.file_status == FileStatus.FAILED
+
+
+@pytest.mark.django_db
+def test_upload_fails_once_storage_retries_run_out(supplier, s3, staging_dir):
+    staged_path = staging_dir / "staged"
+    staged_path.write_bytes(b"%PDF-1.4")
+    protocol = Protocol.objects.create(
+        code="P-1", supplier=supplier, file_status=FileStatus.PENDING
+    )
+    s3.delete_bucket(Bucket="test-bucket")
+    args = (str(staged_path), "protocols/P-1", "stock.Protocol")
+
+    with pytest.raises(Retry):
+        upload_staged_file.apply(args=args, kwargs={"pk": protocol.pk}, throw=True)
+    protocol.refresh_from_db()
+    assert protocol.file_status == FileStatus.PENDING
+
+    with pytest.raises(ClientError):
+        upload_staged_file.apply(
+            args=args,
+            kwargs={"pk": protocol.pk},
+            retries=upload_staged_file.max_retries,
+            throw=True,
+        )
+    protocol.refresh_from_db()
+    assert protocol.file_status == FileStatus.FAILED
+    assert not staged_path.exists()
+
+
+def test_xlsx_escapes_characters_xml_cannot_contain():
+    rows = [{"name": "a\x0bb\x1f <&> _x0041_"}]
+
+    workbook = b"".join(XLSXRenderer().iter_rows(["name"], rows))
+
+    with zipfile.ZipFile(io.BytesIO(workbook)) as archive:
+        sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+    texts = [element.text for element in sheet.iter(f"{{{SHEET_NAMESPACE}}}t")]
+    assert texts == ["name", "a_x000B_b_x001F_ <&> _x005F_x0041_"]
+
+
+@pytest.mark.django_db
+def test_reference_list_revalidates_and_follows_changes(
+    api_client, measure, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    response = api_client.get("/stock/measures/all/")
+    etag = response["ETag"]
+    assert response.status_code == 200
+
+    with django_assert_num_queries(0):
+        response = api_client.get("/stock/measures/all/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Measure.objects.create(name="new_measure")
+    response = api_client.get("/stock/measures/all/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+    assert {row["name"] for row in response.data} == {"test_measure", "new_measure"}
+
+
+@pytest.mark.django_db
+def test_reference_versions_expire_without_shared_cache(
+    api_client, measure, settings, monkeypatch
+):
+    settings.REDIS_CACHE_URL = None
+    settings.REFERENCE_VERSION_TIMEOUT = 60
+    etag = api_client.get("/stock/measures/all/")["ETag"]
+    # Another process changed the data; its bump never reaches this cache.
+    Measure.objects.filter(id=measure.id).update(name="renamed")
+
+    response = api_client.get("/stock/measures/all/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    response = api_client.get("/stock/measures/all/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert [row["name"] for row in response.data] == ["renamed"]
+
+
+@pytest.fixture
+def protocols_around(supplier):
+    """Protocols ending just before, on and just after each given local midnight."""
+
+    def protocols_around(*days):
+        for day in days:
+            midnight = start_of_day(day)
+            for offset in (-1, 0, 1):
+                Protocol.objects.create(
+                    code=f"{day}{offset}",
+                    supplier=supplier,
+                    end_date=midnight + timedelta(microseconds=offset),
+                )
+
+    return protocols_around
+
+
+def ids(queryset):
+    return set(queryset.values_list("id", flat=True))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("zone", ["UTC", "America/Sao_Paulo", "Asia/Tokyo"])
+def test_date_ranges_match_date_lookups(protocols_around, zone):
+    with timezone.override(zone):
+        protocols_around(
+            date(2024, 1, 31), date(2024, 2, 1), date(2024, 2, 29), date(2024, 3, 1)
+        )
+        protocols = Protocol.objects.all()
+
+        for day in (date(2024, 1, 31), date(2024, 2, 1), date(2024, 2, 29)):
+            expected = ids(protocols.filter(end_date__date=day))
+            assert expected
+            assert ids(protocols.filter(in_range("end_date", day_range(day)))) == (
+                expected
+            )
+
+        month = protocols.filter(end_date__year=2024, end_date__month=2)
+        assert ids(month)
+        assert ids(
+            protocols.filter(in_range("end_date", month_range(date(2024, 2, 15))))
+        ) == ids(month)
+
+        span = (date(2024, 1, 31), date(2024, 2, 29))
+        assert ids(
+            protocols.filter(in_range("end_date", date_span_range(*span)))
+        ) == ids(protocols.filter(end_date__date__range=span))
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="PostgreSQL plans")
+def test_date_ranges_use_the_end_date_index():
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+
+    day = timezone.localdate()
+    by_range = Protocol.objects.filter(in_range("end_date", day_range(day)))
+    by_lookup = Protocol.objects.filter(end_date__date=day)
+
+    assert "protocol_end_date_idx" in by_range.explain()
+    assert "protocol_end_date_idx" not in by_lookup.explain()
+
+
+class StubSMTPConnection:
+    """Stands in for the SMTP backend; refuses mail to ``refused`` addresses."""
+
+    def __init__(self, refused=(), open_error=None):
+        self.refused = set(refused)
+        self.open_error = open_error
+        self.opened = 0
+        self.sent = []
+
+    def open(self):
+        if self.open_error:
+            raise self.open_error
+        self.opened += 1
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        for message in messages:
+            message.message()
+            # Every earlier email's outcome is saved before the next is sent.
+            assert (
+                OutboxEmail.objects.filter(
+                    status=EmailStatus.PENDING, next_attempt__lte=timezone.now()
+                ).count()
+                == 0
+            )
+            assert OutboxEmail.objects.filter(status=EmailStatus.SENT).count() == len(
+                self.sent
+            )
+            refused = self.refused.intersection(message.to)
+            if refused:
+                raise smtplib.SMTPRecipientsRefused(
+                    {to: (550, b"No such user") for to in refused}
+                )
+            self.sent.append(message)
+        return len(messages)
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    def use(**kwargs):
+        connection = StubSMTPConnection(**kwargs)
+        monkeypatch.setattr(tasks, "get_connection", lambda: connection)
+        return connection
+
+    return use
+
+
+def queue(*recipients, subject="subject"):
+    return [
+        OutboxEmail.objects.create(subject=subject, body="body", to=[to])
+        for to in recipients
+    ]
+
+
+@pytest.mark.django_db
+def test_queued_emails_fail_bad_headers_without_losing_the_batch(settings, mailoutbox):
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    first, second = queue("a@test.com", "b@test.com")
+    (bad,) = queue("c@test.com", subject="broken\nBcc: everyone@test.com")
+    (last,) = queue("d@test.com")
+
+    assert send_queued_emails.apply(throw=True).result == 3
+
+    assert [message.to for message in mailoutbox] == [
+        ["a@test.com"],
+        ["b@test.com"],
+        ["d@test.com"],
+    ]
+    for outbox_email in (first, second, last):
+        outbox_email.refresh_from_db()
+        assert outbox_email.status == EmailStatus.SENT
+    bad.refresh_from_db()
+    assert bad.status == EmailStatus.FAILED
+    assert bad.attempts == 1
+    assert bad.last_error.startswith("BadHeaderError")
+
+
+@pytest.mark.django_db
+def test_queued_emails_retry_refused_messages_over_one_connection(smtp, settings):
+    connection = smtp(refused=["b@test.com", "c@test.com"])
+    sent, retried, exhausted = queue("a@test.com", "b@test.com", "c@test.com")
+    exhausted.attempts = settings.EMAIL_OUTBOX_MAX_ATTEMPTS - 1
+    exhausted.save()
+
+    assert send_queued_emails.apply(throw=True).result == 1
+
+    assert connection.opened == 1
+    assert [message.to for message in connection.sent] == [["a@test.com"]]
+    sent.refresh_from_db()
+    assert sent.status == EmailStatus.SENT
+    retried.refresh_from_db()
+    assert retried.status == EmailStatus.PENDING
+    assert retried.attempts == 1
+    assert retried.next_attempt > timezone.now()
+    assert retried.last_error.startswith("SMTPRecipientsRefused")
+    exhausted.refresh_from_db()
+    assert exhausted.status == EmailStatus.FAILED
+    assert exhausted.attempts == settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+
+    assert send_queued_emails.apply(throw=True).result == 0
+    assert connection.opened == 1
+
+
+@pytest.mark.django_db
+def test_queued_emails_are_released_when_smtp_is_down(smtp):
+    smtp(open_error=smtplib.SMTPConnectError(421, b"Try again later"))
+    (outbox_email,) = queue("a@test.com")
+
+    with pytest.raises(Retry):
+        send_queued_emails.apply(throw=True)
+
+    outbox_email.refresh_from_db()
+    assert outbox_email.status == EmailStatus.PENDING
+    assert outbox_email.attempts == 0
+    assert outbox_email.next_attempt <= timezone.now()
+
+
+@pytest.fixture
+def invoice(supplier, public_defense):
+    return Invoice.objects.create(
+        supplier=supplier,
+        public_defense=public_defense,
+        code="I-1",
+        total_value=10,
+        file_status=FileStatus.UPLOADED,
+    )
+
+
+def object_keys(s3):
+    response = s3.list_objects_v2(Bucket="test-bucket")
+    return [item["Key"] for item in response.get("Contents", [])]
+
+
+@pytest.mark.django_db
+def test_invoice_code_change_moves_its_file(api_client, invoice, s3):
+    s3.put_object(Bucket="test-bucket", Key="invoices/I-1", Body=b"%PDF-1.4")
+
+    response = api_client.patch(f"/stock/invoices/{invoice.id}/", {"code": "I-2"})
+
+    assert response.status_code == 200
+    assert object_keys(s3) == ["invoices/I-2"]
+    body = s3.get_object(Bucket="test-bucket", Key="invoices/I-2")["Body"]
+    assert body.read() == b"%PDF-1.4"
+
+
+@pytest.mark.django_db
+def test_pending_invoice_can_be_edited_but_not_renamed(api_client, invoice, s3):
+    Invoice.objects.filter(id=invoice.id).update(file_status=FileStatus.PENDING)
+    url = f"/stock/invoices/{invoice.id}/"
+
+    response = api_client.patch(url, {"total_value": "20.00"})
+    assert response.status_code == 200
+
+    response = api_client.patch(url, {"code": "I-2"})
+    assert response.status_code == 409
+    invoice.refresh_from_db()
+    assert invoice.code == "I-1"
+
+
+@pytest.mark.django_db
+def test_move_object_without_source(s3):
+    assert storage.move_object("invoices/missing", "invoices/I-2") is False
+    assert object_keys(s3) == []
+
+
+@pytest.mark.django_db
+def test_move_object_falls_back_to_multipart_copy(s3, monkeypatch):
+    s3.put_object(Bucket="test-bucket", Key="invoices/I-1", Body=b"%PDF-1.4")
+
+    def copy_object(**kwargs):
+        raise ClientError(
+            {"Error": {"Code": "InvalidRequest", "Message": "Too large"}},
+            "CopyObject",
+        )
+
+    monkeypatch.setattr(s3, "copy_object", copy_object)
+    monkeypatch.setattr(storage, "MAX_COPY_OBJECT_SIZE", 1)
+
+    assert storage.move_object("invoices/I-1", "invoices/I-2") is True
+    assert object_keys(s3) == ["invoices/I-2"]
+
+
+def month_values(category):
+    return list(
+        CategoryMonthlyBalance.objects.filter(category=category).values_list(
+            "month", "entry_value", "output_value"
+        )
+    )
+
+
+@pytest.fixture
+def priced_product(product):
+    product.price = 2.0
+    product.save()
+    return product
+
+
+@pytest.mark.django_db
+def test_report_values_follow_create_edit_and_delete(
+    priced_product, supplier, public_defense
+):
+    month = timezone.localdate().replace(day=1)
+    received = ReceivingReport.objects.create(
+        product=priced_product, supplier=supplier, quantity=5
+    )
+    dispatched = DispatchReport.objects.create(
+        product=priced_product, public_defense=public_defense, quantity=2
+    )
+    assert month_values(priced_product.category) == [(month, 10.0, 4.0)]
+
+    received.quantity = 3
+    received.save()
+    assert month_values(priced_product.category) == [(month, 6.0, 4.0)]
+
+    dispatched.delete()
+    assert month_values(priced_product.category) == [(month, 6.0, 0.0)]
+
+
+@pytest.mark.django_db
+def test_report_values_follow_price_changes(priced_product, supplier):
+    month = timezone.localdate().replace(day=1)
+    report = ReceivingReport.objects.create(
+        product=priced_product, supplier=supplier, quantity=5
+    )
+
+    priced_product.price = 3.0
+    priced_product.save()
+    assert month_values(priced_product.category) == [(month, 15.0, 0.0)]
+    rebuild_category_month_balances()
+    assert month_values(priced_product.category) == [(month, 15.0, 0.0)]
+
+    report.delete()
+    assert month_values(priced_product.category) == [(month, 0.0, 0.0)]
+
+
+@pytest.mark.django_db
+def test_report_values_follow_category_changes(priced_product, supplier):
+    month = timezone.localdate().replace(day=1)
+    old_category = priced_product.category
+    ReceivingReport.objects.create(
+        product=priced_product, supplier=supplier, quantity=5
+    )
+    new_category = Category.objects.create(name="new_category", code="new")
+
+    priced_product.category = new_category
+    priced_product.save()
+
+    assert month_values(old_category) == [(month, 0.0, 0.0)]
+    assert month_values(new_category) == [(month, 10.0, 0.0)]
+
+
+@pytest.mark.django_db
+def test_closed_months_ignore_later_report_changes(priced_product, supplier):
+    month = timezone.localdate().replace(day=1)
+    report = ReceivingReport.objects.create(
+        product=priced_product, supplier=supplier, quantity=5
+    )
+    CategoryMonthlyBalance.objects.update(closed=True)
+
+    priced_product.price = 3.0
+    priced_product.save()
+    report.delete()
+
+    assert month_values(priced_product.category) == [(month, 10.0, 0.0)]
+
+
+def post_to_s3(upload, content=b"%PDF-1.4"):
+    return requests.post(
+        upload["url"],
+        data=upload["fields"],
+        files={"file": ("document.pdf", content)},
+    )
+
+
+@pytest.mark.django_db
+def test_create_with_direct_upload_then_confirm(api_client, supplier, category, s3):
+    data = {
+        "code": "P-1",
+        "supplier": supplier.id,
+        "category": category.id,
+        "direct_upload": True,
+    }
+
+    response = api_client.post("/stock/protocols/", data, format="json")
+    assert response.status_code == 201
+    upload = response.data["upload"]
+    assert upload["key"] == "protocols/P-1"
+    protocol = Protocol.objects.get()
+    assert protocol.file_status == FileStatus.PENDING
+
+    confirm = {"target": "protocol", "id": protocol.id, "token": upload["token"]}
+    response = api_client.post("/stock/uploads/confirm/", confirm)
+    assert response.status_code == 400
+    assert response.data["detail"].code == 10
+
+    assert post_to_s3(upload).status_code == 204
+    response = api_client.post("/stock/uploads/confirm/", confirm)
+    assert response.status_code == 200
+    assert response.data == {"key": "protocols/P-1", "size": 8}
+    protocol.refresh_from_db()
+    assert protocol.file_status == FileStatus.UPLOADED
+
+
+@pytest.mark.django_db
+def test_confirm_needs_a_fresh_upload_through_the_policy(
+    api_client, supplier, invoice, s3
+):
+    s3.put_object(Bucket="test-bucket", Key="invoices/I-1", Body=b"old")
+    other = Invoice.objects.create(supplier=supplier, code="I-2", total_value=1)
+    request = {"target": "invoice", "id": invoice.id}
+    upload = api_client.post("/stock/uploads/", request).data
+    other_upload = api_client.post(
+        "/stock/uploads/", {"target": "invoice", "id": other.id}
+    ).data
+
+    def confirm(token):
+        return api_client.post("/stock/uploads/confirm/", {**request, "token": token})
+
+    response = confirm(upload["token"])
+    assert response.status_code == 400
+    assert response.data["detail"].code == 10
+    for token in (upload["token"] + "x", other_upload["token"]):
+        response = confirm(token)
+        assert response.status_code == 400
+        assert response.data["detail"].code == 12
+
+    assert post_to_s3(upload, b"new").status_code == 204
+    assert confirm(upload["token"]).status_code == 200
+
+
+@pytest.mark.django_db
+def test_report_update_uploads_file_in_background(
+    api_client,
+    product,
+    supplier,
+    s3,
+    staging_dir,
+    celery_eager,
+    django_capture_on_commit_callbacks,
+):
+    report = ReceivingReport.objects.create(
+        product=product, supplier=supplier, quantity=1
+    )
+    data = {
+        "description": "received",
+        "file": SimpleUploadedFile("report.pdf", b"%PDF-1.4"),
+    }
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.patch(
+            f"/stock/receiving-reports/{report.id}/", data, format="multipart"
+        )
+
+    assert response.status_code == 200
+    report.refresh_from_db()
+    assert report.file == str(report.id)
+    assert report.description == "received"
+    body = s3.get_object(Bucket="test-bucket", Key=f"receiving-reports/{report.id}")
+    assert body["Body"].read() == b"%PDF-1.4"
+
+
+@pytest.fixture
+def protocol_item(supplier, category, product):
+    protocol = Protocol.objects.create(code="P-1", supplier=supplier, category=category)
+    return ProtocolItem.objects.create(
+        protocol=protocol, product=product, original_quantity=10, quantity=10
+    )
+
+
+@pytest.fixture
+def withdraw(client, supplier, public_defense):
+    def withdraw(protocol_item, quantity):
+        supplier_order = SupplierOrder.objects.create(
+            client=client,
+            supplier=supplier,
+            protocol=protocol_item.protocol,
+            public_defense=public_defense,
+        )
+        ProtocolWithdrawal.objects.create(
+            protocol_item=protocol_item,
+            supplier_order_item=SupplierOrderItem.objects.create(
+                supplier_order=supplier_order, product=protocol_item.product
+            ),
+            withdraw_quantity=quantity,
+        )
+
+    return withdraw
+
+
+def remaining_quantity(protocol_item):
+    return ProtocolItem.objects.with_remaining_quantity().get(pk=protocol_item.pk)
+
+
+@pytest.mark.django_db
+def test_remaining_quantity_subtracts_withdrawals(protocol_item, product, withdraw):
+    other = ProtocolItem.objects.create(
+        protocol=protocol_item.protocol, product=product, original_quantity=4
+    )
+    assert remaining_quantity(protocol_item).remaining_quantity == 10
+
+    withdraw(protocol_item, 3)
+    withdraw(protocol_item, 2)
+
+    assert remaining_quantity(protocol_item).remaining_quantity == 5
+    assert remaining_quantity(other).remaining_quantity == 4
+
+
+@pytest.mark.django_db
+def test_protocol_item_responses_return_remaining_quantity(
+    api_client, protocol_item, product, withdraw
+):
+    withdraw(protocol_item, 3)
+    url = f"/stock/protocol-items/{protocol_item.id}/"
+
+    assert api_client.get(url).data["quantity"] == 7
+    (listed,) = api_client.get("/stock/protocol-items/").data["results"]
+    assert listed["quantity"] == 7
+
+    response = api_client.patch(url, {"original_quantity": 12})
+    assert response.status_code == 200
+    assert response.data["quantity"] == 9
+
+    ProtocolItem.objects.all().delete()
+    response = api_client.post(
+        "/stock/protocol-items/",
+        {
+            "protocol": protocol_item.protocol_id,
+            "product": product.id,
+            "original_quantity": 6,
+            "quantity": 100,
+        },
+    )
+    assert response.status_code == 201
+    assert response.data["quantity"] == 6
+
+
+def valuation():
+    return list(
+        WarehouseValuation.objects.values_list(
+            "product_code", "product_measure", "price", "average_price", "quantity"
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_warehouse_valuation_follows_items_products_and_measures(
+    warehouse, priced_product, measure, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        item = StockItem.objects.create(
+            stock=warehouse, product=priced_product, quantity=4
+        )
+    assert valuation() == [("test_product_code", "test_measure", 8.0, 2.0, 4)]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        item.quantity = 5
+        item.save()
+        priced_product.price = 3.0
+        priced_product.save()
+    assert valuation() == [("test_product_code", "test_measure", 15.0, 3.0, 5)]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        measure.name = "renamed_measure"
+        measure.save()
+    assert valuation() == [("test_product_code", "renamed_measure", 15.0, 3.0, 5)]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        priced_product.code = "new_code"
+        priced_product.save()
+    assert valuation() == [("new_code", "renamed_measure", 15.0, 3.0, 5)]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        item.delete()
+    assert valuation() == []
+
+
+@pytest.fixture
+def report_movements(warehouse, category, measure):
+    """
+    Movements in three sectors of two public defenses, from products of two
+    categories, two of which share a code; some fall outside the report dates
+    or in the warehouse, which the report leaves out.
+    """
+    other_category = Category.objects.create(name="other", code="other")
+    products = [
+        Product.objects.create(
+            category=product_category,
+            measure=measure,
+            name=f"product_{i}",
+            code=code,
+            price=price,
+        )
+        for i, (product_category, code, price) in enumerate(
+            [
+                (category, "A", 2.0),
+                (other_category, "A", 3.0),
+                (category, "B", 1.5),
+                (other_category, "C", 0.0),
+            ]
+        )
+    ]
+    public_defenses = [
+        PublicDefense.objects.create(name=f"pd_{i}", district="d", address="a")
+        for i in range(2)
+    ]
+    sectors = [
+        Sector.objects.create(name=f"sector_{i}", public_defense=public_defense)
+        for i, public_defense in enumerate(public_defenses + public_defenses[:1])
+    ]
+    stocks = [Stock.objects.create(sector=sector) for sector in sectors] + [warehouse]
+    outside = timezone.now() - timedelta(days=30)
+    for i, (stock, product) in enumerate(
+        (stock, product) for stock in stocks for product in products
+    ):
+        stock_item = StockItem.objects.create(stock=stock, product=product)
+        StockEntry.objects.create(stock_item=stock_item, entry_quantity=10 + i)
+        StockWithdrawal.objects.create(stock_item=stock_item, withdraw_quantity=i % 4)
+        late = StockEntry.objects.create(stock_item=stock_item, entry_quantity=100)
+        StockEntry.objects.filter(id=late.id).update(entry_date=outside)
+    return {
+        "product_ids": [str(product.id) for product in products],
+        "public_defense_ids": [str(pd.id) for pd in public_defenses],
+        "sector_ids": [str(sector.id) for sector in sectors],
+        "category_ids": [str(category.id)],
+    }
+
+
+def sorted_rows(rows):
+    return sorted(rows, key=lambda row: sorted(row.items()))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "filter_names",
+    [
+        ("public_defense_ids",),
+        ("sector_ids",),
+        ("sector_ids", "product_ids"),
+        ("public_defense_ids", "category_ids"),
+        ("sector_ids", "product_ids", "category_ids"),
+        (),
+    ],
+)
+def test_stock_report_matches_the_per_product_report(report_movements, filter_names):
+    filters = {name: report_movements[name] for name in filter_names}
+    dates = (date.today() - timedelta(days=1), date.today() + timedelta(days=1))
+
+    expected = legacy_stock_report(
+        *dates,
+        filters.get("product_ids"),
+        filters.get("public_defense_ids"),
+        filters.get("sector_ids", []),
+        filters.get("category_ids"),
+    )
+    _, rows = stream_stock_report(*dates, **filters)
+
+    assert sorted_rows(get_stock_report(*dates, **filters)) == sorted_rows(expected)
+    assert sorted_rows(rows) == sorted_rows(expected)
+    if filter_names:
+        assert any(row["entry_quantity"] for row in expected)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "param,ids",
+    [("product", ["0"]), ("sector", ["0"]), ("public_defense", ["0", "x"])],
+)
+def test_stock_report_of_unknown_ids_is_not_found(api_client, sector, param, ids):
+    params = {"initial_date": "01/01/2024", "final_date": "31/12/2024", param: ids}
+    if param == "product":
+        params["sector"] = [str(sector.id)]
+
+    response = api_client.get("/stock/stock-report/", params)
+
+    assert response.status_code == 404
+    assert str(ids) in response.data["detail"]
@@ -0,0 +1,130 @@
+from botocore.exceptions import ClientError
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+
+from .errors import UploadNotFoundException, UploadTokenInvalidException
+from .models import FileStatus
+from .storage import get_bucket_name, get_client
+
+
+class UploadTarget:
+    """
+    A kind of document the browser can upload straight to S3: the model it
+    belongs to, the key its file is stored under (formatted with the row as
+    ``obj``) and whether the row's ``file`` field records the upload.
+    """
+
+    def __init__(self, model_label, key_format, sets_file=False, admin_only=True):
+        self.model_label = model_label
+        self.key_format = key_format
+        self.sets_file = sets_file
+        self.admin_only = admin_only
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def get_key(self, obj):
+        return self.key_format.format(obj=obj)
+
+
+UPLOAD_TARGETS = {
+    "protocol": UploadTarget("stock.Protocol", "protocols/{obj.code}"),
+    "invoice": UploadTarget("stock.Invoice", "invoices/{obj.code}"),
+    "accountant-report": UploadTarget(
+        "stock.AccountantReport", "accountant-reports/{obj.month}"
+    ),
+    "receiving-report": UploadTarget(
+        "stock.ReceivingReport", "receiving-reports/{obj.id}", sets_file=True
+    ),
+    "dispatch-report": UploadTarget(
+        "stock.DispatchReport", "dispatch-reports/{obj.id}", sets_file=True
+    ),
+    "order": UploadTarget(
+        "order.Order", "confirm-order/{obj.id}", sets_file=True, admin_only=False
+    ),
+    "materials-order": UploadTarget(
+        "order.MaterialsOrder", "materials-order/{obj.id}", sets_file=True
+    ),
+}
+
+
+UPLOAD_TOKEN_SALT = "stock.uploads"
+UPLOAD_TOKEN_FIELD = "x-amz-meta-upload-token"
+
+
+def create_upload_policy(key, content_type=None):
+    """
+    A presigned POST the browser submits to S3 directly. The policy only
+    accepts ``key``, files up to ``UPLOAD_MAX_BYTES`` and a fresh signed
+    ``token``, which S3 stores with the object so ``confirm_upload`` can tell
+    this upload apart from a file already at the key.
+    """
+    token = signing.dumps(key, salt=UPLOAD_TOKEN_SALT)
+    fields = {UPLOAD_TOKEN_FIELD: token}
+    conditions = [
+        ["content-length-range", 1, settings.UPLOAD_MAX_BYTES],
+        {UPLOAD_TOKEN_FIELD: token},
+    ]
+    if content_type:
+        fields["Content-Type"] = content_type
+        conditions.append({"Content-Type": content_type})
+    post = get_client().generate_presigned_post(
+        get_bucket_name(),
+        key,
+        Fields=fields,
+        Conditions=conditions,
+        ExpiresIn=settings.UPLOAD_POLICY_EXPIRES_SECONDS,
+    )
+    return {
+        "url": post["url"],
+        "fields": post["fields"],
+        "key": key,
+        "token": token,
+        "expires_in": settings.UPLOAD_POLICY_EXPIRES_SECONDS,
+    }
+
+
+def start_direct_upload(target, obj, content_type=None):
+    """
+    Mark ``obj`` as waiting for its file and return the policy the browser
+    uploads it with.
+    """
+    if hasattr(obj, "file_status"):
+        type(obj).objects.filter(pk=obj.pk).update(file_status=FileStatus.PENDING)
+        obj.file_status = FileStatus.PENDING
+    return create_upload_policy(target.get_key(obj), content_type)
+
+
+def confirm_upload(target, obj, token):
+    """
+    Check that the file of ``obj`` reached S3 through the policy that issued
+    ``token`` and record it on the row. Returns the object's size in bytes.
+    """
+    key = target.get_key(obj)
+    try:
+        token_key = signing.loads(token, salt=UPLOAD_TOKEN_SALT)
+    except signing.BadSignature:
+        raise UploadTokenInvalidException
+    if token_key != key:
+        raise UploadTokenInvalidException
+
+    try:
+        head = get_client().head_object(Bucket=get_bucket_name(), Key=key)
+    except ClientError as error:
+        if error.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            raise UploadNotFoundException
+        raise
+    if head.get("Metadata", {}).get("upload-token") != token:
+        raise UploadNotFoundException
+
+    update_fields = []
+    if hasattr(obj, "file_status"):
+        obj.file_status = FileStatus.UPLOADED
+        update_fields.append("file_status")
+    if target.sets_file:
+        obj.file = str(obj.id)
+        update_fields.append("file")
+    obj.save(update_fields=update_fields)
+    return head["ContentLength"]
@@ -43,6 +43,8 @@ from .views import (
     StockRetrieveUpdateDestroyView,
     SupplierListCreateView,
     SupplierRetrieveUpdateDestroyView,
+    UploadConfirmView,
+    UploadPolicyView,
     WarehouseItems,
 )
 
@@ -174,4 +176,6 @@ urlpatterns = [
     path("stock-report/", StockReport.as_view(), name="stock_report"),
     path("warehouse-items/", WarehouseItems.as_view(), name="warehouse_items"),
     path("email/", EmailView.as_view()),
+    path("uploads/", UploadPolicyView.as_view(), name="upload_policy"),
+    path("uploads/confirm/", UploadConfirmView.as_view(), name="upload_confirm"),
 ]
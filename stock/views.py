@@ -1,31 +1,26 @@
-import io
-import os
-import tempfile
 from datetime import datetime
-from decimal import Decimal
 
-import boto3
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.mail import EmailMultiAlternatives
-from django.db.models import F, FloatField, Q, Sum
-from django.db.models.functions import Cast
+from django.db import transaction
 from rest_framework import generics, permissions
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from order.models import StockEntry, StockWithdrawal
+from order.models import StockEntry
 from user.models import Client
 
 from .errors import (
     ProtocolItemAlreadyExistsException,
     SupplierCannotBeDestroyedException,
 )
+from .mixins import EagerLoadingMixin, ExportMixin, FileCreateMixin, ReferenceCacheMixin
 from .models import (
     AccountantReport,
     BiddingExemption,
     Category,
-    CategoryBalance,
     DispatchReport,
     Invoice,
     Measure,
@@ -38,8 +33,14 @@ from .models import (
     Stock,
     StockItem,
     Supplier,
+    WarehouseValuation,
+)
+from .pagination import CreatedCursorPagination, InfinitePagination
+from .reports import (
+    get_accountant_report_categories,
+    get_stock_report,
+    stream_stock_report,
 )
-from .pagination import InfinitePagination
 from .serializers import (
     AccountantReportCategorySerializer,
     AccountantReportSerializer,
@@ -69,34 +70,36 @@ from .serializers import (
     StockItemSerializer,
     StockSerializer,
     SupplierSerializer,
+    UploadConfirmSerializer,
+    UploadSerializer,
 )
-from .services import get_protocol_item_quantity, get_stock_item_quantity
-
-client = boto3.client(
-    "s3",
-    region_name=os.environ.get("AWS_REGION_NAME"),
-    aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
+from .services import (
+    WAREHOUSE_STOCK_ID,
+    WAREHOUSE_VALUATION_COLUMNS,
+    apply_stock_movements,
+    get_or_create_stock_item,
+    get_stock_item_quantity,
+    get_warehouse_valuation,
 )
+from .storage import get_bucket_name, get_client
+from .tasks import move_uploaded_file, queue_email, queue_upload
+from .uploads import UPLOAD_TARGETS, confirm_upload, create_upload_policy
 
 
-class AllStocksView(generics.GenericAPIView):
+class AllStocksView(ReferenceCacheMixin, EagerLoadingMixin, generics.GenericAPIView):
     queryset = Stock.objects.all()
     serializer_class = RetrieveStockSerializer
     permission_classes = [IsAdminUser]
+    reference_models = (Stock, Sector)
 
-    def get(self, request, *args, **kwargs):
-        serializer = self.get_serializer(self.get_queryset(), many=True)
-        return Response(serializer.data)
 
-
-class StockListCreateView(generics.ListCreateAPIView):
+class StockListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = Stock.objects.all()
     serializer_class = RetrieveStockSerializer
     permission_classes = [IsAdminUser]
 
     def get_queryset(self):
-        return Stock.objects.order_by("id")
+        return super().get_queryset().order_by("id")
 
     def get_serializer_class(self):
         if self.request.method == "GET":
@@ -105,7 +108,9 @@ class StockListCreateView(generics.ListCreateAPIView):
             return StockSerializer
 
 
-class StockRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class StockRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = Stock.objects.all()
     serializer_class = StockSerializer
     permission_classes = [IsAdminUser]
@@ -117,17 +122,14 @@ class StockRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return StockSerializer
 
 
-class AllSectorsView(generics.GenericAPIView):
+class AllSectorsView(ReferenceCacheMixin, EagerLoadingMixin, generics.GenericAPIView):
     queryset = Sector.objects.all()
     serializer_class = RetrieveSectorSerializer
     permission_classes = [IsAdminUser]
-
-    def get(self, request, *args, **kwargs):
-        serializer = self.get_serializer(self.get_queryset(), many=True)
-        return Response(serializer.data)
+    reference_models = (Sector, PublicDefense)
 
 
-class SectorListCreateView(generics.ListCreateAPIView):
+class SectorListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = Sector.objects.all()
     serializer_class = RetrieveSectorSerializer
     permission_classes = [IsAdminUser]
@@ -139,7 +141,9 @@ class SectorListCreateView(generics.ListCreateAPIView):
             return SectorSerializer
 
 
-class SectorRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class SectorRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = Sector.objects.all()
     serializer_class = SectorSerializer
     permission_classes = [IsAdminUser]
@@ -151,14 +155,11 @@ class SectorRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return SectorSerializer
 
 
-class AllPublicDefensesView(generics.GenericAPIView):
+class AllPublicDefensesView(ReferenceCacheMixin, generics.GenericAPIView):
     queryset = PublicDefense.objects.all()
     serializer_class = PublicDefenseSerializer
     permission_classes = [IsAdminUser]
-
-    def get(self, request, *args, **kwargs):
-        serializer = self.get_serializer(self.get_queryset(), many=True)
-        return Response(serializer.data)
+    reference_models = (PublicDefense,)
 
 
 class PublicDefenseListCreateView(generics.ListCreateAPIView):
@@ -173,14 +174,11 @@ class PublicDefenseRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIVi
     permission_classes = [IsAdminUser]
 
 
-class AllCategoriesView(generics.GenericAPIView):
+class AllCategoriesView(ReferenceCacheMixin, generics.GenericAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAdminUser]
-
-    def get(self, request, *args, **kwargs):
-        serializer = self.get_serializer(self.get_queryset(), many=True)
-        return Response(serializer.data)
+    reference_models = (Category,)
 
 
 class CategoryListCreateView(generics.ListCreateAPIView):
@@ -195,14 +193,11 @@ class CategoryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAdminUser]
 
 
-class AllMeasuresView(generics.GenericAPIView):
+class AllMeasuresView(ReferenceCacheMixin, generics.GenericAPIView):
     queryset = Measure.objects.all()
     serializer_class = MeasureSerializer
     permission_classes = [IsAdminUser]
-
-    def get(self, request, *args, **kwargs):
-        serializer = self.get_serializer(self.get_queryset(), many=True)
-        return Response(serializer.data)
+    reference_models = (Measure,)
 
 
 class MeasureListCreateView(generics.ListCreateAPIView):
@@ -217,13 +212,14 @@ class MeasureRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAdminUser]
 
 
-class AllProductsView(generics.GenericAPIView):
+class AllProductsView(ReferenceCacheMixin, EagerLoadingMixin, generics.GenericAPIView):
     queryset = Product.objects.all()
     serializer_class = RetrieveProductSerializer
     permission_classes = [IsAdminUser]
+    reference_models = (Product, Category, Measure, Protocol)
 
     def get_queryset(self):
-        queryset = Product.objects.all()
+        queryset = super().get_queryset()
         protocol_id = self.request.query_params.get("protocol_id")
         if protocol_id:
             protocol = Protocol.objects.get(id=int(protocol_id))
@@ -232,17 +228,14 @@ class AllProductsView(generics.GenericAPIView):
                 queryset = queryset.filter(category__id__in=[category_id])
         return queryset
 
-    def get(self, request, *args, **kwargs):
-        serializer = self.get_serializer(self.get_queryset(), many=True)
-        return Response(serializer.data)
-
 
-class ProductListCreateView(generics.ListCreateAPIView):
+class ProductListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
+    queryset = Product.objects.all()
     serializer_class = RetrieveProductSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        queryset = Product.objects.all()
+        queryset = super().get_queryset()
         category_ids = self.request.query_params.get("category_id")
         if category_ids:
             category_ids = [int(category_id) for category_id in category_ids.split(",")]
@@ -256,7 +249,9 @@ class ProductListCreateView(generics.ListCreateAPIView):
             return ProductSerializer
 
 
-class ProductRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class ProductRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -268,22 +263,17 @@ class ProductRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return ProductSerializer
 
 
-class StockItemListCreateView(generics.ListCreateAPIView):
+class StockItemListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
+    queryset = StockItem.objects.all()
     serializer_class = RetrieveStockItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        queryset = super().get_queryset()
         stock_ids = self.request.query_params.get("stock_id")
         if stock_ids:
             stock_ids = [int(stock_id) for stock_id in stock_ids.split(",")]
-            queryset = StockItem.objects.filter(stock__id__in=stock_ids)
-        else:
-            queryset = StockItem.objects.all()
-        for stock_item in queryset:
-            if stock_item.stock.id != 1:
-                stock_item.quantity = get_stock_item_quantity(stock_item)
-                stock_item.save(update_fields=["quantity"])
-
+            queryset = queryset.filter(stock__id__in=stock_ids)
         return queryset
 
     def get_serializer_class(self):
@@ -293,19 +283,13 @@ class StockItemListCreateView(generics.ListCreateAPIView):
             return StockItemSerializer
 
 
-class StockItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class StockItemRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = StockItem.objects.all()
     serializer_class = StockItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        if instance.stock.id != 1:
-            instance.quantity = get_stock_item_quantity(instance)
-            instance.save(update_fields=["quantity"])
-        return Response(serializer.data)
-
     def perform_update(self, serializer):
         instance = serializer.save()
         if instance.stock.id != 1:
@@ -319,7 +303,7 @@ class StockItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return StockItemSerializer
 
 
-class SupplierListCreateView(generics.ListCreateAPIView):
+class SupplierListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = Supplier.objects.all()
     serializer_class = RetrieveSupplierSerializer
     permission_classes = [IsAdminUser]
@@ -331,17 +315,16 @@ class SupplierListCreateView(generics.ListCreateAPIView):
             return SupplierSerializer
 
 
-class AllSuppliersView(generics.GenericAPIView):
+class AllSuppliersView(ReferenceCacheMixin, EagerLoadingMixin, generics.GenericAPIView):
     queryset = Supplier.objects.all()
     serializer_class = RetrieveSupplierSerializer
     permission_classes = [IsAdminUser]
+    reference_models = (Supplier, Category)
 
-    def get(self, request, *args, **kwargs):
-        serializer = self.get_serializer(self.get_queryset(), many=True)
-        return Response(serializer.data)
 
-
-class SupplierRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class SupplierRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = Supplier.objects.all()
     serializer_class = RetrieveSupplierSerializer
     permission_classes = [IsAdminUser]
@@ -360,7 +343,7 @@ class SupplierRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return SupplierSerializer
 
 
-class AllProtocolsView(generics.GenericAPIView):
+class AllProtocolsView(EagerLoadingMixin, generics.GenericAPIView):
     queryset = Protocol.objects.all()
     serializer_class = RetrieveProtocolSerializer
     permission_classes = [IsAdminUser]
@@ -370,23 +353,13 @@ class AllProtocolsView(generics.GenericAPIView):
         return Response(serializer.data)
 
 
-class ProtocolListCreateView(generics.ListCreateAPIView):
+class ProtocolListCreateView(
+    FileCreateMixin, EagerLoadingMixin, generics.ListCreateAPIView
+):
     queryset = Protocol.objects.all()
     serializer_class = RetrieveProtocolSerializer
     permission_classes = [IsAdminUser]
-
-    def perform_create(self, serializer):
-        file_data = self.request.data.get("file")
-        code = self.request.data.get("code")
-
-        with tempfile.TemporaryFile() as tmp_file:
-            for chunk in file_data.file:
-                tmp_file.write(chunk)
-            tmp_file.seek(0)
-            client.upload_fileobj(
-                tmp_file, os.environ.get("AWS_BUCKET_NAME"), f"protocols/{code}"
-            )
-        serializer.save()
+    upload_target = "protocol"
 
     def get_serializer_class(self):
         if self.request.method == "GET":
@@ -395,7 +368,9 @@ class ProtocolListCreateView(generics.ListCreateAPIView):
             return ProtocolSerializer
 
 
-class ProtocolRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class ProtocolRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = Protocol.objects.all()
     serializer_class = RetrieveProtocolSerializer
     permission_classes = [IsAdminUser]
@@ -408,50 +383,22 @@ class ProtocolRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
 
     def perform_update(self, serializer):
         file_data = self.request.data.get("file")
-        code = self.request.data.get("code")
-        file_path = f"protocols/{code}"
-        original_code = self.get_object().code
-        original_file_path = f"protocols/{original_code}"
-
-        if code:
+        original_key = f"protocols/{serializer.instance.code}"
+        with transaction.atomic():
+            instance = serializer.save()
+            key = f"protocols/{instance.code}"
             if file_data:
-                client.delete_object(
-                    Bucket=os.environ.get("AWS_BUCKET_NAME"), Key=original_file_path
-                )
-                client.upload_fileobj(
-                    file_data, os.environ.get("AWS_BUCKET_NAME"), file_path
-                )
-            else:
-                client_response = client.get_object(
-                    Bucket=os.environ.get("AWS_BUCKET_NAME"), Key=original_file_path
-                )
-                file_obj = client_response["Body"].read()
-                file_obj_stream = io.BytesIO(file_obj)
-                client.delete_object(
-                    Bucket=os.environ.get("AWS_BUCKET_NAME"), Key=original_file_path
-                )
-                client.upload_fileobj(
-                    file_obj_stream, os.environ.get("AWS_BUCKET_NAME"), file_path
-                )
+                if key != original_key:
+                    get_client().delete_object(
+                        Bucket=get_bucket_name(), Key=original_key
+                    )
+                queue_upload(instance, file_data, key)
+            elif key != original_key:
+                move_uploaded_file(instance, original_key, key)
 
-        else:
-            if file_data:
-                client.delete_object(
-                    Bucket=os.environ.get("AWS_BUCKET_NAME"), Key=original_file_path
-                )
-                client.upload_fileobj(
-                    file_data,
-                    Bucket=os.environ.get("AWS_BUCKET_NAME"),
-                    Key=original_file_path,
-                )
-            else:
-                pass
 
-        serializer.save()
-
-
-class ProtocolItemListView(generics.ListCreateAPIView):
-    queryset = ProtocolItem.objects.all()
+class ProtocolItemListView(EagerLoadingMixin, generics.ListCreateAPIView):
+    queryset = ProtocolItem.objects.with_remaining_quantity().order_by("-created")
     serializer_class = RetrieveProtocolItemSerializer
     permission_classes = [IsAdminUser]
     pagination_class = InfinitePagination
@@ -462,14 +409,11 @@ class ProtocolItemListView(generics.ListCreateAPIView):
         if protocol_id:
             protocol_id = protocol_id.split(",")
             queryset = queryset.filter(protocol__id__in=protocol_id)
-        for protocol_item in queryset:
-            protocol_item.quantity = get_protocol_item_quantity(protocol_item)
-            protocol_item.save(update_fields=["quantity"])
         return queryset
 
 
-class ProtocolItemListCreateView(generics.ListCreateAPIView):
-    queryset = ProtocolItem.objects.all()
+class ProtocolItemListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
+    queryset = ProtocolItem.objects.with_remaining_quantity().order_by("-created")
     serializer_class = RetrieveProtocolItemSerializer
     permission_classes = [IsAdminUser]
 
@@ -490,9 +434,6 @@ class ProtocolItemListCreateView(generics.ListCreateAPIView):
         if protocol_id:
             protocol_id = protocol_id.split(",")
             queryset = queryset.filter(protocol__id__in=protocol_id)
-        for protocol_item in queryset:
-            protocol_item.quantity = get_protocol_item_quantity(protocol_item)
-            protocol_item.save(update_fields=["quantity"])
         return queryset
 
     def get_serializer_class(self):
@@ -502,18 +443,13 @@ class ProtocolItemListCreateView(generics.ListCreateAPIView):
             return ProtocolItemSerializer
 
 
-class ProtocolItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = ProtocolItem.objects.all()
+class ProtocolItemRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
+    queryset = ProtocolItem.objects.with_remaining_quantity()
     serializer_class = RetrieveProtocolItemSerializer
     permission_classes = [IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        instance.quantity = get_protocol_item_quantity(instance)
-        instance.save(update_fields=["quantity"])
-        return Response(serializer.data)
-
     def get_serializer_class(self):
         if self.request.method == "GET":
             return RetrieveProtocolItemSerializer
@@ -521,7 +457,7 @@ class ProtocolItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIVie
             return ProtocolItemSerializer
 
 
-class AllInvoicesView(generics.GenericAPIView):
+class AllInvoicesView(EagerLoadingMixin, generics.GenericAPIView):
     queryset = Invoice.objects.all()
     serializer_class = RetrieveInvoiceSerializer
     permission_classes = [IsAdminUser]
@@ -531,10 +467,13 @@ class AllInvoicesView(generics.GenericAPIView):
         return Response(serializer.data)
 
 
-class InvoiceListCreateView(generics.ListCreateAPIView):
+class InvoiceListCreateView(
+    FileCreateMixin, EagerLoadingMixin, generics.ListCreateAPIView
+):
     queryset = Invoice.objects.all()
     serializer_class = RetrieveInvoiceSerializer
     permission_classes = [IsAdminUser]
+    upload_target = "invoice"
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -549,19 +488,6 @@ class InvoiceListCreateView(generics.ListCreateAPIView):
 
         return queryset
 
-    def perform_create(self, serializer):
-        file_data = self.request.data.get("file")
-        code = self.request.data.get("code")
-
-        with tempfile.TemporaryFile() as tmp_file:
-            for chunk in file_data.file:
-                tmp_file.write(chunk)
-            tmp_file.seek(0)
-            client.upload_fileobj(
-                tmp_file, os.environ.get("AWS_BUCKET_NAME"), f"invoices/{code}"
-            )
-        serializer.save()
-
     def get_serializer_class(self):
         if self.request.method == "GET":
             return RetrieveInvoiceSerializer
@@ -569,11 +495,21 @@ class InvoiceListCreateView(generics.ListCreateAPIView):
             return InvoiceSerializer
 
 
-class InvoiceRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class InvoiceRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = Invoice.objects.all()
     serializer_class = RetrieveInvoiceSerializer
     permission_classes = [IsAdminUser]
 
+    def perform_update(self, serializer):
+        original_key = f"invoices/{serializer.instance.code}"
+        with transaction.atomic():
+            instance = serializer.save()
+            key = f"invoices/{instance.code}"
+            if key != original_key:
+                move_uploaded_file(instance, original_key, key)
+
     def get_serializer_class(self):
         if self.request.method == "GET":
             return RetrieveInvoiceSerializer
@@ -581,10 +517,11 @@ class InvoiceRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return InvoiceSerializer
 
 
-class ReceivingReportListCreateView(generics.ListCreateAPIView):
+class ReceivingReportListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = ReceivingReport.objects.all()
     serializer_class = RetrieveReceivingReportSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = CreatedCursorPagination
 
     def get_serializer_class(self):
         if self.request.method == "GET":
@@ -593,23 +530,26 @@ class ReceivingReportListCreateView(generics.ListCreateAPIView):
             return ReceivingReportSerializer
 
 
-class ReceivingReportRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class ReceivingReportRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = ReceivingReport.objects.all()
     serializer_class = RetrieveReceivingReportSerializer
     permission_classes = [IsAdminUser]
 
     def perform_update(self, serializer):
-        instance = serializer.save()
         file_data = self.request.data.get("file")
-        if file_data:
-            client.upload_fileobj(
-                file_data,
-                os.environ.get("AWS_BUCKET_NAME"),
-                f"receiving-reports/{instance.id}",
-            )
-            instance.file = str(instance.id)
-        instance.description = self.request.data.get("description")
-        instance.save()
+        with transaction.atomic():
+            instance = serializer.save()
+            if file_data:
+                queue_upload(
+                    instance,
+                    file_data,
+                    f"receiving-reports/{instance.id}",
+                    file_value=str(instance.id),
+                )
+            instance.description = self.request.data.get("description")
+            instance.save(update_fields=["description", "updated"])
 
     def get_serializer_class(self):
         if self.request.method == "GET":
@@ -618,10 +558,11 @@ class ReceivingReportRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPI
             return ReceivingReportSerializer
 
 
-class DispatchReportListCreateView(generics.ListCreateAPIView):
+class DispatchReportListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = DispatchReport.objects.all()
     serializer_class = RetrieveDispatchReportSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = CreatedCursorPagination
 
     def get_serializer_class(self):
         if self.request.method == "GET":
@@ -630,22 +571,24 @@ class DispatchReportListCreateView(generics.ListCreateAPIView):
             return DispatchReportSerializer
 
 
-class DispatchReportRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class DispatchReportRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = DispatchReport.objects.all()
     serializer_class = RetrieveDispatchReportSerializer
     permission_classes = [IsAdminUser]
 
     def perform_update(self, serializer):
-        instance = serializer.save()
         file_data = self.request.data.get("file")
-        if file_data:
-            client.upload_fileobj(
-                file_data,
-                os.environ.get("AWS_BUCKET_NAME"),
-                f"dispatch-reports/{instance.id}",
-            )
-            instance.file = str(instance.id)
-        instance.save()
+        with transaction.atomic():
+            instance = serializer.save()
+            if file_data:
+                queue_upload(
+                    instance,
+                    file_data,
+                    f"dispatch-reports/{instance.id}",
+                    file_value=str(instance.id),
+                )
 
     def get_serializer_class(self):
         if self.request.method == "GET":
@@ -654,59 +597,47 @@ class DispatchReportRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIV
             return DispatchReportSerializer
 
 
-class BiddingExemptionListCreateView(generics.ListCreateAPIView):
+class BiddingExemptionListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = BiddingExemption.objects.all()
     serializer_class = RetrieveBiddingExemptionSerializer
     permission_classes = [IsAdminUser]
 
     def perform_create(self, serializer):
         stock = Stock.objects.get(id=int(self.request.data.get("stock")))
-        warehouse = Stock.objects.get(id=1)
         product = Product.objects.get(id=int(self.request.data.get("product")))
         invoice = Invoice.objects.get(id=int(self.request.data.get("invoice")))
         quantity = int(self.request.data.get("quantity"))
 
-        if stock.id != warehouse.id:
-            stock_item, created = StockItem.objects.get_or_create(
-                product=product, stock=stock
-            )
-            StockEntry.objects.create(
-                stock_item=stock_item, entry_quantity=quantity, invoice=invoice
-            )
-            ReceivingReport.objects.create(
-                product=product,
-                supplier=invoice.supplier,
-                quantity=quantity,
-                stock_item=stock_item,
-            )
-            warehouse_stock_item, created = StockItem.objects.get_or_create(
-                product=product, stock=warehouse
-            )
-            warehouse_stock_item.quantity = warehouse_stock_item.quantity + quantity
-            warehouse_stock_item.save(update_fields=["quantity"])
-            DispatchReport.objects.create(
-                public_defense=stock.sector.public_defense,
-                product=product,
-                quantity=quantity,
-                stock_item=stock_item,
-            )
-            warehouse_stock_item = StockItem.objects.get(id=warehouse_stock_item.id)
-            warehouse_stock_item.quantity = warehouse_stock_item.quantity - quantity
-            warehouse_stock_item.save(update_fields=["quantity"])
-        else:
-            stock_item, created = StockItem.objects.get_or_create(
-                product=product, stock=warehouse
-            )
-            stock_item.quantity = stock_item.quantity + quantity
-            stock_item.save(update_fields=["quantity"])
-            ReceivingReport.objects.create(
-                product=product,
-                supplier=invoice.supplier,
-                quantity=quantity,
-                stock_item=stock_item,
-            )
+        with transaction.atomic():
+            if stock.id != WAREHOUSE_STOCK_ID:
+                stock_item = get_or_create_stock_item(stock.id, product.id)
+                StockEntry.objects.create(
+                    stock_item=stock_item, entry_quantity=quantity, invoice=invoice
+                )
+                ReceivingReport.objects.create(
+                    product=product,
+                    supplier=invoice.supplier,
+                    quantity=quantity,
+                    stock_item=stock_item,
+                )
+                DispatchReport.objects.create(
+                    public_defense=stock.sector.public_defense,
+                    product=product,
+                    quantity=quantity,
+                    stock_item=stock_item,
+                )
+            else:
+                stock_item = apply_stock_movements(
+                    {(WAREHOUSE_STOCK_ID, product.id): quantity}
+                )[(WAREHOUSE_STOCK_ID, product.id)]
+                ReceivingReport.objects.create(
+                    product=product,
+                    supplier=invoice.supplier,
+                    quantity=quantity,
+                    stock_item=stock_item,
+                )
 
-        serializer.save()
+            serializer.save()
 
     def get_serializer_class(self):
         if self.request.method == "GET":
@@ -715,18 +646,19 @@ class BiddingExemptionListCreateView(generics.ListCreateAPIView):
             return BiddingExemptionSerializer
 
 
-class BiddingExemptionRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class BiddingExemptionRetrieveUpdateDestroyView(
+    EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView
+):
     queryset = BiddingExemption.objects.all()
     serializer_class = BiddingExemptionSerializer
     permission_classes = [IsAdminUser]
 
+    @transaction.atomic
     def perform_destroy(self, instance):
-        if instance.stock.id == 1:
-            stock_item = StockItem.objects.get(
-                product=instance.product, stock=instance.stock
-            )
-            stock_item.quantity = stock_item.quantity - instance.quantity
-            stock_item.save(update_fields=["quantity"])
+        if instance.stock.id == WAREHOUSE_STOCK_ID:
+            stock_item = apply_stock_movements(
+                {(WAREHOUSE_STOCK_ID, instance.product_id): -instance.quantity}
+            )[(WAREHOUSE_STOCK_ID, instance.product_id)]
             ReceivingReport.objects.get(stock_item=stock_item).delete()
         else:
             stock_item = StockItem.objects.get(
@@ -746,75 +678,43 @@ class BiddingExemptionRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAP
             return BiddingExemptionSerializer
 
 
-class AccountantReportListCreateView(generics.ListCreateAPIView):
+class AccountantReportListCreateView(
+    FileCreateMixin, ExportMixin, generics.ListCreateAPIView
+):
     queryset = AccountantReport.objects.all()
     serializer_class = AccountantReportSerializer
     permission_classes = [IsAdminUser]
+    upload_target = "accountant-report"
 
     def get(self, request, *args, **kwargs):
         date = request.query_params.get("date")
         if not date:
             queryset = self.get_queryset()
+            if self.export_format:
+                columns = [
+                    field
+                    for field in self.serializer_class.Meta.fields
+                    if field not in ("file", "file_status")
+                ]
+                return self.export(
+                    columns,
+                    queryset.values(*columns).iterator(
+                        chunk_size=self.export_chunk_size
+                    ),
+                    "accountant-reports",
+                )
             serializer = self.serializer_class(queryset, many=True)
             return Response(serializer.data)
         month = date.split("-")[0]
         year = date.split("-")[1]
-        date = datetime(int(year), int(month), 1).date()
-
-        receiving_reports = ReceivingReport.objects.filter(
-            created__month=month, created__year=year
-        ).select_related("product")
-
-        categories = receiving_reports.values(
-            "product__category__name", "product__category__code"
-        ).annotate(
-            entry_value=Sum(
-                F("product__price") * F("quantity"), output_field=FloatField()
-            )
+        categories = get_accountant_report_categories(
+            datetime(int(year), int(month), 1).date()
         )
-
-        dispatch_reports = DispatchReport.objects.filter(
-            created__month=month, created__year=year
-        ).select_related("product")
-
-        dispatch_categories = dispatch_reports.values(
-            "product__category__name", "product__category__code"
-        ).annotate(
-            output_value=Sum("quantity", output_field=FloatField())
-            * F("product__price")
-        )
-
-        for category in categories:
-            dispatch_category = dispatch_categories.filter(
-                product__category__name=category["product__category__name"],
-                product__category__code=category["product__category__code"],
-            )
-            if dispatch_category:
-                category["output_value"] = dispatch_category.aggregate(
-                    Sum("output_value")
-                )["output_value__sum"]
-            else:
-                category["output_value"] = 0.00
-
-            category["balance"] = category["entry_value"] - category["output_value"]
-            category_obj = Category.objects.get(
-                code=category["product__category__code"]
-            )
-            category_balance, _ = CategoryBalance.objects.update_or_create(
-                category=category_obj, date=date, balance=category["balance"]
-            )
-            previous_balance = (
-                CategoryBalance.objects.exclude(
-                    category=category_obj, date=date, balance=category["balance"]
-                )
-                .exclude(date__gte=date)
-                .aggregate(Sum("balance"))["balance__sum"]
-            )
-            if not previous_balance:
-                previous_balance = Decimal(0.00)
-            category["previous_balance"] = previous_balance
-            category["current_balance"] = previous_balance + Decimal(
-                category["balance"]
+        if self.export_format:
+            return self.export(
+                list(AccountantReportCategorySerializer().fields),
+                categories.iterator(chunk_size=self.export_chunk_size),
+                f"accountant-report-{year}-{int(month):02d}",
             )
 
         serializer = AccountantReportCategorySerializer(categories, many=True)
@@ -824,21 +724,6 @@ class AccountantReportListCreateView(generics.ListCreateAPIView):
             }
         )
 
-    def perform_create(self, serializer):
-        file_data = self.request.data.get("file")
-        month = self.request.data.get("month")
-
-        with tempfile.TemporaryFile() as tmp_file:
-            for chunk in file_data.file:
-                tmp_file.write(chunk)
-            tmp_file.seek(0)
-            client.upload_fileobj(
-                tmp_file,
-                os.environ.get("AWS_BUCKET_NAME"),
-                f"accountant-reports/{month}",
-            )
-        serializer.save()
-
 
 class AccountantReportRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     queryset = AccountantReport.objects.all()
@@ -846,7 +731,7 @@ class AccountantReportRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAP
     permission_classes = [IsAdminUser]
 
 
-class StockReport(APIView):
+class StockReport(ExportMixin, APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request, *args, **kwargs):
@@ -854,500 +739,34 @@ class StockReport(APIView):
         final_date = request.query_params.get("final_date")
         initial_date = datetime.strptime(initial_date, "%d/%m/%Y").strftime("%Y-%m-%d")
         final_date = datetime.strptime(final_date, "%d/%m/%Y").strftime("%Y-%m-%d")
-        product_ids = request.query_params.getlist("product")
-        public_defense_ids = request.query_params.getlist("public_defense")
-        sector_ids = request.query_params.getlist("sector")
-        categories = request.query_params.getlist("category")
-        response = []
-
-        if product_ids:
-            for product_id in product_ids:
-                product = Product.objects.get(id=product_id)
-                if categories:
-                    if str(product.category_id) in categories:
-                        if public_defense_ids:
-                            for public_defense_id in public_defense_ids:
-                                public_defense = PublicDefense.objects.get(
-                                    id=public_defense_id
-                                )
-                                entry_filters = Q(
-                                    entry_date__gte=initial_date,
-                                    entry_date__lte=final_date,
-                                )
-                                entry_filters &= Q(stock_item__product_id=product_id)
-                                entry_filters &= Q(
-                                    stock_item__stock__sector__public_defense_id=public_defense_id
-                                )
-                                entry_filters &= ~Q(stock_item__stock_id=1)
-                                entry_quantity = (
-                                    StockEntry.objects.filter(entry_filters).aggregate(
-                                        Sum("entry_quantity")
-                                    )["entry_quantity__sum"]
-                                    or 0
-                                )
-                                entry_price = product.price * entry_quantity
-
-                                withdraw_filters = Q(
-                                    withdraw_date__gte=initial_date,
-                                    withdraw_date__lte=final_date,
-                                )
-                                withdraw_filters &= Q(stock_item__product_id=product_id)
-                                withdraw_filters &= Q(
-                                    stock_item__stock__sector__public_defense_id=public_defense_id
-                                )
-                                withdraw_filters &= ~Q(stock_item__stock_id=1)
-                                withdrawal_quantity = (
-                                    StockWithdrawal.objects.filter(
-                                        withdraw_filters
-                                    ).aggregate(Sum("withdraw_quantity"))[
-                                        "withdraw_quantity__sum"
-                                    ]
-                                    or 0
-                                )
-                                withdrawal_price = product.price * withdrawal_quantity
-
-                                response.append(
-                                    {
-                                        "public_defense": public_defense.name,
-                                        "product_code": product.code,
-                                        "product_name": product.name,
-                                        "entry_quantity": entry_quantity,
-                                        "withdrawal_quantity": withdrawal_quantity,
-                                        "entry_price": entry_price,
-                                        "withdrawal_price": withdrawal_price,
-                                    }
-                                )
-                        else:
-                            for sector_id in sector_ids:
-                                sector = Sector.objects.get(id=sector_id)
-                                entry_filters = Q(
-                                    entry_date__gte=initial_date,
-                                    entry_date__lte=final_date,
-                                )
-                                entry_filters &= Q(stock_item__product_id=product_id)
-                                entry_filters &= Q(
-                                    stock_item__stock__sector_id=sector_id
-                                )
-                                entry_filters &= ~Q(stock_item__stock_id=1)
-                                entry_quantity = (
-                                    StockEntry.objects.filter(entry_filters).aggregate(
-                                        Sum("entry_quantity")
-                                    )["entry_quantity__sum"]
-                                    or 0
-                                )
-                                entry_price = product.price * entry_quantity
-
-                                withdraw_filters = Q(
-                                    withdraw_date__gte=initial_date,
-                                    withdraw_date__lte=final_date,
-                                )
-                                withdraw_filters &= Q(stock_item__product_id=product_id)
-                                withdraw_filters &= Q(
-                                    stock_item__stock__sector_id=sector_id
-                                )
-                                withdraw_filters &= ~Q(stock_item__stock_id=1)
-                                withdrawal_quantity = (
-                                    StockWithdrawal.objects.filter(
-                                        withdraw_filters
-                                    ).aggregate(Sum("withdraw_quantity"))[
-                                        "withdraw_quantity__sum"
-                                    ]
-                                    or 0
-                                )
-                                withdrawal_price = product.price * withdrawal_quantity
-
-                                response.append(
-                                    {
-                                        "sector": sector.name,
-                                        "product_code": product.code,
-                                        "product_name": product.name,
-                                        "entry_quantity": entry_quantity,
-                                        "withdrawal_quantity": withdrawal_quantity,
-                                        "entry_price": entry_price,
-                                        "withdrawal_price": withdrawal_price,
-                                    }
-                                )
-                else:
-                    if public_defense_ids:
-                        for public_defense_id in public_defense_ids:
-                            public_defense = PublicDefense.objects.get(
-                                id=public_defense_id
-                            )
-                            entry_filters = Q(
-                                entry_date__gte=initial_date, entry_date__lte=final_date
-                            )
-                            entry_filters &= Q(stock_item__product_id=product_id)
-                            entry_filters &= Q(
-                                stock_item__stock__sector__public_defense_id=public_defense_id
-                            )
-                            entry_filters &= ~Q(stock_item__stock_id=1)
-                            entry_quantity = (
-                                StockEntry.objects.filter(entry_filters).aggregate(
-                                    Sum("entry_quantity")
-                                )["entry_quantity__sum"]
-                                or 0
-                            )
-                            entry_price = product.price * entry_quantity
-
-                            withdraw_filters = Q(
-                                withdraw_date__gte=initial_date,
-                                withdraw_date__lte=final_date,
-                            )
-                            withdraw_filters &= Q(stock_item__product_id=product_id)
-                            withdraw_filters &= Q(
-                                stock_item__stock__sector__public_defense_id=public_defense_id
-                            )
-                            withdraw_filters &= ~Q(stock_item__stock_id=1)
-                            withdrawal_quantity = (
-                                StockWithdrawal.objects.filter(
-                                    withdraw_filters
-                                ).aggregate(Sum("withdraw_quantity"))[
-                                    "withdraw_quantity__sum"
-                                ]
-                                or 0
-                            )
-                            withdrawal_price = product.price * withdrawal_quantity
-
-                            response.append(
-                                {
-                                    "public_defense": public_defense.name,
-                                    "product_code": product.code,
-                                    "product_name": product.name,
-                                    "entry_quantity": entry_quantity,
-                                    "withdrawal_quantity": withdrawal_quantity,
-                                    "entry_price": entry_price,
-                                    "withdrawal_price": withdrawal_price,
-                                }
-                            )
-                    else:
-                        for sector_id in sector_ids:
-                            sector = Sector.objects.get(id=sector_id)
-                            entry_filters = Q(
-                                entry_date__gte=initial_date, entry_date__lte=final_date
-                            )
-                            entry_filters &= Q(stock_item__product_id=product_id)
-                            entry_filters &= Q(stock_item__stock__sector_id=sector_id)
-                            entry_filters &= ~Q(stock_item__stock_id=1)
-                            entry_quantity = (
-                                StockEntry.objects.filter(entry_filters).aggregate(
-                                    Sum("entry_quantity")
-                                )["entry_quantity__sum"]
-                                or 0
-                            )
-                            entry_price = product.price * entry_quantity
-
-                            withdraw_filters = Q(
-                                withdraw_date__gte=initial_date,
-                                withdraw_date__lte=final_date,
-                            )
-                            withdraw_filters &= Q(stock_item__product_id=product_id)
-                            withdraw_filters &= Q(
-                                stock_item__stock__sector_id=sector_id
-                            )
-                            withdraw_filters &= ~Q(stock_item__stock_id=1)
-                            withdrawal_quantity = (
-                                StockWithdrawal.objects.filter(
-                                    withdraw_filters
-                                ).aggregate(Sum("withdraw_quantity"))[
-                                    "withdraw_quantity__sum"
-                                ]
-                                or 0
-                            )
-                            withdrawal_price = product.price * withdrawal_quantity
-
-                            response.append(
-                                {
-                                    "sector": sector.name,
-                                    "product_code": product.code,
-                                    "product_name": product.name,
-                                    "entry_quantity": entry_quantity,
-                                    "withdrawal_quantity": withdrawal_quantity,
-                                    "entry_price": entry_price,
-                                    "withdrawal_price": withdrawal_price,
-                                }
-                            )
-        else:
-            product_ids = Product.objects.values_list("id", flat=True)
-            for product_id in product_ids:
-                product = Product.objects.get(id=product_id)
-                if categories:
-                    if str(product.category_id) in categories:
-                        if public_defense_ids:
-                            for public_defense_id in public_defense_ids:
-                                public_defense = PublicDefense.objects.get(
-                                    id=public_defense_id
-                                )
-                                entry_filters = Q(
-                                    entry_date__gte=initial_date,
-                                    entry_date__lte=final_date,
-                                )
-                                entry_filters &= Q(stock_item__product_id=product_id)
-                                entry_filters &= Q(
-                                    stock_item__stock__sector__public_defense_id=public_defense_id
-                                )
-                                entry_filters &= ~Q(stock_item__stock_id=1)
-                                entry_quantity = (
-                                    StockEntry.objects.filter(entry_filters).aggregate(
-                                        Sum("entry_quantity")
-                                    )["entry_quantity__sum"]
-                                    or 0
-                                )
-                                entry_price = product.price * entry_quantity
-
-                                withdraw_filters = Q(
-                                    withdraw_date__gte=initial_date,
-                                    withdraw_date__lte=final_date,
-                                )
-                                withdraw_filters &= Q(stock_item__product_id=product_id)
-                                withdraw_filters &= Q(
-                                    stock_item__stock__sector__public_defense_id=public_defense_id
-                                )
-                                withdraw_filters &= ~Q(stock_item__stock_id=1)
-                                withdrawal_quantity = (
-                                    StockWithdrawal.objects.filter(
-                                        withdraw_filters
-                                    ).aggregate(Sum("withdraw_quantity"))[
-                                        "withdraw_quantity__sum"
-                                    ]
-                                    or 0
-                                )
-                                withdrawal_price = product.price * withdrawal_quantity
-
-                                response.append(
-                                    {
-                                        "public_defense": public_defense.name,
-                                        "product_code": product.code,
-                                        "product_name": product.name,
-                                        "entry_quantity": entry_quantity,
-                                        "withdrawal_quantity": withdrawal_quantity,
-                                        "entry_price": entry_price,
-                                        "withdrawal_price": withdrawal_price,
-                                    }
-                                )
-                        else:
-                            for sector_id in sector_ids:
-                                sector = Sector.objects.get(id=sector_id)
-                                entry_filters = Q(
-                                    entry_date__gte=initial_date,
-                                    entry_date__lte=final_date,
-                                )
-                                entry_filters &= Q(stock_item__product_id=product_id)
-                                entry_filters &= Q(
-                                    stock_item__stock__sector_id=sector_id
-                                )
-                                entry_filters &= ~Q(stock_item__stock_id=1)
-                                entry_quantity = (
-                                    StockEntry.objects.filter(entry_filters).aggregate(
-                                        Sum("entry_quantity")
-                                    )["entry_quantity__sum"]
-                                    or 0
-                                )
-                                entry_price = product.price * entry_quantity
-
-                                withdraw_filters = Q(
-                                    withdraw_date__gte=initial_date,
-                                    withdraw_date__lte=final_date,
-                                )
-                                withdraw_filters &= Q(stock_item__product_id=product_id)
-                                withdraw_filters &= Q(
-                                    stock_item__stock__sector_id=sector_id
-                                )
-                                withdraw_filters &= ~Q(stock_item__stock_id=1)
-                                withdrawal_quantity = (
-                                    StockWithdrawal.objects.filter(
-                                        withdraw_filters
-                                    ).aggregate(Sum("withdraw_quantity"))[
-                                        "withdraw_quantity__sum"
-                                    ]
-                                    or 0
-                                )
-                                withdrawal_price = product.price * withdrawal_quantity
-
-                                response.append(
-                                    {
-                                        "sector": sector.name,
-                                        "product_code": product.code,
-                                        "product_name": product.name,
-                                        "entry_quantity": entry_quantity,
-                                        "withdrawal_quantity": withdrawal_quantity,
-                                        "entry_price": entry_price,
-                                        "withdrawal_price": withdrawal_price,
-                                    }
-                                )
-                else:
-                    if public_defense_ids:
-                        for public_defense_id in public_defense_ids:
-                            public_defense = PublicDefense.objects.get(
-                                id=public_defense_id
-                            )
-                            entry_filters = Q(
-                                entry_date__gte=initial_date, entry_date__lte=final_date
-                            )
-                            entry_filters &= Q(stock_item__product_id=product_id)
-                            entry_filters &= Q(
-                                stock_item__stock__sector__public_defense_id=public_defense_id
-                            )
-                            entry_filters &= ~Q(stock_item__stock_id=1)
-                            entry_quantity = (
-                                StockEntry.objects.filter(entry_filters).aggregate(
-                                    Sum("entry_quantity")
-                                )["entry_quantity__sum"]
-                                or 0
-                            )
-                            entry_price = product.price * entry_quantity
-
-                            withdraw_filters = Q(
-                                withdraw_date__gte=initial_date,
-                                withdraw_date__lte=final_date,
-                            )
-                            withdraw_filters &= Q(stock_item__product_id=product_id)
-                            withdraw_filters &= Q(
-                                stock_item__stock__sector__public_defense_id=public_defense_id
-                            )
-                            withdraw_filters &= ~Q(stock_item__stock_id=1)
-                            withdrawal_quantity = (
-                                StockWithdrawal.objects.filter(
-                                    withdraw_filters
-                                ).aggregate(Sum("withdraw_quantity"))[
-                                    "withdraw_quantity__sum"
-                                ]
-                                or 0
-                            )
-                            withdrawal_price = product.price * withdrawal_quantity
-
-                            response.append(
-                                {
-                                    "public_defense": public_defense.name,
-                                    "product_code": product.code,
-                                    "product_name": product.name,
-                                    "entry_quantity": entry_quantity,
-                                    "withdrawal_quantity": withdrawal_quantity,
-                                    "entry_price": entry_price,
-                                    "withdrawal_price": withdrawal_price,
-                                }
-                            )
-                    else:
-                        for sector_id in sector_ids:
-                            sector = Sector.objects.get(id=sector_id)
-                            entry_filters = Q(
-                                entry_date__gte=initial_date, entry_date__lte=final_date
-                            )
-                            entry_filters &= Q(stock_item__product_id=product_id)
-                            entry_filters &= Q(stock_item__stock__sector_id=sector_id)
-                            entry_filters &= ~Q(stock_item__stock_id=1)
-                            entry_quantity = (
-                                StockEntry.objects.filter(entry_filters).aggregate(
-                                    Sum("entry_quantity")
-                                )["entry_quantity__sum"]
-                                or 0
-                            )
-                            entry_price = product.price * entry_quantity
-
-                            withdraw_filters = Q(
-                                withdraw_date__gte=initial_date,
-                                withdraw_date__lte=final_date,
-                            )
-                            withdraw_filters &= Q(stock_item__product_id=product_id)
-                            withdraw_filters &= Q(
-                                stock_item__stock__sector_id=sector_id
-                            )
-                            withdraw_filters &= ~Q(stock_item__stock_id=1)
-                            withdrawal_quantity = (
-                                StockWithdrawal.objects.filter(
-                                    withdraw_filters
-                                ).aggregate(Sum("withdraw_quantity"))[
-                                    "withdraw_quantity__sum"
-                                ]
-                                or 0
-                            )
-                            withdrawal_price = product.price * withdrawal_quantity
-
-                            response.append(
-                                {
-                                    "sector": sector.name,
-                                    "product_code": product.code,
-                                    "product_name": product.name,
-                                    "entry_quantity": entry_quantity,
-                                    "withdrawal_quantity": withdrawal_quantity,
-                                    "entry_price": entry_price,
-                                    "withdrawal_price": withdrawal_price,
-                                }
-                            )
-
-        if public_defense_ids:
-            output_dict = {}
-            for item in response:
-                key = (item["product_code"], item["public_defense"])
-                if key not in output_dict:
-                    output_dict[key] = item
-                else:
-                    output_dict[key]["entry_quantity"] += item["entry_quantity"]
-                    output_dict[key]["withdrawal_quantity"] += item[
-                        "withdrawal_quantity"
-                    ]
-                    output_dict[key]["entry_price"] += item["entry_price"]
-                    output_dict[key]["withdrawal_price"] += item["withdrawal_price"]
-
-            response = list(output_dict.values())
-        else:
-            output_dict = {}
-            for item in response:
-                key = (item["product_code"], item["sector"])
-                if key not in output_dict:
-                    output_dict[key] = item
-                else:
-                    output_dict[key]["entry_quantity"] += item["entry_quantity"]
-                    output_dict[key]["withdrawal_quantity"] += item[
-                        "withdrawal_quantity"
-                    ]
-                    output_dict[key]["entry_price"] += item["entry_price"]
-                    output_dict[key]["withdrawal_price"] += item["withdrawal_price"]
-
-            response = list(output_dict.values())
+        filters = {
+            "product_ids": request.query_params.getlist("product"),
+            "public_defense_ids": request.query_params.getlist("public_defense"),
+            "sector_ids": request.query_params.getlist("sector"),
+            "category_ids": request.query_params.getlist("category"),
+        }
+        if self.export_format:
+            columns, rows = stream_stock_report(
+                initial_date, final_date, chunk_size=self.export_chunk_size, **filters
+            )
+            return self.export(columns, rows, "stock-report")
+        response = get_stock_report(initial_date, final_date, **filters)
         return Response(response)
 
 
-class WarehouseItems(APIView):
+class WarehouseItems(ExportMixin, APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        queryset = (
-            StockItem.objects.filter(stock__id=1)
-            .select_related("product__measure")
-            .values("product__code", "product__measure__name")
-            .annotate(
-                total_price=Cast(
-                    Sum(
-                        F("quantity") * F("product__price"),
-                        filter=Q(product__code=F("product__code")),
-                    ),
-                    output_field=FloatField(),
-                ),
-                total_quantity=Sum(
-                    "quantity", filter=Q(product__code=F("product__code"))
-                ),
+        if self.export_format:
+            columns = list(WAREHOUSE_VALUATION_COLUMNS)
+            rows = (
+                WarehouseValuation.objects.order_by("product_code")
+                .values(*columns)
+                .iterator(chunk_size=self.export_chunk_size)
             )
-            .order_by("product__code")
-        )
-
-        response_data = []
-        for item in queryset:
-            price = round(item["total_price"], 2)
-            quantity = item["total_quantity"]
-            average_price = round(price / quantity, 2) if quantity > 0 else 0
-            code = item["product__code"]
-            product = Product.objects.filter(code=code).first()
-            item_data = {
-                "product_name": product.name,
-                "product_code": code,
-                "product_measure": item["product__measure__name"],
-                "price": price,
-                "average_price": average_price,
-                "quantity": quantity,
-            }
-            response_data.append(item_data)
-
-        return Response(response_data)
+            return self.export(columns, rows, "warehouse-items")
+        return Response(get_warehouse_valuation())
 
 
 class EmailView(generics.GenericAPIView):
@@ -1359,14 +778,41 @@ class EmailView(generics.GenericAPIView):
         serializer.is_valid(raise_exception=True)
         subject = serializer.validated_data["subject"]
         message = serializer.validated_data["message"]
-        recipients = Client.objects.values_list("email", flat=True)
-        from_email = os.environ.get("EMAIL_HOST_USER")
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=message,
-            from_email=from_email,
-            to=recipients,
-            reply_to=[from_email],
-        )
-        email.send()
+        queue_email(subject, message, Client.objects.values_list("email", flat=True))
         return Response({"message": "Email sent successfully"})
+
+
+class UploadMixin:
+    serializer_class = UploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_upload(self):
+        serializer = self.get_serializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        target = UPLOAD_TARGETS[serializer.validated_data["target"]]
+        if target.admin_only and not self.request.user.is_staff:
+            raise PermissionDenied
+        obj = get_object_or_404(target.model, pk=serializer.validated_data["id"])
+        return target, obj, serializer.validated_data
+
+
+class UploadPolicyView(UploadMixin, generics.GenericAPIView):
+    """
+    Issue a presigned POST for uploading a document's file straight to S3.
+    The browser then confirms it through ``UploadConfirmView``.
+    """
+
+    def post(self, request):
+        target, obj, data = self.get_upload()
+        return Response(
+            create_upload_policy(target.get_key(obj), data.get("content_type"))
+        )
+
+
+class UploadConfirmView(UploadMixin, generics.GenericAPIView):
+    serializer_class = UploadConfirmSerializer
+
+    def post(self, request):
+        target, obj, data = self.get_upload()
+        size = confirm_upload(target, obj, data["token"])
+        return Response({"key": target.get_key(obj), "size": size})
@@ -1,15 +1,36 @@
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="SIRI",
-        default_version="v1",
-        description="SIRI is a Django-based project developed for DPESC, aimed at efficiently managing "
-        "internal processes within the organization.",
-        terms_of_service="",
-        contact=openapi.Contact(email="suporte-getig@defensoria.sc.gov.br"),
-        license=openapi.License(name=""),
-    ),
-    public=True,
-)
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def get_schema_view():
+    # drf_yasg pulls in the whole schema generation stack, so it is only
+    # imported when the docs are first requested.
+    from drf_yasg import openapi
+    from drf_yasg.views import get_schema_view
+
+    return get_schema_view(
+        openapi.Info(
+            title="SIRI",
+            default_version="v1",
+            description="SIRI is a Django-based project developed for DPESC, aimed at efficiently managing "
+            "internal processes within the organization.",
+            terms_of_service="",
+            contact=openapi.Contact(email="suporte-getig@defensoria.sc.gov.br"),
+            license=openapi.License(name=""),
+        ),
+        public=True,
+    )
+
+
+@lru_cache(maxsize=None)
+def _schema_ui_view(renderer):
+    return get_schema_view().with_ui(renderer, cache_timeout=0)
+
+
+def schema_ui(renderer):
+    """A view serving the API docs with ``renderer`` ("swagger" or "redoc")."""
+
+    def view(request, *args, **kwargs):
+        return _schema_ui_view(renderer)(request, *args, **kwargs)
+
+    return view
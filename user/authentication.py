@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def get_token_cache_key(key):
+    return f"auth-token:{key}"
+
+
+def get_token_expiry(token):
+    return token.created + timedelta(seconds=settings.AUTH_TOKEN_EXPIRES_SECONDS)
+
+
+def invalidate_cached_tokens(**filters):
+    keys = Token.objects.filter(**filters).values_list("key", flat=True)
+    cache.delete_many([get_token_cache_key(key) for key in keys])
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication where tokens expire ``AUTH_TOKEN_EXPIRES_SECONDS``
+    after they are issued. Resolved tokens are cached for up to
+    ``AUTH_TOKEN_CACHE_SECONDS`` together with the user's client, stock and
+    sector, so authenticated requests neither hit the database for the token
+    nor for ``request.user.client.stock.sector``.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = get_token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is None:
+            cached = self.load_credentials(key)
+            timeout = min(
+                settings.AUTH_TOKEN_CACHE_SECONDS,
+                (get_token_expiry(cached[1]) - timezone.now()).total_seconds(),
+            )
+            if timeout > 0:
+                cache.set(cache_key, cached, timeout=timeout)
+        user, token = cached
+
+        if get_token_expiry(token) <= timezone.now():
+            cache.delete(cache_key)
+            Token.objects.filter(key=key).delete()
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return (user, token)
+
+    def load_credentials(self, key):
+        try:
+            token = Token.objects.get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+        user = (
+            User.objects.select_related("client__stock__sector")
+            .filter(pk=token.user_id)
+            .first()
+        )
+        if user is None:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return user, token
@@ -0,0 +1,29 @@
+import uuid
+
+from django.core.cache import cache
+
+ME_CACHE_TIMEOUT = 300
+
+
+def _version_key(scope, id=None):
+    return f"me-version:{scope}:{id}"
+
+
+def get_me_cache_key(client, user, page):
+    """
+    Cache key of a client's ``/me/`` response. It embeds the current version of
+    the client's stock, of the client and its orders and of the categories, so
+    bumping any of them with ``invalidate_me_cache`` retires the entry.
+    """
+    version_keys = [
+        _version_key("stock", client.stock_id),
+        _version_key("client", client.id),
+        _version_key("categories"),
+    ]
+    versions = cache.get_many(version_keys)
+    tokens = ":".join(str(versions.get(key, 0)) for key in version_keys)
+    return f"me:{client.id}:{int(user.is_superuser)}:{page}:{tokens}"
+
+
+def invalidate_me_cache(scope, id=None):
+    cache.set(_version_key(scope, id), uuid.uuid4().hex, timeout=None)
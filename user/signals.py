@@ -0,0 +1,87 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from order.models import Order, StockEntry, StockWithdrawal
+from stock.models import Category, Sector, Stock, StockItem
+
+from .authentication import get_token_cache_key, invalidate_cached_tokens
+from .models import Client
+from .services import invalidate_me_cache
+
+
+def _invalidate_on_commit(scope, id=None):
+    transaction.on_commit(lambda: invalidate_me_cache(scope, id))
+
+
+@receiver(post_save, sender=StockItem)
+@receiver(post_delete, sender=StockItem)
+def invalidate_stock_item(sender, instance, **kwargs):
+    _invalidate_on_commit("stock", instance.stock_id)
+
+
+@receiver(post_save, sender=StockEntry)
+@receiver(post_delete, sender=StockEntry)
+@receiver(post_save, sender=StockWithdrawal)
+@receiver(post_delete, sender=StockWithdrawal)
+def invalidate_stock_movement(sender, instance, **kwargs):
+    stock_id = (
+        StockItem.objects.filter(pk=instance.stock_item_id)
+        .values_list("stock_id", flat=True)
+        .first()
+    )
+    if stock_id:
+        _invalidate_on_commit("stock", stock_id)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order(sender, instance, **kwargs):
+    _invalidate_on_commit("client", instance.client_id)
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def invalidate_client(sender, instance, **kwargs):
+    _invalidate_on_commit("client", instance.id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(m2m_changed, sender=Category.sector.through)
+def invalidate_categories(sender, **kwargs):
+    _invalidate_on_commit("categories")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_cached_tokens(user_id=instance.pk))
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def invalidate_client_tokens(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_cached_tokens(user_id=instance.user_id))
+
+
+@receiver(post_save, sender=Stock)
+def invalidate_stock_tokens(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: invalidate_cached_tokens(user__client__stock=instance.pk)
+    )
+
+
+@receiver(post_save, sender=Sector)
+def invalidate_sector_tokens(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: invalidate_cached_tokens(user__client__stock__sector=instance.pk)
+    )
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    cache.delete(get_token_cache_key(instance.key))
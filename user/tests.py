@@ -0,0 +1,166 @@
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from order.models import Order
+from stock.models import Category, StockItem
+from user.authentication import get_token_cache_key
+
+
+@pytest.mark.django_db
+def test_me_stays_within_query_budget(api_client, stock_item, make_listings):
+    make_listings(20)
+
+    response = api_client.get("/me/")
+
+    assert response.status_code == 200
+    assert len(response.data["stock_items"]) == 1
+    assert len(response.data["orders"]) > 0
+
+
+def rename_client(client):
+    client.name = "renamed"
+    client.save()
+
+
+def send_order(client):
+    order = Order.objects.get(client=client)
+    order.is_sent = True
+    order.save()
+
+
+def restock(client):
+    stock_item = StockItem.objects.get(stock=client.stock)
+    stock_item.quantity = 5
+    stock_item.save()
+
+
+def add_category(client):
+    Category.objects.create(name="new", code="new").sector.add(client.stock.sector)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "change",
+    [
+        rename_client,
+        lambda client: Order.objects.create(client=client),
+        send_order,
+        lambda client: Order.objects.get(client=client).delete(),
+        restock,
+        add_category,
+    ],
+    ids=[
+        "client",
+        "new-order",
+        "order-update",
+        "order-delete",
+        "stock-item",
+        "category",
+    ],
+)
+def test_cached_me_follows_changes_to_the_client(
+    api_client,
+    client,
+    order,
+    stock_item,
+    category,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+    change,
+):
+    cached = api_client.get("/me/").data
+    with django_assert_num_queries(0):
+        assert api_client.get("/me/").data == cached
+
+    with django_capture_on_commit_callbacks(execute=True):
+        change(client)
+    client.refresh_from_db()
+    data = api_client.get("/me/").data
+    cache.clear()
+
+    assert data != cached
+    assert data == api_client.get("/me/").data
+
+
+@pytest.fixture
+def token(admin_user, client):
+    return Token.objects.create(user=admin_user)
+
+
+@pytest.fixture
+def token_client(token):
+    token_client = APIClient()
+    token_client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return token_client
+
+
+@pytest.mark.django_db
+def test_expired_token_is_rejected_and_deleted(
+    token, token_client, settings, monkeypatch
+):
+    assert token_client.get("/me/").status_code == 200
+    assert cache.get(get_token_cache_key(token.key)) is not None
+
+    expired = token.created + timedelta(seconds=settings.AUTH_TOKEN_EXPIRES_SECONDS)
+    monkeypatch.setattr(timezone, "now", lambda: expired)
+    response = token_client.get("/me/")
+
+    assert response.status_code == 401
+    assert response.data["detail"] == "Token has expired."
+    assert not Token.objects.filter(key=token.key).exists()
+    assert cache.get(get_token_cache_key(token.key)) is None
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "changed",
+    [
+        lambda client: client.user,
+        lambda client: client,
+        lambda client: client.stock,
+        lambda client: client.stock.sector,
+    ],
+    ids=["user", "client", "stock", "sector"],
+)
+def test_cached_token_is_invalidated_when_its_user_changes(
+    client, token, token_client, django_capture_on_commit_callbacks, changed
+):
+    assert token_client.get("/me/").status_code == 200
+    assert cache.get(get_token_cache_key(token.key)) is not None
+
+    with django_capture_on_commit_callbacks(execute=True):
+        changed(client).save()
+
+    assert cache.get(get_token_cache_key(token.key)) is None
+
+
+@pytest.mark.django_db
+def test_deactivated_user_is_rejected_despite_cached_token(
+    admin_user, token_client, django_capture_on_commit_callbacks
+):
+    assert token_client.get("/me/").status_code == 200
+
+    with django_capture_on_commit_callbacks(execute=True):
+        admin_user.is_active = False
+        admin_user.save()
+
+    assert token_client.get("/me/").status_code == 401
+
+
+@pytest.mark.django_db
+def test_login_replaces_an_expired_token(admin_user, settings):
+    credentials = {"username": admin_user.username, "password": "password"}
+    key = APIClient().post("/login/", credentials).data["token"]
+    assert APIClient().post("/login/", credentials).data["token"] == key
+
+    expired = timezone.now() - timedelta(seconds=settings.AUTH_TOKEN_EXPIRES_SECONDS)
+    Token.objects.filter(key=key).update(created=expired)
+    new_key = APIClient().post("/login/", credentials).data["token"]
+
+    assert new_key != key
+    assert list(Token.objects.values_list("key", flat=True)) == [new_key]
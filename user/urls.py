@@ -1,10 +1,10 @@
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.authtoken.views import ObtainAuthToken
 
 from .views import (
     ClientListCreateView,
     ClientRetrieveUpdateDestroyView,
+    LoginView,
     MeView,
     confirm_password_reset,
     password_reset,
@@ -13,7 +13,7 @@ from .views import (
 app_name = "user"
 
 urlpatterns = [
-    path("login/", ObtainAuthToken.as_view(), name="login"),
+    path("login/", LoginView.as_view(), name="login"),
     path("clients/", ClientListCreateView.as_view(), name="client_list_create"),
     path(
         "clients/<int:pk>/",
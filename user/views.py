@@ -1,20 +1,22 @@
 import json
-import os
 
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import EmailMultiAlternatives
+from django.core.cache import cache
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, render
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.html import strip_tags
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import generics
+from rest_framework.authtoken.models import Token
+from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.generics import RetrieveAPIView
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
@@ -24,10 +26,24 @@ from order.models import Order
 from order.serializers import OrderMeSerializer
 from stock.models import Category, StockItem
 from stock.serializers import CategorySerializer, StockItemMeSerializer
-from stock.services import get_stock_item_quantity
+from stock.tasks import queue_email
 
+from .authentication import get_token_expiry
 from .models import Client
 from .serializers import ClientSerializer
+from .services import ME_CACHE_TIMEOUT, get_me_cache_key
+
+
+class LoginView(ObtainAuthToken):
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data["user"]
+        token, created = Token.objects.get_or_create(user=user)
+        if not created and get_token_expiry(token) <= timezone.now():
+            token.delete()
+            token = Token.objects.create(user=user)
+        return Response({"token": token.key})
 
 
 class ClientListCreateView(generics.ListCreateAPIView):
@@ -48,57 +64,39 @@ class MeView(RetrieveAPIView):
     pagination_class = PageNumberPagination
 
     def get(self, request, *args, **kwargs):
-        client = self.request.user.client
+        client = request.user.client
         stock = client.stock
-        stock_items = StockItem.objects.filter(stock=stock).order_by("-created")
-        filtered_stock_items_list = []
-
-        for stock_item in stock_items:
-            if stock_item.stock.id != 1:
-                stock_item.quantity = get_stock_item_quantity(stock_item.id)
-                stock_item.save(update_fields=["quantity"])
-                if stock_item.quantity:
-                    serializer = StockItemMeSerializer(stock_item)
-                    filtered_stock_items_list.append(serializer.data)
-            else:
-                if stock_item.quantity:
-                    serializer = StockItemMeSerializer(stock_item)
-                    filtered_stock_items_list.append(serializer.data)
-
-        filtered_stock_items_queryset = StockItem.objects.filter(
-            pk__in=[item["id"] for item in filtered_stock_items_list]
+        cache_key = get_me_cache_key(
+            client, request.user, request.query_params.get("page", 1)
         )
-
-        orders_queryset = Order.objects.filter(client=client)
-
-        categories = Category.objects.filter(sector=stock.sector)
-        categories_serializer = CategorySerializer(categories, many=True)
-
-        client_serializer = self.serializer_class(client)
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response(data)
+
+        stock_items_queryset = (
+            StockItem.objects.filter(stock=stock)
+            .exclude(quantity=0)
+            .select_related(*StockItemMeSerializer.select_related_fields)
+            .order_by("-created", "-id")
+        )
+        orders_queryset = Order.objects.filter(client=client).order_by(
+            "-created", "-id"
+        )
+        categories = Category.objects.filter(sector=stock.sector_id)
 
         data = {
-            "is_admin": self.request.user.is_superuser,
-            "client": client_serializer.data,
-            "categories": categories_serializer.data,
+            "is_admin": request.user.is_superuser,
+            "client": self.serializer_class(client).data,
+            "categories": CategorySerializer(categories, many=True).data,
         }
 
-        filtered_stock_items_page = self.paginate_queryset(
-            filtered_stock_items_queryset
-        )
-        if filtered_stock_items_page is not None:
-            filtered_stock_items_serializer = StockItemMeSerializer(
-                filtered_stock_items_page, many=True
-            )
-            data["stock_items"] = filtered_stock_items_serializer.data
-            data["stock_items_has_next"] = (
-                len(filtered_stock_items_page) == self.paginator.page_size
-            )
+        stock_items_page = self.paginate_queryset(stock_items_queryset)
+        if stock_items_page is not None:
+            data["stock_items_has_next"] = self.paginator.page.has_next()
         else:
-            filtered_stock_items_serializer = StockItemMeSerializer(
-                filtered_stock_items_queryset, many=True
-            )
-            data["stock_items"] = filtered_stock_items_serializer.data
+            stock_items_page = stock_items_queryset
             data["stock_items_has_next"] = False
+        data["stock_items"] = StockItemMeSerializer(stock_items_page, many=True).data
         if data["stock_items_has_next"]:
             data["next_stock_items"] = f"/stock/stock-items/?page=2&stock_id={stock.id}"
         else:
@@ -106,18 +104,17 @@ class MeView(RetrieveAPIView):
 
         orders_page = self.paginate_queryset(orders_queryset)
         if orders_page is not None:
-            orders_serializer = OrderMeSerializer(orders_page, many=True)
-            data["orders"] = orders_serializer.data
-            data["orders_has_next"] = len(orders_page) == self.paginator.page_size
+            data["orders_has_next"] = self.paginator.page.has_next()
         else:
-            orders_serializer = OrderMeSerializer(orders_queryset, many=True)
-            data["orders"] = orders_serializer.data
+            orders_page = orders_queryset
             data["orders_has_next"] = False
+        data["orders"] = OrderMeSerializer(orders_page, many=True).data
         if data["orders_has_next"]:
             data["next_orders"] = f"/order/?page=2&client_id={client.id}"
         else:
             data["next_orders"] = ""
 
+        cache.set(cache_key, data, ME_CACHE_TIMEOUT)
         return Response(data)
 
 
@@ -152,20 +149,7 @@ def password_reset(request):
             email_html = render_to_string("password_reset.html", context)
             email_text = strip_tags(email_html)
 
-            subject = "Resetar Senha"
-            from_email = os.environ.get("EMAIL_HOST_USER")
-            recipient_list = [email]
-
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=email_text,
-                from_email=from_email,
-                to=recipient_list,
-                reply_to=[from_email],
-            )
-
-            email.attach_alternative(email_html, "text/html")
-            email.send()
+            queue_email("Resetar Senha", email_text, [email], html_body=email_html)
 
             return JsonResponse({"message": "Password reset email sent."})
 